@@ -1 +1,4 @@
+__version__ = "0.1"
+
 from .shell import BashShim
+from .pool import SessionPool
@@ -0,0 +1,143 @@
+"""Fork server behind bashshim.pyworkers. It is run as a script, never imported.
+
+The interpreter starts once, preloads the modules named on its command line
+and then serves requests read from stdin. For each request it forks a child,
+which runs the program the way `python3` would: in a fresh __main__, with
+stdout and stderr redirected to temporary files. The server waits for the
+child and writes back (returncode, stdout, stderr).
+
+Messages in both directions are pickles prefixed with their length
+(4 bytes, big endian).
+"""
+import atexit
+import builtins
+import importlib
+import os
+import pickle
+import runpy
+import struct
+import sys
+import tempfile
+import traceback
+import types
+
+_HEADER = struct.Struct('>I')
+
+
+def _exit_code(exc):
+    code = exc.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def _run(kind, target, args):
+    """Run the program in this (child) process and return its exit status."""
+    # Exit handlers registered by the preloaded modules belong to the server, not to this program
+    atexit._clear()
+    main = types.ModuleType('__main__')
+    main.__dict__['__builtins__'] = builtins
+    sys.modules['__main__'] = main
+    try:
+        if kind == '-c':
+            sys.argv = ['-c'] + args
+            sys.path[0] = ''
+            exec(compile(target, '<string>', 'exec'), main.__dict__)
+        elif kind == '-m':
+            sys.argv = ['-m'] + args
+            sys.path[0] = os.getcwd()
+            runpy._run_module_as_main(target)
+        else:
+            sys.argv = [target] + args
+            sys.path[0] = os.path.dirname(os.path.abspath(target))
+            # Python 3.9+ reports the script's absolute path in __file__
+            main.__file__ = os.path.abspath(target) if sys.version_info >= (3, 9) else target
+            with open(target, 'rb') as f:
+                source = f.read()
+            exec(compile(source, target, 'exec'), main.__dict__)
+        code = 0
+    except SystemExit as e:
+        code = _exit_code(e)
+    except BaseException as e:
+        # Leave this function's own frame out, as the interpreter would
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        code = 1
+    try:
+        atexit._run_exitfuncs()
+    except SystemExit as e:
+        code = _exit_code(e)
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except Exception:
+            pass
+    return code
+
+
+def _child(request, out, err):
+    kind, target, args, cwd, env, limits = request
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out.fileno(), 1)
+    os.dup2(err.fileno(), 2)
+    cpu_seconds, memory_bytes = limits
+    if cpu_seconds is not None or memory_bytes is not None:
+        import resource
+        if cpu_seconds is not None:
+            resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds)))
+        if memory_bytes is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (int(memory_bytes), int(memory_bytes)))
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(env)
+    os._exit(_run(kind, target, args))
+
+
+def _read_exact(stream, size):
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def main():
+    for name in sys.argv[1:]:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    requests = sys.stdin.buffer
+    replies = sys.stdout.buffer
+    while True:
+        header = _read_exact(requests, _HEADER.size)
+        if header is None:
+            return
+        request = pickle.loads(_read_exact(requests, _HEADER.unpack(header)[0]))
+        with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+            sys.stderr.flush()
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    _child(request, out, err)
+                finally:
+                    os._exit(70)
+            _, status = os.waitpid(pid, 0)
+            if os.WIFSIGNALED(status):
+                returncode = -os.WTERMSIG(status)
+            else:
+                returncode = os.WEXITSTATUS(status)
+            out.seek(0)
+            err.seek(0)
+            reply = pickle.dumps((returncode, out.read(), err.read()))
+        replies.write(_HEADER.pack(len(reply)) + reply)
+        replies.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Content-addressed storage for fakeroot file contents.
+
+A populated fakeroot repeats the same few contents hundreds of times (empty
+logs, the `/bin` stubs, `Info.plist` files, ...). BlobStore keeps each distinct
+content once on disk, named by its sha256, and FileSystem hardlinks files to
+it, so writing a known content only costs a link. MemoryBlobStore does the same
+for MemoryFileSystem by sharing one object per distinct content.
+"""
+import hashlib
+import os
+import tempfile
+import weakref
+from pathlib import Path
+
+
+def default_blob_dir():
+    return Path.home() / '.cache' / 'bashshim' / 'blobs'
+
+
+_FILE_MODE = None
+
+
+def _file_mode():
+    """Mode of a regular file created now (0o644 under the usual umask 022)."""
+    # umask can only be read by setting it; do that once rather than racing other threads on every put
+    global _FILE_MODE
+    if _FILE_MODE is None:
+        umask = os.umask(0o022)
+        os.umask(umask)
+        _FILE_MODE = 0o666 & ~umask
+    return _FILE_MODE
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    def __init__(self, path=None):
+        self.path = Path(path) if path else default_blob_dir()
+        self.stored = 0  # new blobs written
+        self.reused = 0  # writes satisfied by an existing blob
+
+    def path_for(self, key):
+        return self.path / key[:2] / key
+
+    def put(self, data):
+        """Store `data` unless it is already present and return the blob's path."""
+        final = self.path_for(digest(data))
+        if final.exists():
+            self.reused += 1
+            return final
+        final.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.tmp-', dir=final.parent)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        # mkstemp creates 0600 files; fakeroot files linked to the blob should look normally created
+        os.chmod(tmp, _file_mode())
+        # Concurrent writers of the same content produce identical files, so replacing is safe
+        os.replace(tmp, final)
+        self.stored += 1
+        return final
+
+    def link(self, data, dest):
+        """Make `dest` a hardlink to the blob holding `data`.
+
+        Returns False when that is not possible (another device, link count limit,
+        ...), in which case the caller should write the file normally.
+        """
+        blob = self.put(data)
+        dest = Path(dest)
+        tmp = dest.with_name(f".{dest.name}.blob-{os.getpid()}")
+        try:
+            os.link(blob, tmp)
+            os.replace(tmp, dest)
+        except OSError:
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            return False
+        return True
+
+
+class Blob:
+    """Immutable content shared by every in-memory file that holds it."""
+    __slots__ = ('data', '__weakref__')
+
+    def __init__(self, data):
+        self.data = data
+
+
+class MemoryBlobStore:
+    def __init__(self):
+        # Blobs disappear once no file (or snapshot) refers to them any more
+        self._blobs = weakref.WeakValueDictionary()
+        self.stored = 0
+        self.reused = 0
+
+    def __len__(self):
+        return len(self._blobs)
+
+    def put(self, data):
+        key = hashlib.sha256(data).digest()
+        blob = self._blobs.get(key)
+        if blob is not None:
+            self.reused += 1
+            return blob
+        blob = self._blobs[key] = Blob(bytes(data))
+        self.stored += 1
+        return blob
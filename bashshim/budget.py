@@ -0,0 +1,93 @@
+"""Per-command resource budgets.
+
+A Budget caps what each dispatched command may use: wall-clock time,
+captured output and, for the child processes it starts (python3, the
+subprocess fallback), CPU time and address space through `ulimit` in /bin/sh.
+Running out ends the command with the status bash would report: 124 for a
+timeout, as with timeout(1), and 137 for a child killed by its CPU limit
+(SIGKILL). Output past the cap is dropped and a marker added in its place.
+"""
+import threading
+import time
+
+from .streams import StreamFailed
+
+try:
+    import resource
+except ImportError:  # Windows has no setrlimit
+    resource = None
+
+TIMEOUT_STATUS = 124
+KILLED_STATUS = 128 + 9
+TRUNCATION_MARKER = "\n[bashshim: output truncated at {limit} bytes]\n"
+
+
+class BudgetExceeded(StreamFailed):
+    """Raised while a command's output is streamed past its deadline."""
+
+
+class Budget:
+    def __init__(self, timeout=None, max_output=None, cpu_seconds=None, memory_bytes=None):
+        """
+        timeout: wall-clock seconds per command.
+        max_output: bytes of output kept per command.
+        cpu_seconds / memory_bytes: RLIMIT_CPU / RLIMIT_AS for child processes
+            (ignored where the resource module is unavailable).
+        None leaves a limit off.
+        """
+        self.timeout = timeout
+        self.max_output = max_output
+        self.cpu_seconds = cpu_seconds
+        self.memory_bytes = memory_bytes
+        self._lock = threading.Lock()
+        self.timeouts = 0
+        self.truncations = 0
+        self.killed = 0
+
+    def deadline(self):
+        """time.monotonic() value a command starting now must finish by, or None."""
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    def wrap(self, cmd, shell=False):
+        """`cmd` (an argv list, or a command line when `shell`) changed to run under the rlimits.
+
+        The limits are set by `ulimit` in the /bin/sh that then execs the command,
+        not by a preexec_fn, which is unsafe while other threads (pipeline stages,
+        jobs) are running. `cmd` is returned unchanged when there are none to apply.
+        """
+        if resource is None or (self.cpu_seconds is None and self.memory_bytes is None):
+            return cmd
+        # ulimit sets soft and hard limits alike, so the kernel sends SIGKILL rather than SIGXCPU
+        limits = []
+        if self.cpu_seconds is not None:
+            limits.append(f"ulimit -t {int(self.cpu_seconds)}")
+        if self.memory_bytes is not None:
+            limits.append(f"ulimit -v {int(self.memory_bytes) // 1024}")
+        prefix = '; '.join(limits) + '; '
+        if shell:
+            return prefix + cmd
+        return ['/bin/sh', '-c', prefix + 'exec "$@"', 'sh', *cmd]
+
+    def truncate(self, text, used=0):
+        """Cut `text` so that `used` bytes already emitted plus it fit max_output; returns (text, truncated)."""
+        if self.max_output is None:
+            return text, False
+        data = text.encode('utf-8')
+        room = self.max_output - used
+        if len(data) <= room:
+            return text, False
+        kept = data[:max(room, 0)].decode('utf-8', 'ignore')
+        self.record('truncations')
+        return kept + TRUNCATION_MARKER.format(limit=self.max_output), True
+
+    def record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'timeouts': self.timeouts,
+                'truncations': self.truncations,
+                'killed': self.killed,
+            }
@@ -1,4 +1,5 @@
 from .shell import BashShim
+from .budget import Budget
 import argparse
 import sys
 def main():
@@ -32,6 +33,16 @@ def main():
     parser.add_argument('--package-manager-mirror', default='http://package.fakeos.org', help='Package manager mirror URL')
     parser.add_argument('--allow-networking', action='store_true', help='Allow networking commands (curl, wget, etc.)')
     parser.add_argument('--log-dmesg', action='store_true', help='Enable dmesg logging')
+    parser.add_argument('--template-cache', metavar='DIR', help='Clone new fakeroots from prebuilt template images cached in DIR')
+    parser.add_argument('--clock', default='real', choices=['real', 'virtual'], help='Clock mode; virtual makes sleeps advance simulated time instantly')
+    parser.add_argument('--lazy-fs', action='store_true', help='Create simulated files only when they are first accessed')
+    parser.add_argument('--fakeroot', metavar='DIR', help='Directory holding the simulated filesystem (default: ~/fakeroot)')
+    parser.add_argument('--log-level', default='debug', choices=['emerg', 'alert', 'crit', 'err', 'warn', 'notice', 'info', 'debug'], help='Drop log messages less severe than this level')
+    parser.add_argument('--blob-store', metavar='DIR', help='Store identical file contents once, as hardlinks into DIR')
+    parser.add_argument('--timeout', type=float, metavar='SECONDS', help='Stop any single command after this long (exit status 124)')
+    parser.add_argument('--max-output', type=int, metavar='BYTES', help='Truncate the output of any single command beyond this size')
+    parser.add_argument('--python-workers', type=int, metavar='N', help='Keep N warm interpreters to run python3 commands faster')
+    parser.add_argument('--fallback-shell', nargs='?', const=True, metavar='PATH', help='With --fallback subprocess, keep one shell (default /bin/sh) running for unknown commands')
     parser.add_argument('-c', '--command', help='Run a single command and exit')
     args = parser.parse_args()
 
@@ -48,13 +59,23 @@ def main():
         package_manager_mirror=args.package_manager_mirror,
         log_dmesg=args.log_dmesg,
         allow_networking=args.allow_networking,
-        kernel_version=args.kernel_version
+        kernel_version=args.kernel_version,
+        template_cache=args.template_cache,
+        clock=args.clock,
+        lazy=args.lazy_fs,
+        fakeroot=args.fakeroot,
+        blob_store=args.blob_store,
+        log_level=args.log_level,
+        budget=Budget(timeout=args.timeout, max_output=args.max_output),
+        python_workers=args.python_workers,
+        fallback_shell=args.fallback_shell
     )
 
     if args.command:
-        code, out = shim.run(args.command)
-        print(out, end='')
-        exit(code)
+        stream = shim.run_stream(args.command)
+        for chunk in stream:
+            print(chunk, end='', flush=True)
+        exit(stream.exit_code)
 
     # print(f"Fake shell ready. Logged in as: {shim.username} ({shim.sim_os})")
     while True:
@@ -62,12 +83,16 @@ def main():
             # Show the fake cwd relative to the fake root, always starting with '/'
             fake_cwd = '/' + str(shim.cwd.relative_to(shim.fakeroot)).replace('\\', '/')
             cmd = input(f'{shim.username}@{shim.hostname}:{fake_cwd} $ ')
+            stream = shim.run_stream(cmd)
             try:
-                code, out = shim.run(cmd)
+                # Print each chunk as soon as the command produces it
+                for chunk in stream:
+                    print(chunk, end='', flush=True)
+                code = stream.exit_code
             except Exception as e:
+                stream.close()
                 code = 1
-                out = f"Error: {str(e)}\n"
-            print(out, end='')
+                print(f"Error: {str(e)}")
             if code == 9999:
                 sys.exit(0)
         except (KeyboardInterrupt, EOFError):
@@ -0,0 +1,76 @@
+"""Pluggable clocks for BashShim.
+
+RealClock is plain wall-clock time. VirtualClock runs alongside it but
+sleeps return immediately and move simulated time forward instead, so an
+agent sees `sleep 30` take 30 seconds without anything actually blocking.
+"""
+import bisect
+import time
+from datetime import datetime
+
+
+class RealClock:
+    mode = 'real'
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    async def asleep(self, seconds):
+        import asyncio
+        await asyncio.sleep(seconds)
+
+    def now(self):
+        return datetime.fromtimestamp(self.time())
+
+    def to_virtual(self, real_ts):
+        """Map a real timestamp (e.g. a file mtime) onto this clock's timeline."""
+        return real_ts
+
+
+class VirtualClock(RealClock):
+    mode = 'virtual'
+
+    def __init__(self):
+        self.offset = 0.0
+        # Real times at which the offset changed, and the offset from then on
+        self._marks = []
+        self._offsets = []
+
+    def time(self):
+        return time.time() + self.offset
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    async def asleep(self, seconds):
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        if seconds <= 0:
+            return
+        self.offset += seconds
+        self._marks.append(time.time())
+        self._offsets.append(self.offset)
+
+    def to_virtual(self, real_ts):
+        # Something written at real time t happened at t + the offset in effect back then
+        i = bisect.bisect_right(self._marks, real_ts)
+        return real_ts + (self._offsets[i - 1] if i else 0.0)
+
+
+CLOCKS = {'real': RealClock, 'virtual': VirtualClock}
+
+
+def make_clock(clock):
+    """Accept a clock instance or one of the names in CLOCKS."""
+    if clock is None:
+        return RealClock()
+    if isinstance(clock, str):
+        try:
+            return CLOCKS[clock.lower()]()
+        except KeyError:
+            raise ValueError(f"unknown clock: {clock}") from None
+    return clock
@@ -1,8 +1,11 @@
+import functools
 import os
 import re
 import shlex
 from typing import List, Tuple, Optional
 
+from .syntax import CommandList, Word, parse
+
 class CommandParser:
     """Helper responsible for basic bash-like command parsing & variable expansion.
 
@@ -10,14 +13,18 @@ class CommandParser:
     the shell implementation can focus on command dispatch & simulation.
     """
 
-    def __init__(self, variables: dict, env: Optional[dict] = None):
+    def __init__(self, variables: dict, env: Optional[dict] = None, cache_size: Optional[int] = 256):
         # We keep a reference to the shared variables dict (not a copy) so
         # assignments in BashShim remain visible here automatically.
         self.variables = variables
         self.env = env if env is not None else os.environ
+        # Trees are immutable and hold words before expansion, so a cached tree
+        # stays valid whatever happens to the variables later. 0 disables caching.
+        self._parse = functools.lru_cache(maxsize=cache_size)(parse) if cache_size != 0 else parse
 
     # -------------------- Variable expansion --------------------
-    _VAR_PATTERN = re.compile(r'\$(\w+)|\$\{([^}]+)\}')
+    # $NAME, ${NAME} and the special parameters $? (last exit status) and $! (last background pid)
+    _VAR_PATTERN = re.compile(r'\$(\w+|[?!])|\$\{([^}]+)\}')
 
     def expand_vars(self, s: str) -> str:
         def repl(m):
@@ -28,6 +35,23 @@ class CommandParser:
     def expand_args(self, args: List[str]) -> List[str]:
         return [self.expand_vars(a) for a in args]
 
+    def expand_word(self, word: Word) -> str:
+        """Expand a parsed word once; single-quoted and escaped parts stay literal."""
+        return ''.join(text if quote == "'" else self.expand_vars(text) for text, quote in word.parts)
+
+    # -------------------- Full grammar --------------------
+    def parse(self, command_line: str) -> CommandList:
+        """Parse a whole command line into a syntax tree (see bashshim.syntax)."""
+        return self._parse(command_line)
+
+    def cache_info(self):
+        """Hit/miss statistics of the parse cache (functools' CacheInfo), None when disabled."""
+        return self._parse.cache_info() if hasattr(self._parse, 'cache_info') else None
+
+    def cache_clear(self):
+        if hasattr(self._parse, 'cache_clear'):
+            self._parse.cache_clear()
+
     # -------------------- Redirection parsing --------------------
     def parse_redirection(self, cmd: str) -> Tuple[List[str], Optional[str], bool]:
         """Parse a single (non‑piped) command for simple output redirection.
@@ -0,0 +1,157 @@
+"""Simulated commands that live in their own modules.
+
+A command module exposes `run(shell, args)` (or `run(shell, args, stdin=None)`
+to read piped input), returning (code, output) like the cmd_* methods of
+BashShim. CommandRegistry maps command names to "module:function" targets and
+imports a module only the first time its command runs, so a session that
+never calls curl never imports requests.
+
+Other packages can add commands through the `bashshim.commands` entry point
+group:
+
+    [options.entry_points]
+    bashshim.commands =
+        hello = mypackage.hello:run
+
+Built-in commands win over entry points of the same name; register() wins
+over both. The entry points are scanned once, the first time a name is looked
+up that is not registered, or when discover() is called; until then, listing
+the commands shows only the registered ones.
+"""
+import importlib
+import threading
+import types
+from collections.abc import MutableMapping
+
+ENTRY_POINT_GROUP = 'bashshim.commands'
+
+BUILTIN_COMMANDS = {
+    'bc': 'bashshim.commands.bc:run',
+    'curl': 'bashshim.commands.curl:run',
+    'dmesg': 'bashshim.commands.dmesg:run',
+    'echo': 'bashshim.commands.echo:run',
+    'free': 'bashshim.commands.free:run',
+    'hostname': 'bashshim.commands.hostname:run',
+    'id': 'bashshim.commands.id:run',
+    'passwd': 'bashshim.commands.passwd:run',
+    'uname': 'bashshim.commands.uname:run',
+    'uptime': 'bashshim.commands.uptime:run',
+    'whoami': 'bashshim.commands.whoami:run',
+}
+
+
+def _import_target(target):
+    module, _, attr = target.partition(':')
+    return getattr(importlib.import_module(module), attr)
+
+
+class CommandRegistry:
+    def __init__(self, commands=BUILTIN_COMMANDS, entry_points=True):
+        """
+        commands: {name: "module:function" or callable}.
+        entry_points: also look up commands in the `bashshim.commands` entry point group.
+        """
+        self._targets = dict(commands)
+        self._loaded = {}
+        # Scanning installed distributions is slow; it happens once, on the first miss
+        self._entry_points = None if entry_points else {}
+        self._lock = threading.Lock()
+
+    def register(self, name, target):
+        """Add or replace command `name`; `target` is "module:function" or the function itself."""
+        with self._lock:
+            self._targets[name] = target
+            self._loaded.pop(name, None)
+
+    def discover(self):
+        """Scan the installed entry points (once) and return them by name."""
+        if self._entry_points is None:
+            from importlib.metadata import entry_points
+            try:
+                found = entry_points(group=ENTRY_POINT_GROUP)
+            except TypeError:  # Python < 3.10
+                found = entry_points().get(ENTRY_POINT_GROUP, ())
+            self._entry_points = {ep.name: ep for ep in found}
+        return self._entry_points
+
+    def __contains__(self, name):
+        return name in self._targets or name in self.discover()
+
+    def names(self):
+        """Registered command names, plus entry point commands if discover() has run."""
+        return set(self._targets) | set(self._entry_points or ())
+
+    def load(self, name):
+        """The function behind command `name`, imported on first use. Raises KeyError for unknown names."""
+        try:
+            return self._loaded[name]
+        except KeyError:
+            pass
+        target = self._targets.get(name)
+        if target is None:
+            func = self.discover()[name].load()
+        elif isinstance(target, str):
+            func = _import_target(target)
+        else:
+            func = target
+        with self._lock:
+            self._loaded[name] = func
+        return func
+
+
+REGISTRY = CommandRegistry()
+
+
+class CommandTable(MutableMapping):
+    """The commands of one session by name: its own entries first, then the registry's.
+
+    Registry commands are bound to the session (like methods) when first looked up.
+    """
+
+    def __init__(self, shell, commands, registry=REGISTRY):
+        self.shell = shell
+        self.registry = registry
+        self._commands = dict(commands)
+        self._removed = set()
+
+    def __getitem__(self, name):
+        try:
+            return self._commands[name]
+        except KeyError:
+            pass
+        if name in self._removed:
+            raise KeyError(name)
+        command = self._commands[name] = types.MethodType(self.registry.load(name), self.shell)
+        return command
+
+    def __setitem__(self, name, func):
+        self._commands[name] = func
+        self._removed.discard(name)
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._commands.pop(name, None)
+        self._removed.add(name)
+
+    def __contains__(self, name):
+        return name in self._commands or (name not in self._removed and name in self.registry)
+
+    def __iter__(self):
+        yield from self._commands
+        for name in sorted(self.registry.names()):
+            if name not in self._commands and name not in self._removed:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def bind(self, shell):
+        """A copy of this table for `shell`, rebinding the commands bound to this table's session."""
+        table = CommandTable(shell, {}, self.registry)
+        table._removed = set(self._removed)
+        for name, func in self._commands.items():
+            if getattr(func, '__self__', None) is self.shell:
+                func = types.MethodType(func.__func__, shell)
+            table._commands[name] = func
+        return table
@@ -0,0 +1,58 @@
+"""bc: basic arithmetic on its arguments or stdin."""
+import re
+
+
+def run(shell, args, stdin=None):
+    """
+    Simulate the 'bc' command for basic arithmetic.
+    Supports: echo "1+2" | bc, bc <<< "1+2", or bc with stdin.
+    """
+    # If args contains '<<<', treat as here-string
+    expr = None
+    if args and args[0] == '<<<' and len(args) > 1:
+        expr = args[1]
+    elif args:
+        # If bc is called with arguments, join as expression
+        expr = ' '.join(args)
+    elif stdin is not None:
+        expr = stdin.read()
+    else:
+        # Read from stdin until EOF
+        shell._log("bashshim: bc waiting for input (Ctrl-D to end)")
+        try:
+            expr = ""
+            while True:
+                line = input()
+                expr += line + "\n"
+        except EOFError:
+            pass
+
+    # Only allow safe arithmetic expressions: numbers, +, -, *, /, %, (, ), ., whitespace
+    if expr is None:
+        return 1, ""
+    expr = expr.strip()
+    if not expr:
+        return 0, ""
+    # Remove comments and extra whitespace
+    expr = re.sub(r'#.*', '', expr)
+    expr = expr.replace('\n', ';')
+    # Only allow safe characters
+    if not re.match(r'^[\d\s\+\-\*\/\%\(\)\.;\.]+$', expr):
+        return 1, "bc: invalid expression\n"
+    try:
+        # Evaluate each statement separated by ';'
+        results = []
+        for statement in expr.split(';'):
+            statement = statement.strip()
+            if not statement:
+                continue
+            # Evaluate using Python's eval, restrict builtins
+            val = eval(statement, {"__builtins__": None}, {})
+            # bc outputs floats with no trailing .0 if integer
+            if isinstance(val, float) and val.is_integer():
+                val = int(val)
+            results.append(str(val))
+        out = '\n'.join(results) + '\n' if results else ''
+        return 0, out
+    except Exception as e:
+        return 1, f"bc: error: {e}\n"
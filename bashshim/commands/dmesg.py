@@ -0,0 +1,76 @@
+"""dmesg: print or clear the session's message buffer."""
+from ..dmesg import LEVELS, level_number
+
+
+def run(shell, args):
+    levels = None
+    tail = None
+    follow = clear = read_clear = decode = False
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        value = None
+        if arg.startswith('--') and '=' in arg:
+            arg, value = arg.split('=', 1)
+        elif arg[:2] in ('-l', '-n') and len(arg) > 2:
+            arg, value = arg[:2], arg[2:]
+        if arg in ('-h', '--help'):
+            out = (
+                "Usage: dmesg [OPTION]...\n"
+                "Display the bashshim message buffer.\n\n"
+                "  -l, --level LIST   restrict output to the given levels (e.g. err,warn)\n"
+                "  -n, --lines N      print only the last N messages\n"
+                "  -w, --follow       print only messages added since the last --follow\n"
+                "  -x, --decode       show the level of each message\n"
+                "  -c, --read-clear   clear the buffer after printing it\n"
+                "  -C, --clear        clear the buffer\n"
+                "  -h, --help         display this help and exit\n"
+                f"\nSupported log levels: {', '.join(LEVELS)}\n"
+            )
+            return 0, out
+        if arg in ('-l', '--level', '-n', '--lines'):
+            if value is None:
+                i += 1
+                if i >= len(args):
+                    return 1, f"dmesg: option requires an argument -- '{arg.lstrip('-')[0]}'\n"
+                value = args[i]
+            if arg in ('-l', '--level'):
+                try:
+                    levels = {level_number(name) for name in value.split(',') if name}
+                except ValueError:
+                    return 1, f"dmesg: unknown level '{value}'\n"
+            else:
+                try:
+                    tail = int(value)
+                    if tail < 0:
+                        raise ValueError
+                except ValueError:
+                    return 1, f"dmesg: invalid number of lines: '{value}'\n"
+        elif arg in ('-w', '--follow'):
+            follow = True
+        elif arg in ('-x', '--decode'):
+            decode = True
+        elif arg in ('-c', '--read-clear'):
+            read_clear = True
+        elif arg in ('-C', '--clear'):
+            clear = True
+        else:
+            out = f"dmesg: invalid option -- '{arg.lstrip('-')}'\nTry 'dmesg --help' for more information.\n"
+            shell._log("bashshim: dmesg error -> %s", out.strip(), level='err')
+            return 1, out
+        i += 1
+    if clear:
+        shell._log_buffer.clear()
+        return 0, ""
+    shell._log("bashshim: outputting dmesg")
+    # Nothing blocks in a simulated shell, so follow mode shows what arrived since the previous call
+    records = shell._log_buffer.select(levels, after=shell._dmesg_cursor if follow else None, tail=tail)
+    if follow:
+        shell._dmesg_cursor = shell._log_buffer.last_seq
+    if read_clear:
+        shell._log_buffer.clear()
+    if decode:
+        lines = [f"{r.level_name:<6}: {r}" for r in records]
+    else:
+        lines = [str(r) for r in records]
+    return 0, "".join(line + "\n" for line in lines)
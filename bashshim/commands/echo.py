@@ -0,0 +1,6 @@
+"""echo: print the arguments."""
+
+
+def run(shell, args):
+    shell._log("bashshim: echo %s", ' '.join(args))
+    return 0, ' '.join(args) + '\n'
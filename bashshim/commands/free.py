@@ -0,0 +1,22 @@
+"""free: memory usage made up from the simulated process table."""
+
+
+def run(shell, args):
+    # Simulate memory usage using ps data
+    total = 4096000
+    used = 0
+    proc_base = shell.fakeroot / 'proc'
+    for name in shell.fs.listdir(proc_base):
+        try:
+            stat = shell.fs.read_text(proc_base / name / 'stat')
+            fields = stat.split()
+            rss = int(fields[23]) if len(fields) > 23 else 0
+            used += rss * 4  # fake: 4KB per page
+        except Exception:
+            continue
+    free = total - used
+    out = (f"              total        used        free      shared  buff/cache   available\n"
+           f"Mem:      {total:8}   {used:8}   {free:8}      0      0      0\n"
+           f"Swap:           0           0           0\n")
+    shell._log("bashshim: free (simulated)")
+    return 0, out
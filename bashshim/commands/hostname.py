@@ -0,0 +1,6 @@
+"""hostname: print the session's host name."""
+
+
+def run(shell, args):
+    shell._log("bashshim: hostname")
+    return 0, f"{shell.hostname}\n"
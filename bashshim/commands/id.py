@@ -0,0 +1,10 @@
+"""id: print the effective user and group IDs."""
+
+
+def run(shell, args):
+    uid = 0 if shell.is_root else shell.uid
+    user = 'root' if shell.is_root else shell.username
+    gid = 0 if shell.is_root else shell.uid
+    out = f"uid={uid}({user}) gid={gid}({user}) groups={gid}({user})\n"
+    shell._log("bashshim: id -> %s", out.strip())
+    return 0, out
@@ -0,0 +1,6 @@
+"""passwd: pretend to change the user's password."""
+
+
+def run(shell, args):
+    shell._log("bashshim: passwd (simulated, does nothing)")
+    return 0, "Changing password for user.\nCurrent password: \nNew password: \nRetype new password: \npasswd: password updated successfully (simulated)\n"
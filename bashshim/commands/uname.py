@@ -0,0 +1,139 @@
+"""uname: print system information for the simulated OS flavor."""
+
+
+def run(shell, args):
+    """
+    Simulate the uname command with support for common flags.
+    """
+    # Default values based on simulated OS
+    sysname = shell.sim_os
+    nodename = shell.hostname
+    release = shell.kernel_version
+    version = f"#1 SMP {shell.clock.now().strftime('%a %b %d %H:%M:%S UTC %Y')}"
+    machine = "x86_64"
+    processor = "x86_64"
+    hardware_platform = "x86_64"
+    operating_system = shell.sim_os.lower()
+
+    # BSD and Darwin tweaks
+    if shell.sim_os == "Darwin":
+        sysname = "Darwin"
+        # If kernel version is 20.x.x or higher, it's Big Sur or later (Apple Silicon)
+        # Big Sur shipped with Darwin 20.0.0
+        # kernel_version is a string, e.g., "20.3.0"
+        try:
+            major_ver = int(str(shell.kernel_version).split(".")[0])
+        except Exception:
+            major_ver = 0
+        if major_ver >= 20:
+            # Apple Silicon (arm64)
+            release = shell.kernel_version
+            version = f"Darwin Kernel Version {shell.kernel_version}: Wed Mar  8 22:21:07 PST 2023; root:xnu-8796.141.3~1/RELEASE_ARM64_T8103"
+            machine = "arm64"
+            processor = "arm"
+            hardware_platform = "arm64"
+        else:
+            # Intel (x86_64)
+            release = shell.kernel_version
+            version = f"Darwin Kernel Version {shell.kernel_version}: Wed Mar  8 22:21:07 PST 2023; root:xnu-8796.141.3~1/RELEASE_X86_64"
+            machine = "x86_64"
+            processor = "i386"
+            hardware_platform = "i386"
+        operating_system = "darwin"
+    elif shell.sim_os == "BSD":
+        sysname = "FreeBSD"
+        release = "13.2-RELEASE"
+        version = "FreeBSD 13.2-RELEASE GENERIC"
+        machine = "amd64"
+        processor = "amd64"
+        hardware_platform = "amd64"
+        operating_system = "freebsd"
+
+    # Parse flags
+    show_all = False
+    show_sysname = False
+    show_nodename = False
+    show_release = False
+    show_version = False
+    show_machine = False
+    show_processor = False
+    show_hardware_platform = False
+    show_operating_system = False
+    help_flag = False
+    invalid_flag = None
+
+    for arg in args:
+        if arg in ("-a", "--all"):
+            show_all = True
+        elif arg in ("-s", "--kernel-name"):
+            show_sysname = True
+        elif arg in ("-n", "--nodename"):
+            show_nodename = True
+        elif arg in ("-r", "--kernel-release"):
+            show_release = True
+        elif arg in ("-v", "--kernel-version"):
+            show_version = True
+        elif arg in ("-m", "--machine"):
+            show_machine = True
+        elif arg in ("-p", "--processor"):
+            show_processor = True
+        elif arg in ("-i", "--hardware-platform"):
+            show_hardware_platform = True
+        elif arg in ("-o", "--operating-system"):
+            show_operating_system = True
+        elif arg in ("-h", "--help"):
+            help_flag = True
+        elif arg.startswith("-"):
+            invalid_flag = arg
+            break
+
+    if help_flag:
+        out = (
+            "Usage: uname [OPTION]...\n"
+            "Print certain system information.  With no OPTION, same as -s.\n\n"
+            "  -a, --all                print all information\n"
+            "  -s, --kernel-name        print the kernel name\n"
+            "  -n, --nodename           print the network node hostname\n"
+            "  -r, --kernel-release     print the kernel release\n"
+            "  -v, --kernel-version     print the kernel version\n"
+            "  -m, --machine            print the machine hardware name\n"
+            "  -p, --processor          print the processor type\n"
+            "  -i, --hardware-platform  print the hardware platform\n"
+            "  -o, --operating-system   print the operating system\n"
+            "  -h, --help               display this help and exit\n"
+        )
+        return 0, out
+
+    if invalid_flag:
+        out = f"uname: invalid option -- '{invalid_flag.lstrip('-')}'\nTry 'uname --help' for more information.\n"
+        shell._log("bashshim: uname error -> %s", out.strip(), level='err')
+        return 1, out
+
+    # If no flags, default to -s
+    if not any([
+        show_all, show_sysname, show_nodename, show_release, show_version,
+        show_machine, show_processor, show_hardware_platform, show_operating_system
+    ]):
+        show_sysname = True
+
+    fields = []
+    if show_all or show_sysname:
+        fields.append(sysname)
+    if show_all or show_nodename:
+        fields.append(nodename)
+    if show_all or show_release:
+        fields.append(release)
+    if show_all or show_version:
+        fields.append(version)
+    if show_all or show_machine:
+        fields.append(machine)
+    if show_all or show_processor:
+        fields.append(processor)
+    if show_all or show_hardware_platform:
+        fields.append(hardware_platform)
+    if show_all or show_operating_system:
+        fields.append(operating_system)
+
+    out = " ".join(fields) + "\n"
+    shell._log("bashshim: uname %s -> %s", args, out.strip())
+    return 0, out
@@ -0,0 +1,64 @@
+"""uptime: how long the session has been running."""
+import random
+from datetime import datetime
+
+
+def run(shell, args):
+    now = shell.clock.time()
+    uptime_seconds = int(now - shell.session_start)
+    days, rem = divmod(uptime_seconds, 86400)
+    hours, rem = divmod(rem, 3600)
+    minutes, seconds = divmod(rem, 60)
+    load = f"{random.uniform(0.01, 0.20):.2f} {random.uniform(0.01, 0.20):.2f} {random.uniform(0.01, 0.20):.2f}"
+
+    # Defaults
+    pretty = False
+    since = False
+    help_flag = False
+    invalid_args = []
+
+    for arg in args[0:]:
+        if arg in ("-p", "--pretty"):
+            pretty = True
+        elif arg in ("-s", "--since"):
+            since = True
+        elif arg in ("-h", "--help"):
+            help_flag = True
+        else:
+            invalid_args.append(arg)
+
+    if help_flag:
+        out = (
+            "Usage: uptime [OPTION]...\n"
+            "Show how long the system has been running.\n\n"
+            "  -p, --pretty   show uptime in a pretty format\n"
+            "  -s, --since    show system uptime start time\n"
+            "  -h, --help     display this help and exit\n"
+        )
+    elif invalid_args:
+        out = f"uptime: invalid option -- '{invalid_args[0]}'\nTry 'uptime --help' for more information.\n"
+        shell._log("bashshim: uptime error -> %s", out.strip(), level='err')
+        return 1, out
+    elif pretty:
+        parts = []
+        if days > 0:
+            parts.append(f"{days} day{'s' if days != 1 else ''}")
+        if hours > 0:
+            parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
+        if minutes > 0:
+            parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
+        if seconds > 0 or not parts:
+            parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
+        out = "up " + ", ".join(parts) + "\n"
+    elif since:
+        boot_time = datetime.fromtimestamp(now - uptime_seconds)
+        out = boot_time.strftime("%Y-%m-%d %H:%M:%S") + "\n"
+    else:
+        # Normal fallback output
+        upstr = f"{days} day{'s' if days != 1 else ''}, " if days else ""
+        time_str = f"{hours}:{minutes:02d}"
+        users = 1
+        out = f"{shell.hostname} up {upstr}{time_str},  {users} user,  load average: {load}\n"
+
+    shell._log("bashshim: uptime -> %s", out.strip())
+    return 0, out
@@ -0,0 +1,7 @@
+"""whoami: print the effective user name."""
+
+
+def run(shell, args):
+    user = 'root' if shell.is_root else shell.username
+    shell._log("bashshim: whoami -> %s", user)
+    return 0, f'{user}\n'
@@ -0,0 +1,130 @@
+"""Long-lived real shell behind the `subprocess` fallback.
+
+Instead of starting /bin/sh for every unknown command, ShellCoprocess keeps
+one shell running and feeds it commands over its stdin. After each command
+it prints a random sentinel followed by the exit status, on stdout and on
+stderr, so the output of one command is read up to exactly those markers.
+Shell state (exported variables, functions, aliases) carries over between
+commands, and the working directory is set from the session before each one.
+A shell that exits (`exit`, a crash, a timeout) is restarted on the next
+command.
+"""
+import os
+import select
+import shlex
+import signal
+import subprocess
+import threading
+import time
+import uuid
+
+
+class CoprocessTimeout(Exception):
+    """The command did not finish in time; the shell has been killed and will be restarted."""
+
+
+class ShellCoprocess:
+    def __init__(self, shell='/bin/sh'):
+        self.shell = shell
+        self.process = None
+        self._sentinel = None
+        self._lock = threading.Lock()
+        self.commands = 0
+        self.restarts = 0
+
+    def _start(self):
+        if self.process is not None:
+            self._reap()
+        if self._sentinel is not None:
+            self.restarts += 1
+        self._sentinel = f"__bashshim_{uuid.uuid4().hex}__".encode()
+        # Its own session, so that a timeout or `kill %N` also stops whatever the command started
+        self.process = subprocess.Popen(
+            [self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+
+    def _reap(self):
+        process, self.process = self.process, None
+        for stream in (process.stdin, process.stdout, process.stderr):
+            try:
+                stream.close()
+            except OSError:
+                pass
+        process.wait()
+
+    def _signal(self, sig):
+        process = self.process
+        if process is not None:
+            try:
+                os.killpg(process.pid, sig)
+            except OSError:
+                pass
+
+    def terminate(self):
+        """Stop the running command (used by `kill %N` through Job.attach)."""
+        self._signal(signal.SIGTERM)
+
+    def run(self, command, cwd, timeout=None, stdin=None):
+        """Run `command` from directory `cwd`, returning (returncode, stdout bytes, stderr bytes).
+
+        `stdin` is the path of a file to read input from (default /dev/null).
+        Raises CoprocessTimeout after `timeout` seconds.
+        """
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                self._start()
+            marker = self._sentinel
+            sentinel = marker.decode()
+            # eval keeps a syntax error in `command` from desynchronising the stream
+            script = (
+                f"cd {shlex.quote(str(cwd))} && eval {shlex.quote(command)} <{shlex.quote(str(stdin or os.devnull))}\n"
+                f"printf '{sentinel} %d\\n' \"$?\"\n"
+                f"printf '{sentinel}\\n' >&2\n"
+            )
+            try:
+                self.process.stdin.write(script.encode())
+                self.process.stdin.flush()
+            except OSError:
+                self._start()
+                self.process.stdin.write(script.encode())
+                self.process.stdin.flush()
+            self.commands += 1
+            deadline = None if timeout is None else time.monotonic() + timeout
+            out, err = bytearray(), bytearray()
+            buffers = {self.process.stdout.fileno(): out, self.process.stderr.fileno(): err}
+            pending = set(buffers)
+            while pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._signal(signal.SIGKILL)
+                    self._reap()
+                    raise CoprocessTimeout()
+                ready, _, _ = select.select(list(pending), [], [], remaining)
+                for fd in ready:
+                    chunk = os.read(fd, 64 * 1024)
+                    buffer = buffers[fd]
+                    buffer += chunk
+                    end = buffer.find(marker)
+                    if not chunk or (end >= 0 and buffer.find(b'\n', end) >= 0):
+                        pending.discard(fd)
+            end = out.find(marker)
+            if end < 0:
+                # The shell exited (e.g. the command ran `exit`); its status is the command's
+                returncode = self.process.wait()
+                self._reap()
+                return returncode, bytes(out), bytes(err)
+            returncode = int(out[end + len(marker):].split()[0])
+            err_end = err.find(marker)
+            return returncode, bytes(out[:end]), bytes(err[:err_end] if err_end >= 0 else err)
+
+    def close(self):
+        with self._lock:
+            if self.process is None:
+                return
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=1)
+            except (OSError, subprocess.TimeoutExpired):
+                self._signal(signal.SIGKILL)
+            self._reap()
@@ -0,0 +1,84 @@
+"""Virtual character devices backing the simulated /dev directory.
+
+Device contents are produced when something reads them instead of being
+stored inside the fakeroot, so /dev/zero and friends cost nothing on disk.
+"""
+import os
+from pathlib import Path
+
+# Endless devices (zero, random, urandom) have no EOF, so a single read is
+# capped at this many characters to keep simulated commands finite.
+READ_LIMIT = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class VirtualDevice:
+    def __init__(self, name, generate=None, content='', echo_writes=False):
+        self.name = name
+        self.generate = generate  # callable(size) -> str, or None for finite devices
+        self.content = content
+        self.echo_writes = echo_writes
+
+    @property
+    def endless(self):
+        return self.generate is not None
+
+    def chunks(self, limit=READ_LIMIT):
+        """Yield the device contents in CHUNK_SIZE pieces, at most `limit` chars."""
+        if not self.endless:
+            if self.content:
+                yield self.content[:limit]
+            return
+        remaining = limit
+        while remaining > 0:
+            size = min(CHUNK_SIZE, remaining)
+            yield self.generate(size)
+            remaining -= size
+
+    def read(self, limit=READ_LIMIT):
+        return ''.join(self.chunks(limit))
+
+    def read_lines(self, count, limit=READ_LIMIT):
+        """Return the first `count` lines, reading no more chunks than needed."""
+        lines = []
+        pending = ''
+        for chunk in self.chunks(limit):
+            pending += chunk
+            parts = pending.split('\n')
+            pending = parts.pop()
+            lines.extend(parts)
+            if len(lines) >= count:
+                return lines[:count]
+        if pending:
+            lines.append(pending)
+        return lines[:count]
+
+    def write(self, data):
+        """Accept written data. Returns whatever should reach the terminal."""
+        return data if self.echo_writes else ''
+
+
+def _zeros(size):
+    return '\x00' * size
+
+
+def _random(size):
+    # latin-1 maps every byte to exactly one character, so no decode errors
+    return os.urandom(size).decode('latin-1')
+
+
+DEVICES = {
+    'null': VirtualDevice('null'),
+    'zero': VirtualDevice('zero', generate=_zeros),
+    'random': VirtualDevice('random', generate=_random),
+    'urandom': VirtualDevice('urandom', generate=_random),
+    'tty': VirtualDevice('tty', content='bashshim tty0\n', echo_writes=True),
+}
+
+
+def lookup(fakeroot, real_path):
+    """Return the VirtualDevice for `real_path` if it names one, else None."""
+    real_path = Path(real_path)
+    if real_path.parent != Path(fakeroot) / 'dev':
+        return None
+    return DEVICES.get(real_path.name)
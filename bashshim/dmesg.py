@@ -0,0 +1,98 @@
+"""Kernel-style ring buffer behind `dmesg`.
+
+Log records keep their level, timestamp and the unformatted message with its
+%-style arguments; the text is only built when something reads it (dmesg,
+the bashshim.log sink, the stderr echo). The buffer has a fixed capacity, so
+the oldest records are dropped instead of memory growing with the session.
+"""
+import itertools
+from collections import deque
+from datetime import datetime
+
+# Same order and names as the kernel, most severe first
+LEVELS = ('emerg', 'alert', 'crit', 'err', 'warn', 'notice', 'info', 'debug')
+LEVEL_NUMBERS = {name: i for i, name in enumerate(LEVELS)}
+DEFAULT_CAPACITY = 4096
+
+
+def level_number(level):
+    """Map a level name (or number) to its kernel priority, raising ValueError for unknown ones."""
+    if isinstance(level, int):
+        if 0 <= level < len(LEVELS):
+            return level
+    elif level in LEVEL_NUMBERS:
+        return LEVEL_NUMBERS[level]
+    raise ValueError(f"unknown log level: {level}")
+
+
+class LogRecord:
+    __slots__ = ('seq', 'time', 'level', 'msg', 'args', '_text')
+
+    def __init__(self, seq, time, level, msg, args):
+        self.seq = seq
+        self.time = time
+        self.level = level
+        self.msg = msg
+        self.args = args
+        self._text = None
+
+    @property
+    def message(self):
+        if self._text is None:
+            self._text = self.msg % self.args if self.args else self.msg
+        return self._text
+
+    @property
+    def level_name(self):
+        return LEVELS[self.level]
+
+    def timestamp(self):
+        return datetime.fromtimestamp(self.time).strftime('%b %d %H:%M:%S')
+
+    def __str__(self):
+        return f"[{self.timestamp()}] {self.message}"
+
+
+class RingLog:
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._records = deque(maxlen=capacity)
+        self._seq = itertools.count()
+        self.dropped = 0  # records pushed out by newer ones
+
+    @property
+    def capacity(self):
+        return self._records.maxlen
+
+    def append(self, time, level, msg, args=()):
+        if len(self._records) == self._records.maxlen:
+            self.dropped += 1
+        record = LogRecord(next(self._seq), time, level, msg, args)
+        self._records.append(record)
+        return record
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest record, -1 when empty."""
+        return self._records[-1].seq if self._records else -1
+
+    def select(self, levels=None, after=None, tail=None):
+        """Records matching `levels` (a set of level numbers) newer than sequence `after`, at most the last `tail`."""
+        records = [r for r in self._records
+                   if (levels is None or r.level in levels) and (after is None or r.seq > after)]
+        if tail is not None:
+            records = records[-tail:] if tail else []
+        return records
+
+    def clear(self):
+        self._records.clear()
+
+    def replace(self, records):
+        """Swap in an earlier copy of the records (see BashShim.restore)."""
+        self._records.clear()
+        self._records.extend(records)
@@ -1,37 +1,91 @@
 from pathlib import Path
 import shutil
 import os
+import tempfile
+import weakref
+
+
+class _Snapshot:
+    """Restore token handed out by FileSystem.snapshot()."""
+    __slots__ = ('position', '__weakref__')
+
+    def __init__(self, position):
+        self.position = position
+
 
 class FileSystem:
-    def __init__(self, root: Path):
+    on_disk = True
+
+    def __init__(self, root: Path, blobs=None):
         self.root = Path(root)
+        # Optional bashshim.blobstore.BlobStore: written files become hardlinks to shared blobs
+        self.blobs = blobs
+        # Paths currently hardlinked into `blobs`, unshared by break_links()
+        self._linked = set()
+        # Undo journal, kept only while snapshot tokens are alive: (path, before-image) records
+        self._journal = None
+        self._recorded = {}
+        self._snapshots = weakref.WeakSet()
+        # Where before-images are moved to, created next to the root on first use
+        self._trash = None
+        self._trashed = 0
+        # Paths whose changes snapshots do not undo, e.g. the session log
+        self.unjournaled = set()
 
     def exists(self, path):
         return Path(path).exists()
 
     def mkdir(self, path, exist_ok=False, parents=False):
+        if self._journal is not None:
+            missing = [path] + (list(Path(path).parents) if parents else [])
+            for p in reversed([p for p in missing if not Path(p).exists()]):
+                self._record(p)
         Path(path).mkdir(exist_ok=exist_ok, parents=parents)
 
     def rmdir(self, path):
-        shutil.rmtree(path)
+        # Journaling moves the tree away, which removes it too
+        if not self._record(path, 'tree'):
+            shutil.rmtree(path)
 
     def listdir(self, path):
         return os.listdir(path)
 
     def open(self, path, mode='r', encoding=None):
+        if any(m in mode for m in 'wax+'):
+            self._record(path, 'replace' if 'w' in mode else 'append' if 'a' in mode else
+                         'update' if 'r' in mode else 'create')
+            self._break_link(path, keep_data='w' not in mode)
         return open(path, mode, encoding=encoding)
 
     def read_text(self, path):
         return Path(path).read_text()
 
     def write_text(self, path, data):
+        self._record(path, 'replace')
+        if self.blobs is not None and not Path(path).is_dir():
+            if self.blobs.link(data.encode('utf-8'), path):
+                self._linked.add(Path(path))
+                return len(data)
+        self._break_link(path, keep_data=False)
         return Path(path).write_text(data)
 
     def touch(self, path, exist_ok=True):
+        self._record(path, 'touch')
+        # Timestamps live on the inode, so a shared one must not be touched
+        self._break_link(path)
         Path(path).touch(exist_ok=exist_ok)
 
     def remove(self, path):
-        Path(path).unlink()
+        if not self._record(path, 'remove'):
+            Path(path).unlink()
+
+    def rename(self, src, dst):
+        # src keeps a hardlinked image (writes break links first), dst's old entry is moved away
+        self._record(src, 'link')
+        self._record(dst, 'tree' if Path(src).is_dir() and Path(dst).is_dir() else 'remove')
+        os.replace(src, dst)
+        if Path(src) in self._linked:
+            self._linked.add(Path(dst))
 
     def stat(self, path):
         return Path(path).stat()
@@ -42,9 +96,148 @@ class FileSystem:
     def is_dir(self, path):
         return Path(path).is_dir()
 
+    def resolve(self, path):
+        return Path(path).resolve()
+
+    def _break_link(self, path, keep_data=True):
+        """Give a hardlinked file (e.g. cloned from a template) its own inode before writing."""
+        path = Path(path)
+        try:
+            if path.stat().st_nlink < 2 or not path.is_file():
+                return
+        except OSError:
+            return
+        data = path.read_bytes() if keep_data else b''
+        path.unlink()
+        path.write_bytes(data)
+
+    def break_links(self):
+        """Give every file linked into the blob store its own inode again.
+
+        Call before handing the tree to a real process (python3, the subprocess
+        fallback): it would write through a shared inode, changing every file
+        with that content and the store itself.
+        """
+        linked, self._linked = self._linked, set()
+        for path in linked:
+            self._break_link(path)
+
+    # -------------------- snapshots (journaled undo) --------------------
+    def snapshot(self):
+        """Return a token that restore() can roll the tree back to.
+
+        Nothing is copied up front: from now on each path gets its before-image
+        recorded the first time it is changed. Replaced and removed entries are
+        moved into a trash directory next to the root rather than read, appends
+        only record the old size and touch the old timestamps. Writes that bypass
+        this object (e.g. python3 scripts) are not journaled.
+        """
+        if self._journal is None:
+            self._journal = []
+        self._recorded = {}
+        token = _Snapshot(len(self._journal))
+        self._snapshots.add(token)
+        return token
+
+    def restore(self, token):
+        if token not in self._snapshots or self._journal is None:
+            raise ValueError("snapshot is no longer valid for this filesystem")
+        for path, image in reversed(self._journal[token.position:]):
+            self._undo(path, image)
+        del self._journal[token.position:]
+        self._recorded = {}
+        # Later snapshots describe states that no longer exist
+        for other in list(self._snapshots):
+            if other.position > token.position:
+                self._snapshots.discard(other)
+
+    def _record(self, path, change='create'):
+        """Journal the state of `path` before `change` happens to it.
+
+        Returns True when the entry was moved into the trash, i.e. the change
+        ('remove' or 'tree') has already happened.
+        """
+        if self._journal is None:
+            return False
+        if not self._snapshots:
+            self._stop_journal()  # every token is gone
+            return False
+        path = Path(path)
+        if change not in ('remove', 'tree', 'link'):
+            # Writes go through a symlink to its target
+            path = Path(os.path.realpath(path))
+        done = self._recorded.get(path, ())
+        if done is True or path in self.unjournaled:
+            return False
+        if not (path.exists() or path.is_symlink()):
+            image = ('absent', None)
+        elif change == 'append' and path.is_file():
+            image = ('size', path.stat().st_size)
+        elif change == 'touch' and path.is_file():
+            st = path.stat()
+            image = ('times', (st.st_atime_ns, st.st_mtime_ns))
+        elif change == 'link' and path.is_file():
+            image = ('moved', self._to_trash(path, os.link))
+        elif change == 'link' and path.is_dir():
+            image = ('moved', self._to_trash(path, lambda src, dst: shutil.copytree(src, dst, copy_function=os.link)))
+        elif change == 'update' and path.is_file():
+            image = ('moved', self._to_trash(path, shutil.copy2))
+        elif change in ('replace', 'remove') and not path.is_dir() or change == 'tree' and path.is_dir():
+            trash = self._to_trash(path, shutil.move)
+            self._journal.append((path, ('moved', trash)))
+            self._recorded[path] = True
+            if change != 'replace':
+                return True
+            # The file is about to be rewritten in place; it keeps its permissions
+            path.touch()
+            shutil.copymode(trash, path)
+            return False
+        else:
+            return False  # the change cannot succeed (e.g. writing to a directory)
+        kind = image[0]
+        if kind in done:
+            return False
+        self._journal.append((path, image))
+        # Sizes and timestamps only cover that one kind of change; the others are whole images
+        self._recorded[path] = done + (kind,) if kind in ('size', 'times') else True
+        return False
+
+    def _to_trash(self, path, transfer):
+        """Put a before-image of `path` in the trash with `transfer(src, dst)` and return where it went."""
+        if self._trash is None:
+            self._trash = Path(tempfile.mkdtemp(prefix=f".{self.root.name}-journal-", dir=self.root.parent))
+            weakref.finalize(self, shutil.rmtree, str(self._trash), True)
+        self._trashed += 1
+        dest = self._trash / str(self._trashed)
+        transfer(str(path), str(dest))
+        return dest
+
+    def _stop_journal(self):
+        self._journal = None
+        self._recorded = {}
+        if self._trash is not None:
+            shutil.rmtree(self._trash, ignore_errors=True)
+            self._trash = None
+
+    def _undo(self, path, image):
+        kind, data = image
+        if kind == 'size':
+            if path.is_file():
+                os.truncate(path, data)
+            return
+        if kind == 'times':
+            if path.exists():
+                os.utime(path, ns=data)
+            return
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        elif path.exists() or path.is_symlink():
+            path.unlink()
+        if kind == 'moved':
+            path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(str(data), str(path))
+
     def append_text(self, path, data):
-        """Append text to a file using read_text and write_text."""
-        current = ""
-        if self.exists(path):
-            current = self.read_text(path)
-        self.write_text(path, current + data)
+        """Append text to a file in place."""
+        with self.open(path, 'a') as f:
+            f.write(data)
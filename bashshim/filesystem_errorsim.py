@@ -2,11 +2,13 @@ from pathlib import Path
 import shutil
 import os
 import random
-import time
+from bashshim.clock import RealClock
 
 class FileSystem:
-    def __init__(self, root: Path):
+    def __init__(self, root: Path, clock=None):
         self.root = Path(root)
+        # Injected latency goes through this clock, so a VirtualClock makes it free
+        self.clock = clock if clock is not None else RealClock()
 
     def _maybe_fail(self, fail_rate=0.1, ignore_rate=0, latency=0.2):
         # Randomly raise an exception
@@ -20,7 +22,7 @@ class FileSystem:
         if random.random() < 0.2:
             delay = random.uniform(0, latency)
             print(f"Injecting latency: {delay:.2f}s")
-            time.sleep(delay)
+            self.clock.sleep(delay)
         return False
 
     def _maybe_corrupt(self, data):
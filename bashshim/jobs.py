@@ -0,0 +1,163 @@
+"""Background jobs: `cmd &`, `jobs`, `wait`, `fg` and `kill %N`.
+
+Each BashShim owns a JobTable. A job runs on the table's thread pool while
+the shell keeps taking commands. Its output is buffered on the Job until
+`fg` or `wait` collects it, and while it runs it has a pid with an entry in
+/proc, so `ps` and `kill` see it like any other process.
+"""
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TERMINATED_STATUS = 128 + 15  # exit status of a job stopped by `kill` (SIGTERM)
+
+
+class Job:
+    def __init__(self, number, pid, command):
+        self.number = number
+        self.pid = pid
+        self.command = command
+        self.code = None
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self._chunks = []
+        self._processes = set()
+        self._lock = threading.Lock()
+
+    @property
+    def status(self):
+        if not self.done.is_set():
+            return 'Running'
+        if self.code == 0:
+            return 'Done'
+        if self.cancelled.is_set():
+            return 'Terminated'
+        return f'Exit {self.code}'
+
+    def write(self, chunk):
+        with self._lock:
+            self._chunks.append(chunk)
+
+    @property
+    def has_output(self):
+        return bool(self._chunks)
+
+    def take_output(self):
+        """Return the output buffered so far and clear it."""
+        with self._lock:
+            data = ''.join(self._chunks)
+            self._chunks = []
+        return data
+
+    def attach(self, process):
+        """Register a child process (subprocess.Popen) that kill() should terminate."""
+        with self._lock:
+            self._processes.add(process)
+        if self.cancelled.is_set():
+            self._terminate(process)
+
+    def detach(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def kill(self):
+        self.cancelled.set()
+        with self._lock:
+            processes = list(self._processes)
+        for process in processes:
+            self._terminate(process)
+
+    @staticmethod
+    def _terminate(process):
+        try:
+            process.terminate()
+        except OSError:
+            pass
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; False if `timeout` ran out first."""
+        return self.done.wait(timeout)
+
+
+class JobTable:
+    def __init__(self, max_workers=8, first_pid=4000):
+        """
+        max_workers: jobs that can run at the same time; later ones queue.
+        first_pid: pid of the first job, counting up from there.
+        """
+        self.max_workers = max_workers
+        self._executor = None
+        self._jobs = {}  # number -> Job, oldest first
+        self._pids = itertools.count(first_pid)
+        self._lock = threading.Lock()
+
+    def submit(self, command, run, prepare=None):
+        """Start `run(job)` in the background; its return value becomes the job's exit status.
+
+        `prepare(job)` is called before the job starts, e.g. to give it a /proc entry.
+        """
+        with self._lock:
+            number = max(self._jobs, default=0) + 1
+            job = Job(number, next(self._pids), command)
+            self._jobs[number] = job
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bashshim-job')
+        if prepare is not None:
+            prepare(job)
+        self._executor.submit(self._run, job, run)
+        return job
+
+    @staticmethod
+    def _run(job, run):
+        try:
+            code = run(job)
+        except Exception as e:
+            job.write(f"bashshim: job {job.number}: {e}\n")
+            code = 1
+        job.code = TERMINATED_STATUS if job.cancelled.is_set() else code
+        job.done.set()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._jobs.values()))
+
+    def __len__(self):
+        return len(self._jobs)
+
+    @property
+    def current(self):
+        """The job `%+` refers to: the most recently started one."""
+        jobs = list(self)
+        return jobs[-1] if jobs else None
+
+    @property
+    def previous(self):
+        jobs = list(self)
+        return jobs[-2] if len(jobs) > 1 else None
+
+    def get(self, spec):
+        """Look up a job by %N, %+ / %% / %, %-, %prefix (of its command) or pid; None if there is none."""
+        if not spec.startswith('%'):
+            if spec.isdigit():
+                return next((job for job in self if job.pid == int(spec)), None)
+            return None
+        ref = spec[1:]
+        if ref in ('', '+', '%'):
+            return self.current
+        if ref == '-':
+            return self.previous
+        if ref.isdigit():
+            return self._jobs.get(int(ref))
+        return next((job for job in reversed(list(self)) if job.command.startswith(ref)), None)
+
+    def remove(self, job):
+        with self._lock:
+            self._jobs.pop(job.number, None)
+
+    def shutdown(self):
+        """Kill every job and wait for the worker threads to finish."""
+        for job in self:
+            job.kill()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
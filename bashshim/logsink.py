@@ -0,0 +1,154 @@
+"""Buffered, append-only writer for the session log (bashshim.log).
+
+BashShim logs several lines per command. LogSink batches them and appends
+through one open handle, instead of reopening the file for every line. It
+flushes once enough bytes are pending or enough time has passed since the
+last flush, rotates the file at a configurable size, and flushes whatever is
+left when the sink is closed, garbage collected, or the interpreter exits.
+"""
+import contextlib
+import threading
+import time
+import weakref
+from pathlib import Path
+
+
+class _Pending:
+    """The state a finalizer needs, kept apart from LogSink so it does not keep the sink alive."""
+    __slots__ = ('fs', 'path', 'lines', 'size', 'handle')
+
+    def __init__(self, fs, path):
+        self.fs = fs
+        self.path = path
+        self.lines = []
+        self.size = 0
+        self.handle = None
+
+    def write_out(self):
+        if not self.lines:
+            return 0
+        # Records are only formatted now, in one batch
+        data = ''.join(f"{line}\n" for line in self.lines)
+        self.lines = []
+        self.size = 0
+        try:
+            if self.handle is None:
+                self.handle = self.fs.open(self.path, 'a', encoding='utf-8')
+            self.handle.write(data)
+            self.handle.flush()
+        except (OSError, ValueError):
+            # e.g. the fakeroot does not exist (yet); the lines are still in the dmesg buffer
+            self.close()
+            return 0
+        return len(data.encode('utf-8'))
+
+    def close(self):
+        handle, self.handle = self.handle, None
+        if handle is not None:
+            try:
+                handle.close()
+            except (OSError, ValueError):
+                pass
+
+
+def _finalize(pending):
+    pending.write_out()
+    pending.close()
+
+
+class LogSink:
+    def __init__(self, fs, path, flush_bytes=64 * 1024, flush_interval=1.0, max_bytes=None, backups=1):
+        """
+        fs: FileSystem-compatible backend the log lives on.
+        flush_bytes / flush_interval: flush once this many bytes are pending, or
+            this many seconds have passed since the last flush (0 flushes every line).
+        max_bytes: rotate to `<path>.1` (keeping `backups` old files) once the file
+            would grow past this size; None never rotates.
+        """
+        self.path = Path(path)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._pending = _Pending(fs, self.path)
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+        self._written = None  # size of the current file, looked up on first flush
+        self._deferred = 0
+        self.flushes = 0
+        self.rotations = 0
+        self._finalizer = weakref.finalize(self, _finalize, self._pending)
+
+    @property
+    def fs(self):
+        return self._pending.fs
+
+    def write(self, line):
+        """Queue one log line: a string, or a record that str() formats at flush time."""
+        with self._lock:
+            self._pending.lines.append(line)
+            # Approximate for records, whose text does not exist yet
+            self._pending.size += len(getattr(line, 'msg', line)) + 1
+            if self._pending.size >= self.flush_bytes:
+                self.flush()
+            elif not self._deferred and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    @contextlib.contextmanager
+    def deferred(self):
+        """Only flush for size inside the block, then flush once at its end (see BashShim.run_batch)."""
+        with self._lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._deferred -= 1
+                if not self._deferred:
+                    self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending.lines:
+                return
+            if self.max_bytes is not None:
+                if self._written is None:
+                    try:
+                        self._written = self.fs.stat(self.path).st_size
+                    except OSError:
+                        self._written = 0
+                if self._written and self._written + self._pending.size > self.max_bytes:
+                    self._rotate()
+            written = self._pending.write_out()
+            if self._written is not None:
+                self._written += written
+            self.flushes += 1
+
+    def _rotate(self):
+        self._pending.close()
+        fs = self.fs
+        for i in range(self.backups, 0, -1):
+            src = self.path if i == 1 else self.path.with_name(f"{self.path.name}.{i - 1}")
+            if fs.exists(src):
+                fs.rename(src, self.path.with_name(f"{self.path.name}.{i}"))
+        if not self.backups and fs.exists(self.path):
+            fs.remove(self.path)
+        self._written = 0
+        self.rotations += 1
+
+    def reopen(self):
+        """Flush and drop the open handle; the next flush opens the file again.
+
+        Needed whenever the file may have been replaced behind the sink's back,
+        e.g. after the fakeroot was rebuilt or a snapshot restored.
+        """
+        with self._lock:
+            self.flush()
+            self._pending.close()
+            self._written = None
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            self._finalizer()
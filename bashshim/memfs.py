@@ -0,0 +1,389 @@
+"""In-memory FileSystem backend.
+
+MemoryFileSystem implements the same interface as bashshim.filesystem.FileSystem
+on a tree of small inode objects, so a BashShim using it never touches the
+disk. Paths are the same absolute paths the shell already uses; everything
+below `root` lives in memory and nothing outside it exists. File contents are
+interned in a MemoryBlobStore, so identical files share one copy.
+"""
+import errno
+import io
+import itertools
+import os
+import stat as stat_mod
+import time
+from pathlib import Path
+
+from .blobstore import Blob, MemoryBlobStore
+
+_UID = os.getuid() if hasattr(os, 'getuid') else 0
+_GID = os.getgid() if hasattr(os, 'getgid') else 0
+_EMPTY = Blob(b'')
+
+
+class _Node:
+    __slots__ = ('ino', 'gen', 'mtime', 'atime', 'ctime')
+
+    def __init__(self, ino, gen):
+        self.ino = ino
+        self.gen = gen
+        self.mtime = self.atime = self.ctime = time.time()
+
+    def touch(self):
+        self.mtime = self.ctime = time.time()
+
+    def clone(self, gen):
+        """Copy of this node owned by generation `gen`; the original stays untouched."""
+        node = self.__class__.__new__(self.__class__)
+        node.ino, node.gen = self.ino, gen
+        node.mtime, node.atime, node.ctime = self.mtime, self.atime, self.ctime
+        return node
+
+
+class _Dir(_Node):
+    __slots__ = ('children',)
+    mode = stat_mod.S_IFDIR | 0o755
+
+    def __init__(self, ino, gen):
+        super().__init__(ino, gen)
+        self.children = {}
+
+    def clone(self, gen):
+        node = super().clone(gen)
+        node.children = dict(self.children)
+        return node
+
+
+class _File(_Node):
+    # `tail`, when set, holds the whole content of a file being appended to; it
+    # replaces `blob` until MemoryFileSystem._seal() interns it
+    __slots__ = ('blob', 'tail')
+    mode = stat_mod.S_IFREG | 0o644
+
+    def __init__(self, ino, gen, blob=None):
+        super().__init__(ino, gen)
+        self.blob = blob if blob is not None else _EMPTY
+        self.tail = None
+
+    @property
+    def data(self):
+        return self.blob.data if self.tail is None else bytes(self.tail)
+
+    @property
+    def size(self):
+        return len(self.blob.data if self.tail is None else self.tail)
+
+    def clone(self, gen):
+        node = super().clone(gen)
+        node.blob = self.blob
+        node.tail = None if self.tail is None else bytearray(self.tail)
+        return node
+
+
+def _error(exc, code, path):
+    return exc(code, os.strerror(code), str(path))
+
+
+class _MemoryWriter(io.BytesIO):
+    """Buffer for writable handles; contents are stored back into the file on flush/close.
+
+    An append-only handle buffers just what was written since its last flush and
+    appends that to the file, so flushing costs the size of the new data only.
+    """
+
+    def __init__(self, fs, path, initial=b'', append=False, append_only=False):
+        super().__init__(b'' if append_only else initial)
+        self._fs = fs
+        self._path = path
+        self._append_only = append_only
+        if append:
+            self.seek(0, io.SEEK_END)
+
+    def flush(self):
+        super().flush()
+        if self.closed:
+            return
+        # Looked up again each time in case a snapshot froze the node meanwhile
+        if self._append_only:
+            if self.tell():
+                with self.getbuffer() as data:
+                    self._fs._append(self._fs._file(self._path, create=True), data)
+                self.seek(0)
+                self.truncate()
+        else:
+            self._fs._replace(self._fs._file(self._path, create=True), bytearray(self.getbuffer()))
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+            if not self._append_only:
+                # A rewritten file is done changing; share its content with identical files
+                self._fs._seal(self._fs._file(self._path, create=True))
+        super().close()
+
+
+class MemoryFileSystem:
+    """In-memory backend with O(1) copy-on-write snapshots.
+
+    Every node records the generation that created it. snapshot() starts a new
+    generation, which freezes all existing nodes; the first change to a frozen
+    node copies it and the directories above it. Snapshots are plain references
+    to an old root and can be restored any number of times.
+    """
+    on_disk = False
+
+    def __init__(self, root: Path, blobs=None):
+        self.root = Path(root)
+        # Pass one MemoryBlobStore to several filesystems to share contents between them
+        self.blobs = blobs if blobs is not None else MemoryBlobStore()
+        self._inodes = itertools.count(1)
+        self._gen = 0
+        self._tree = _Dir(next(self._inodes), self._gen)
+        self._unsealed = set()  # file nodes whose content is in `tail`
+
+    # -------------------- path helpers --------------------
+    def _parts(self, path):
+        path = Path(os.path.normpath(str(path)))
+        try:
+            return path.relative_to(self.root).parts
+        except ValueError:
+            raise _error(FileNotFoundError, errno.ENOENT, path) from None
+
+    def _lookup(self, path):
+        """Return the node at `path` (read-only), raising the matching OSError if it is missing."""
+        node = self._tree
+        if node is None:
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        for part in self._parts(path):
+            if not isinstance(node, _Dir):
+                raise _error(NotADirectoryError, errno.ENOTDIR, path)
+            node = node.children.get(part)
+            if node is None:
+                raise _error(FileNotFoundError, errno.ENOENT, path)
+        return node
+
+    def _writable_dir(self, parts, path):
+        """Walk to the directory at `parts`, copying frozen nodes on the way so it can be modified."""
+        if self._tree is None:
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        if self._tree.gen != self._gen:
+            self._tree = self._tree.clone(self._gen)
+        node = self._tree
+        for part in parts:
+            child = node.children.get(part)
+            if child is None:
+                raise _error(FileNotFoundError, errno.ENOENT, path)
+            if not isinstance(child, _Dir):
+                raise _error(NotADirectoryError, errno.ENOTDIR, path)
+            if child.gen != self._gen:
+                child = node.children[part] = child.clone(self._gen)
+            node = child
+        return node
+
+    def _parent(self, path):
+        """Return (writable parent directory node, name) for `path`."""
+        parts = self._parts(path)
+        if not parts:
+            # Only the root has no parent, and it is a directory
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        return self._writable_dir(parts[:-1], path), parts[-1]
+
+    def _file(self, path, create=False, exclusive=False):
+        """Return the writable file node at `path`."""
+        parent, name = self._parent(path)
+        node = parent.children.get(name)
+        if node is not None and exclusive:
+            raise _error(FileExistsError, errno.EEXIST, path)
+        if isinstance(node, _Dir):
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        if node is None:
+            if not create:
+                raise _error(FileNotFoundError, errno.ENOENT, path)
+            node = parent.children[name] = _File(next(self._inodes), self._gen)
+            parent.touch()
+        elif node.gen != self._gen:
+            node = parent.children[name] = node.clone(self._gen)
+        return node
+
+    def _read_file(self, path):
+        node = self._lookup(path)
+        if isinstance(node, _Dir):
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        if node.gen == self._gen:
+            node.atime = time.time()
+        self._seal(node)
+        return node
+
+    # -------------------- contents --------------------
+    def _store(self, node, data):
+        node.blob = self.blobs.put(data)
+        node.tail = None
+        self._unsealed.discard(node)
+        node.touch()
+
+    def _replace(self, node, data):
+        """Set the content of `node` to the bytearray `data` without interning it yet."""
+        node.tail = data
+        node.blob = _EMPTY
+        self._unsealed.add(node)
+        node.touch()
+
+    def _append(self, node, data):
+        """Append bytes to `node` in place; the content is interned only when read or snapshotted."""
+        if node.tail is None:
+            node.tail = bytearray(node.blob.data)
+            node.blob = _EMPTY  # the blob may be freed while `tail` holds the content
+            self._unsealed.add(node)
+        node.tail += data
+        node.touch()
+
+    def _seal(self, node):
+        if node.tail is not None:
+            node.blob = self.blobs.put(bytes(node.tail))
+            node.tail = None
+            self._unsealed.discard(node)
+
+    # -------------------- snapshots --------------------
+    def snapshot(self):
+        """Freeze the current tree and return it as an opaque restore token."""
+        for node in list(self._unsealed):
+            self._seal(node)
+        self._gen += 1
+        return self._tree
+
+    def restore(self, token):
+        self._tree = token
+        self._gen += 1
+
+    # -------------------- FileSystem interface --------------------
+    def exists(self, path):
+        try:
+            self._lookup(path)
+            return True
+        except OSError:
+            return False
+
+    def mkdir(self, path, exist_ok=False, parents=False):
+        if not self._parts(path):
+            if self._tree is None:
+                self._tree = _Dir(next(self._inodes), self._gen)
+            elif not exist_ok:
+                raise _error(FileExistsError, errno.EEXIST, path)
+            return
+        try:
+            parent, name = self._parent(path)
+        except FileNotFoundError:
+            if not parents:
+                raise
+            self.mkdir(Path(path).parent, exist_ok=True, parents=True)
+            parent, name = self._parent(path)
+        node = parent.children.get(name)
+        if node is not None:
+            if exist_ok and isinstance(node, _Dir):
+                return
+            raise _error(FileExistsError, errno.EEXIST, path)
+        parent.children[name] = _Dir(next(self._inodes), self._gen)
+        parent.touch()
+
+    def rmdir(self, path):
+        """Remove a directory tree, like shutil.rmtree."""
+        node = self._lookup(path)
+        if not isinstance(node, _Dir):
+            raise _error(NotADirectoryError, errno.ENOTDIR, path)
+        if not self._parts(path):
+            self._tree = None
+            return
+        parent, name = self._parent(path)
+        del parent.children[name]
+        parent.touch()
+
+    def listdir(self, path):
+        node = self._lookup(path)
+        if not isinstance(node, _Dir):
+            raise _error(NotADirectoryError, errno.ENOTDIR, path)
+        return list(node.children)
+
+    def open(self, path, mode='r', encoding=None):
+        binary = 'b' in mode
+        if 'r' in mode and '+' not in mode:
+            raw = io.BytesIO(self._read_file(path).data)
+        else:
+            node = self._file(path, create='r' not in mode, exclusive='x' in mode)
+            if 'w' in mode or 'x' in mode:
+                self._store(node, b'')
+            append_only = 'a' in mode and '+' not in mode
+            raw = _MemoryWriter(self, path, b'' if append_only else node.data,
+                                append='a' in mode, append_only=append_only)
+        if binary:
+            return raw
+        return io.TextIOWrapper(raw, encoding=encoding or 'utf-8')
+
+    def read_text(self, path):
+        return self._read_file(path).data.decode('utf-8')
+
+    def write_text(self, path, data):
+        self._store(self._file(path, create=True), data.encode('utf-8'))
+        return len(data)
+
+    def touch(self, path, exist_ok=True):
+        node = self._file(path, create=True, exclusive=not exist_ok)
+        node.touch()
+
+    def remove(self, path):
+        parent, name = self._parent(path)
+        node = parent.children.get(name)
+        if node is None:
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        if isinstance(node, _Dir):
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        del parent.children[name]
+        parent.touch()
+
+    def rename(self, src, dst):
+        """Move `src` to `dst`, replacing an existing file there (like os.replace)."""
+        node = self._lookup(src)
+        if not self._parts(src):
+            raise _error(OSError, errno.EBUSY, src)
+        src_parent, src_name = self._parent(src)
+        dst_parent, dst_name = self._parent(dst)
+        target = dst_parent.children.get(dst_name)
+        if isinstance(target, _Dir) and not isinstance(node, _Dir):
+            raise _error(IsADirectoryError, errno.EISDIR, dst)
+        if isinstance(node, _Dir) and target is not None and (not isinstance(target, _Dir) or target.children):
+            raise _error(OSError, errno.ENOTEMPTY if isinstance(target, _Dir) else errno.ENOTDIR, dst)
+        # Take the node from the writable parent; _lookup may have returned a frozen path
+        node = src_parent.children.pop(src_name)
+        dst_parent.children[dst_name] = node
+        src_parent.touch()
+        dst_parent.touch()
+
+    def stat(self, path):
+        node = self._lookup(path)
+        if isinstance(node, _Dir):
+            size = 4096
+            nlink = 2 + sum(isinstance(c, _Dir) for c in node.children.values())
+        else:
+            size = node.size
+            nlink = 1
+        return os.stat_result((node.mode, node.ino, 0, nlink, _UID, _GID, size,
+                               node.atime, node.mtime, node.ctime),
+                              {'st_blksize': 4096, 'st_blocks': (size + 511) // 512})
+
+    def is_file(self, path):
+        try:
+            return isinstance(self._lookup(path), _File)
+        except OSError:
+            return False
+
+    def is_dir(self, path):
+        try:
+            return isinstance(self._lookup(path), _Dir)
+        except OSError:
+            return False
+
+    def resolve(self, path):
+        # There are no symlinks in memory, so resolving is purely lexical
+        return Path(os.path.normpath(str(path)))
+
+    def append_text(self, path, data):
+        self._append(self._file(path, create=True), data.encode('utf-8'))
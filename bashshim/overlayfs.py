@@ -0,0 +1,228 @@
+"""Copy-on-write overlay FileSystem.
+
+OverlayFileSystem merges a read-only lower layer, typically one populated
+base tree shared by many sessions, with a per-session upper layer. Reads fall
+through to the lower layer. Writes copy the file up first. Deletions of lower
+entries are recorded as whiteouts, so the lower layer is never modified.
+"""
+import errno
+import os
+from pathlib import Path
+
+from .memfs import MemoryFileSystem
+
+
+def _error(exc, code, path):
+    return exc(code, os.strerror(code), str(path))
+
+
+class OverlayFileSystem:
+    on_disk = False
+
+    def __init__(self, root: Path, lower, upper=None):
+        self.root = Path(root)
+        self.lower = lower
+        self.upper = upper if upper is not None else MemoryFileSystem(self.root)
+        # Relative paths (tuples of parts) hidden in the lower layer, including everything below them
+        self.whiteouts = set()
+        # Directories recreated after a whiteout; lower entries below them stay hidden
+        self.opaque = set()
+
+    # -------------------- path helpers --------------------
+    def _rel(self, path):
+        path = Path(os.path.normpath(str(path)))
+        try:
+            return path.relative_to(self.root).parts
+        except ValueError:
+            raise _error(FileNotFoundError, errno.ENOENT, path) from None
+
+    def _up(self, rel):
+        return self.upper.root.joinpath(*rel)
+
+    def _low(self, rel):
+        return self.lower.root.joinpath(*rel)
+
+    def _lower_visible(self, rel):
+        for i in range(len(rel) + 1):
+            prefix = rel[:i]
+            if prefix in self.whiteouts:
+                return False
+            if i < len(rel) and prefix in self.opaque:
+                return False
+        return True
+
+    def _in_lower(self, rel):
+        return self._lower_visible(rel) and self.lower.exists(self._low(rel))
+
+    def _layer(self, rel, path):
+        """Return (backend, backend path) currently providing `rel`."""
+        up = self._up(rel)
+        if self.upper.exists(up):
+            return self.upper, up
+        if self._in_lower(rel):
+            return self.lower, self._low(rel)
+        raise _error(FileNotFoundError, errno.ENOENT, path)
+
+    def _copy_up_parent(self, rel, path):
+        """Make sure the directory containing `rel` exists in the upper layer."""
+        parent = rel[:-1]
+        if self.upper.is_dir(self._up(parent)):
+            return
+        if not self.is_dir(self.root.joinpath(*parent)):
+            if self.exists(self.root.joinpath(*parent)):
+                raise _error(NotADirectoryError, errno.ENOTDIR, path)
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        self.upper.mkdir(self._up(parent), parents=True, exist_ok=True)
+
+    def _copy_up(self, rel, path, keep_data=True):
+        """Give the upper layer its own copy of a file before it is modified."""
+        up = self._up(rel)
+        if self.upper.exists(up):
+            return up
+        self._copy_up_parent(rel, path)
+        if keep_data and self._in_lower(rel):
+            if self.lower.is_dir(self._low(rel)):
+                raise _error(IsADirectoryError, errno.EISDIR, path)
+            with self.lower.open(self._low(rel), 'rb') as src:
+                data = src.read()
+            with self.upper.open(up, 'wb') as dst:
+                dst.write(data)
+        self.whiteouts.discard(rel)
+        return up
+
+    def _hide(self, rel):
+        if self._in_lower(rel):
+            self.whiteouts.add(rel)
+        # Anything recorded below a hidden path is now irrelevant
+        self.whiteouts = {w for w in self.whiteouts if w[:len(rel)] != rel or w == rel}
+        self.opaque = {o for o in self.opaque if o[:len(rel)] != rel}
+
+    # -------------------- snapshots --------------------
+    def snapshot(self):
+        # Cost is proportional to the session's own changes, never to the lower layer
+        return (self.upper.snapshot(), frozenset(self.whiteouts), frozenset(self.opaque))
+
+    def restore(self, token):
+        upper, whiteouts, opaque = token
+        self.upper.restore(upper)
+        self.whiteouts = set(whiteouts)
+        self.opaque = set(opaque)
+
+    # -------------------- FileSystem interface --------------------
+    def exists(self, path):
+        rel = self._rel(path)
+        return self.upper.exists(self._up(rel)) or self._in_lower(rel)
+
+    def is_file(self, path):
+        try:
+            backend, real = self._layer(self._rel(path), path)
+        except OSError:
+            return False
+        return backend.is_file(real)
+
+    def is_dir(self, path):
+        try:
+            backend, real = self._layer(self._rel(path), path)
+        except OSError:
+            return False
+        return backend.is_dir(real)
+
+    def mkdir(self, path, exist_ok=False, parents=False):
+        rel = self._rel(path)
+        if self.exists(path):
+            if exist_ok and self.is_dir(path):
+                return
+            raise _error(FileExistsError, errno.EEXIST, path)
+        if rel and not self.exists(self.root.joinpath(*rel[:-1])):
+            if not parents:
+                raise _error(FileNotFoundError, errno.ENOENT, path)
+            self.mkdir(self.root.joinpath(*rel[:-1]), exist_ok=True, parents=True)
+        if rel:
+            self._copy_up_parent(rel, path)
+        self.upper.mkdir(self._up(rel), parents=True, exist_ok=True)
+        if self.lower.exists(self._low(rel)):
+            # Recreated over a deleted lower directory: start out empty
+            self.opaque.add(rel)
+        self.whiteouts.discard(rel)
+
+    def rmdir(self, path):
+        """Remove a directory tree, like shutil.rmtree."""
+        rel = self._rel(path)
+        if not self.is_dir(path):
+            if self.exists(path):
+                raise _error(NotADirectoryError, errno.ENOTDIR, path)
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        if self.upper.exists(self._up(rel)):
+            self.upper.rmdir(self._up(rel))
+        self._hide(rel)
+
+    def listdir(self, path):
+        rel = self._rel(path)
+        if not self.is_dir(path):
+            if self.exists(path):
+                raise _error(NotADirectoryError, errno.ENOTDIR, path)
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        names = []
+        if self.upper.is_dir(self._up(rel)):
+            names = self.upper.listdir(self._up(rel))
+        if self._in_lower(rel) and self.lower.is_dir(self._low(rel)) and rel not in self.opaque:
+            seen = set(names)
+            names = names + [n for n in self.lower.listdir(self._low(rel))
+                             if n not in seen and rel + (n,) not in self.whiteouts]
+        return names
+
+    def open(self, path, mode='r', encoding=None):
+        rel = self._rel(path)
+        if 'r' in mode and '+' not in mode:
+            backend, real = self._layer(rel, path)
+            return backend.open(real, mode, encoding=encoding)
+        if 'x' in mode and self.exists(path):
+            raise _error(FileExistsError, errno.EEXIST, path)
+        up = self._copy_up(rel, path, keep_data='w' not in mode)
+        return self.upper.open(up, mode, encoding=encoding)
+
+    def read_text(self, path):
+        backend, real = self._layer(self._rel(path), path)
+        return backend.read_text(real)
+
+    def write_text(self, path, data):
+        if self.is_dir(path):
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        return self.upper.write_text(self._copy_up(self._rel(path), path, keep_data=False), data)
+
+    def touch(self, path, exist_ok=True):
+        if self.exists(path) and not exist_ok:
+            raise _error(FileExistsError, errno.EEXIST, path)
+        self.upper.touch(self._copy_up(self._rel(path), path), exist_ok=True)
+
+    def remove(self, path):
+        rel = self._rel(path)
+        if self.is_dir(path):
+            raise _error(IsADirectoryError, errno.EISDIR, path)
+        if not self.exists(path):
+            raise _error(FileNotFoundError, errno.ENOENT, path)
+        if self.upper.exists(self._up(rel)):
+            self.upper.remove(self._up(rel))
+        self._hide(rel)
+
+    def rename(self, src, dst):
+        """Move a file. Like overlayfs without redirect_dir, directories cannot be renamed (EXDEV)."""
+        if self.is_dir(src):
+            raise _error(OSError, errno.EXDEV, src)
+        if self.is_dir(dst):
+            raise _error(IsADirectoryError, errno.EISDIR, dst)
+        with self.open(src, 'rb') as f:
+            data = f.read()
+        with self.open(dst, 'wb') as f:
+            f.write(data)
+        self.remove(src)
+
+    def stat(self, path):
+        backend, real = self._layer(self._rel(path), path)
+        return backend.stat(real)
+
+    def resolve(self, path):
+        return Path(os.path.normpath(str(path)))
+
+    def append_text(self, path, data):
+        self.upper.append_text(self._copy_up(self._rel(path), path), data)
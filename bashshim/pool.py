@@ -0,0 +1,206 @@
+"""Pool of pre-built BashShim sessions.
+
+Building a session (shell variables, fakeroot, /proc, logging) happens on
+background threads so that acquire() usually hands out a ready session
+instead of paying that cost on the caller's critical path.
+"""
+import itertools
+import queue
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .shell import BashShim
+from .syntax import ParseError, parse
+
+
+class SessionPool:
+    def __init__(self, size=4, refill_workers=1, factory=None, recycle=False, **shim_kwargs):
+        """
+        size: number of sessions kept ready.
+        refill_workers: how many sessions may be built concurrently.
+        factory: zero-argument callable returning a new BashShim. By default each
+            session gets its own fakeroot in a temporary directory owned by the pool,
+            built with `shim_kwargs`.
+        recycle: snapshot each session once it is built and, on release, restore it
+            and hand it out again instead of building a replacement.
+        """
+        if factory is not None and shim_kwargs:
+            raise ValueError("pass either factory= or BashShim keyword arguments, not both")
+        if 'fakeroot' in shim_kwargs or 'filesystem' in shim_kwargs:
+            raise ValueError("pooled sessions need separate filesystems; use factory= to provide them")
+        self.size = size
+        self._factory = factory
+        self._shim_kwargs = shim_kwargs
+        self.recycle = recycle
+        self._baselines = weakref.WeakKeyDictionary()
+        self._workdir = None
+        self._serial = itertools.count(1)
+        self._ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._checked_out = 0  # recycled sessions currently handed out
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=refill_workers, thread_name_prefix='bashshim-pool')
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.built = 0
+        self.errors = 0
+        self._refill()
+
+    # -------------------- building --------------------
+    def _build(self):
+        if self._factory is not None:
+            shim = self._factory()
+        else:
+            with self._lock:
+                if self._workdir is None:
+                    self._workdir = Path(tempfile.mkdtemp(prefix='bashshim-pool-'))
+            fakeroot = self._workdir / f"session-{next(self._serial)}"
+            shim = BashShim(fakeroot=fakeroot, **self._shim_kwargs)
+        if self.recycle:
+            self._baselines[shim] = shim.snapshot()
+        with self._lock:
+            self.built += 1
+        return shim
+
+    def _build_into_pool(self):
+        try:
+            shim = self._build()
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+                self.errors += 1
+            return
+        with self._lock:
+            self._pending -= 1
+            closed = self._closed
+        if closed:
+            self._discard(shim)
+        else:
+            self._ready.put(shim)
+
+    def _refill(self):
+        with self._lock:
+            if self._closed:
+                return
+            missing = self.size - self._ready.qsize() - self._pending - self._checked_out
+            self._pending += max(missing, 0)
+        for _ in range(missing):
+            self._executor.submit(self._build_into_pool)
+
+    def _discard(self, shim):
+        shim.close()
+        # Only remove fakeroots the pool created itself
+        if self._workdir is not None and self._workdir in shim.fakeroot.parents:
+            shutil.rmtree(shim.fakeroot, ignore_errors=True)
+
+    # -------------------- public API --------------------
+    def acquire(self):
+        """Return a ready session, building one inline if none is warm."""
+        if self._closed:
+            raise RuntimeError("SessionPool is closed")
+        try:
+            shim = self._ready.get_nowait()
+            with self._lock:
+                self.hits += 1
+        except queue.Empty:
+            with self._lock:
+                self.misses += 1
+            shim = self._build()
+        if shim in self._baselines:
+            with self._lock:
+                self._checked_out += 1
+        self._refill()
+        return shim
+
+    def release(self, shim):
+        """Hand a session back. It is torn down and a fresh one is built in the background.
+
+        With recycle=True the session is instead rolled back to its freshly built state
+        and returned to the pool.
+        """
+        if self._closed:
+            self._discard(shim)
+            return
+        baseline = self._baselines.get(shim)
+        if baseline is not None:
+            with self._lock:
+                self._checked_out -= 1
+                full = self._ready.qsize() + self._pending + self._checked_out >= self.size
+            if not full:
+                shim.restore(baseline)
+                with self._lock:
+                    self.recycled += 1
+                self._ready.put(shim)
+                return
+        self._executor.submit(self._discard, shim)
+        self._refill()
+
+    def run_batch(self, commands, sessions=None, stop_on_error=False):
+        """Run independent command lines across several pooled sessions at once.
+
+        The commands are split into `sessions` contiguous shares (default: up to the
+        pool size), each run by one session with BashShim.run_batch semantics, and the
+        CommandResults come back in input order. Each distinct command line is parsed
+        only once for the whole batch. stop_on_error stops a session's own share only.
+        """
+        commands = list(commands)
+        if not commands:
+            return []
+        trees = {}
+        for command in commands:
+            if command not in trees:
+                try:
+                    trees[command] = parse(command)
+                except ParseError as e:
+                    trees[command] = e
+        parsed = [(command, trees[command]) for command in commands]
+        sessions = max(1, min(sessions or self.size, len(parsed)))
+        share = -(-len(parsed) // sessions)
+        shares = [parsed[i:i + share] for i in range(0, len(parsed), share)]
+
+        def run_share(items):
+            shim = self.acquire()
+            try:
+                return shim._run_batch(items, stop_on_error)
+            finally:
+                self.release(shim)
+
+        with ThreadPoolExecutor(max_workers=len(shares), thread_name_prefix='bashshim-batch') as executor:
+            return [result for results in executor.map(run_share, shares) for result in results]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'ready': self._ready.qsize(),
+                'pending': self._pending,
+                'hits': self.hits,
+                'misses': self.misses,
+                'built': self.built,
+                'recycled': self.recycled,
+                'errors': self.errors,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=True)
+        while True:
+            try:
+                self._discard(self._ready.get_nowait())
+            except queue.Empty:
+                break
+        if self._workdir is not None:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
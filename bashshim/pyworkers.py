@@ -0,0 +1,219 @@
+"""Warm Python interpreters for the python3 command.
+
+Starting `python3` costs tens of milliseconds before the first line of a
+program runs. PythonWorkerPool keeps a few fork servers (bashshim/_pyworker.py)
+running with common modules already imported; each request forks one of them,
+so `python3 -c ...` only pays for a fork. Servers are replaced after
+`max_uses` requests or when one dies.
+
+Only plain `python3 -c CODE`, `python3 -m MODULE` and `python3 SCRIPT` runs
+are served here; anything with interpreter options, or without a program,
+still goes to a real subprocess. POSIX only (the servers fork).
+"""
+import locale
+import os
+import pickle
+import select
+import signal
+import struct
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+WORKER_SCRIPT = Path(__file__).with_name('_pyworker.py')
+DEFAULT_PRELOAD = ('collections', 'datetime', 'json', 'os', 'pathlib', 're', 'subprocess', 'typing')
+
+_HEADER = struct.Struct('>I')
+
+
+class WorkerTimeout(Exception):
+    """The program did not finish within the timeout; its worker has been killed."""
+
+
+def supported():
+    return os.name == 'posix' and hasattr(os, 'fork')
+
+
+def program(args, cwd):
+    """Split python3 arguments into (kind, target, argv) for a worker, or None if a worker cannot run them."""
+    if len(args) >= 2 and args[0] in ('-c', '-m'):
+        return args[0], args[1], list(args[2:])
+    if args and not args[0].startswith('-') and (Path(cwd) / args[0]).is_file():
+        return 'script', args[0], list(args[1:])
+    return None
+
+
+def decode(data):
+    """Decode child output the way subprocess.run(text=True) does."""
+    text = data.decode(locale.getpreferredencoding(False))
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+class _Worker:
+    def __init__(self, preload):
+        # Its own session, so that killing the group also reaches the forked child
+        self.process = subprocess.Popen(
+            [sys.executable, str(WORKER_SCRIPT), *preload],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, start_new_session=True
+        )
+        self.uses = 0
+        self.signalled = None
+
+    @property
+    def alive(self):
+        return self.process.poll() is None
+
+    def request(self, message, timeout=None):
+        """Send one request and return the reply, None if the worker died first."""
+        data = pickle.dumps(message)
+        try:
+            self.process.stdin.write(_HEADER.pack(len(data)) + data)
+            self.process.stdin.flush()
+        except OSError:
+            return None
+        stdout = self.process.stdout
+        ready, _, _ = select.select([stdout], [], [], timeout)
+        if not ready:
+            raise WorkerTimeout()
+        header = stdout.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            return None
+        reply = stdout.read(_HEADER.unpack(header)[0])
+        return pickle.loads(reply)
+
+    def _signal(self, sig):
+        self.signalled = sig
+        try:
+            os.killpg(self.process.pid, sig)
+        except OSError:
+            pass
+
+    def terminate(self):
+        """Stop the running program (used by `kill %N` through Job.attach)."""
+        self._signal(signal.SIGTERM)
+
+    def kill(self):
+        self._signal(signal.SIGKILL)
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        if self.process.poll() is None:
+            self.kill()
+        self.process.wait()
+        self.process.stdout.close()
+
+
+class PythonWorkerPool:
+    def __init__(self, size=2, max_uses=100, preload=DEFAULT_PRELOAD):
+        """
+        size: idle workers kept warm; more are started while that many are busy.
+        max_uses: requests a worker serves before it is replaced.
+        preload: modules imported by every worker at startup.
+        """
+        if not supported():
+            raise RuntimeError("Python worker pools need os.fork()")
+        self.size = size
+        self.max_uses = max_uses
+        self.preload = tuple(preload)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.runs = 0
+        self.spawned = 0
+        self.recycled = 0
+        for _ in range(size):
+            self._idle.append(self._spawn())
+
+    def _spawn(self):
+        with self._lock:
+            self.spawned += 1
+        return _Worker(self.preload)
+
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("PythonWorkerPool is closed")
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive:
+                    return worker
+                worker.close()
+        return self._spawn()
+
+    def _release(self, worker):
+        with self._lock:
+            keep = not self._closed and worker.uses < self.max_uses and len(self._idle) < self.size
+            if keep:
+                self._idle.append(worker)
+        if not keep:
+            worker.close()
+            self._replace()
+
+    def run(self, kind, target, args, cwd, env, timeout=None, limits=(None, None), job=None):
+        """Run a program from program() in a worker.
+
+        Returns (returncode, stdout bytes, stderr bytes) like a finished Popen, or None
+        when the worker died for reasons of its own (run the program normally then).
+        Raises WorkerTimeout after `timeout` seconds. `job`, if given, can kill the run.
+        """
+        worker = self._acquire()
+        if job is not None:
+            job.attach(worker)
+        try:
+            try:
+                reply = worker.request((kind, target, list(args), str(cwd), dict(env), tuple(limits)), timeout)
+            except WorkerTimeout:
+                worker.kill()
+                worker.close()
+                self._replace()
+                raise
+        finally:
+            if job is not None:
+                job.detach(worker)
+        with self._lock:
+            self.runs += 1
+        if reply is None:
+            signalled = worker.signalled
+            worker.close()
+            self._replace()
+            return None if signalled is None else (-signalled, b'', b'')
+        worker.uses += 1
+        self._release(worker)
+        return reply
+
+    def _replace(self):
+        """Count a worker as retired and start a new one if the pool is short."""
+        with self._lock:
+            self.recycled += 1
+            refill = not self._closed and len(self._idle) < self.size
+        if refill:
+            replacement = self._spawn()
+            with self._lock:
+                self._idle.append(replacement)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'runs': self.runs,
+                'spawned': self.spawned,
+                'recycled': self.recycled,
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,23 +1,32 @@
 import os
-import shutil
-import subprocess
 import random
-import socket
 from pathlib import Path
 from datetime import datetime, timedelta
 import sys
 import time
-import json
+import collections
+import copy
+import inspect
+import itertools
+import shlex
+import threading
 import time
-try:
-    import requests
-except Exception:  # pragma: no cover - optional dependency may not be present
-    requests = None
-from urllib.parse import urlparse
-import bashshim.turnstile_test as turnstile_test
+from typing import NamedTuple
 from bashshim.filesystem import FileSystem
 from .command_parser import CommandParser
-from . import curlshim  # new import
+from .syntax import ParseError, Subshell, unparse
+from . import streams
+from .streams import CommandStream, InputStream
+from . import devices
+from .blobstore import BlobStore
+from .logsink import LogSink
+from .dmesg import RingLog, LEVEL_NUMBERS, DEFAULT_CAPACITY, level_number
+from .clock import make_clock
+from .jobs import JobTable, TERMINATED_STATUS
+from .commands import REGISTRY, CommandTable
+from .budget import Budget, BudgetExceeded, KILLED_STATUS, TIMEOUT_STATUS
+# subprocess, asyncio, the template cache, python3 workers and the fallback coprocess
+# are imported where they are first used: most sessions never need them
 
 try:
     from bashshim import __version__ as bashshim_version
@@ -27,8 +36,77 @@ except ImportError:
         bashshim_version = version('bashshim')
     except Exception:
         bashshim_version = "unknown"
+
+def _host_name():
+    if hasattr(os, 'uname'):
+        return os.uname().nodename
+    import socket  # Windows has no os.uname()
+    return socket.gethostname()
+
+
+def _feed_stdin(stdin, fd):
+    """Thread body copying an InputStream into the write end `fd` of a child's stdin pipe."""
+    try:
+        with open(fd, 'wb') as pipe:
+            for chunk in stdin.chunks():
+                pipe.write(chunk.encode('utf-8'))
+                pipe.flush()
+    except OSError:
+        # The child stopped reading (it exited or was killed); stop the producer like SIGPIPE would
+        stdin.close()
+    except Exception:
+        # An upstream stage failed and reports its own status; the child just sees end of input
+        pass
+
+
+LENA_QUOTES = [
+    "# Lena Raine's music doesn't just soundtrack games—it soundtracks healing.",
+    "# When Lena composed Celeste, she didn't just write songs. She told a story trans girls could survive by.",
+    "# Lena's melodies are like safehouses: shimmering spaces where anxious hearts can breathe.",
+    "# Lena Raine supremacy isn't just about musical skill—it's about *truth through sound.*",
+    "# 'Resurrections' still makes me cry. And I'm not sorry about it.",
+    "# Lena and Erica are proof that queer love can thrive in a world that tried to erase us.",
+    "# You can *hear* the transition arc in Lena's music. It's not subtle. It's sacred.",
+    "# The moment you hear 'Reach for the Summit' and realize it's *about you*? That's when the magic hits.",
+    "# Lena Raine didn't just break into the game industry—she rewrote the sonic palette for how we feel.",
+    "# Every single ambient track Lena makes is like: 'Hey, what if anxiety had a soft place to land?'",
+    "# Lena Raine: the composer who made thousands of queer kids realize they weren't alone.",
+    "# Her Minecraft track 'Otherside' isn't just cool. It's *trans-coded astral rebellion.*",
+    "# Erica Lahaie's art + Lena Raine's sound = the trans power couple aesthetic pipeline.",
+    "# Lena's music feels like opening a locked journal and finding a page written by your future self.",
+    "# You don't *listen* to Celeste. You *heal* to it.",
+    "# The moment you realize REDSKY is Lena's inner storm, and you survived that storm too.",
+    "# Lena Raine made video game music emotional—and made emotion the point.",
+    "# Oneknowing didn't just push ambient boundaries. It whispered: 'You're allowed to *be.*'",
+    "# If you've ever cried while speedrunning a level, you probably owe Lena Raine royalties.",
+    "# Lena writes like someone who's lived the weight of invisibility—and composed her way out.",
+]
+
+
+class CommandResult(NamedTuple):
+    """One entry of BashShim.run_batch()'s result."""
+    command: str
+    code: int
+    output: str
+    duration: float  # seconds
+
+
+class ShellSnapshot:
+    """Opaque handle returned by BashShim.snapshot(); restore it with BashShim.restore()."""
+    __slots__ = ('fs_token', 'variables', 'cwd', 'is_root', 'proc_users', 'log_buffer', 'materialized')
+
+    def __init__(self, fs_token, variables, cwd, is_root, proc_users, log_buffer, materialized):
+        self.fs_token = fs_token
+        self.variables = variables
+        self.cwd = cwd
+        self.is_root = is_root
+        self.proc_users = proc_users
+        self.log_buffer = log_buffer
+        self.materialized = materialized
+
+
 class BashShim:
-    def __init__(self, fallback='error', os_flavor="Linux", kernel_version="5.15.0-fake", username="aurahack", uid=1337, distro_name="FakeOS", distro_codename="marie", distro_id="fakeos", distro_version="1.0", package_manager="apt", package_manager_mirror="http://package.fakeos.org", log_dmesg=True, allow_networking=True):
+    def __init__(self, fallback='error', os_flavor="Linux", kernel_version="5.15.0-fake", username="aurahack", uid=1337, distro_name="FakeOS", distro_codename="marie", distro_id="fakeos", distro_version="1.0", package_manager="apt", package_manager_mirror="http://package.fakeos.org", log_dmesg=True, allow_networking=True, template_cache=None, clock=None, lazy=False, filesystem=None, fakeroot=None, blob_store=None, log_max_bytes=None, log_backups=1, log_level='debug', log_capacity=DEFAULT_CAPACITY, parse_cache_size=256, job_workers=8, budget=None, python_workers=None, fallback_shell=None, command_registry=None):
         self.distro_name = distro_name
         self.distro_codename = distro_codename
         self.distro_id = distro_id
@@ -40,33 +118,70 @@ class BashShim:
         self.username = username
         self.uid = uid
         self.is_root = False  # toggled by sudo
-        self.hostname = socket.gethostname()
+        # dmesg ring buffer; records above log_level (e.g. 'debug' path lookups when set to 'info') are dropped
+        self._log_buffer = RingLog(log_capacity)
+        self.log_level = level_number(log_level)
+        self._dmesg_cursor = None  # last record shown by dmesg --follow
+        self.log_sink = None
+        self.hostname = _host_name()
         self.log_dmesg = log_dmesg
         self.allow_networking = allow_networking
         self.kernel_version = kernel_version
-        self.session_start = time.time()
+        # 'real', 'virtual' (sleeps advance simulated time instantly) or a clock object
+        self.clock = make_clock(clock)
+        self.session_start = self.clock.time()
 
         self.home = Path.home()
-        self.fakeroot = self.home / 'fakeroot'
-        self.fs = FileSystem(self.fakeroot)
+        # Either a directory for the fakeroot, or any FileSystem-compatible backend
+        # (e.g. bashshim.memfs.MemoryFileSystem) whose root becomes the fakeroot
+        if filesystem is not None and fakeroot is not None:
+            raise ValueError("pass either fakeroot= or filesystem=, not both")
+        # Deduplicated file contents for the on-disk fakeroot: a BlobStore, a directory, or True for the default one
+        if blob_store is True:
+            blob_store = BlobStore()
+        elif blob_store is not None and not isinstance(blob_store, BlobStore):
+            blob_store = BlobStore(blob_store)
+        if filesystem is not None and blob_store is not None:
+            raise ValueError("blob_store= only applies to the default on-disk filesystem")
+        if filesystem is not None:
+            self.fs = filesystem
+            self.fakeroot = Path(filesystem.root)
+        else:
+            self.fakeroot = Path(fakeroot).expanduser().resolve() if fakeroot is not None else self.home / 'fakeroot'
+            self.fs = FileSystem(self.fakeroot, blobs=blob_store)
         self.cwd = self.fakeroot
-        
+        # bashshim.log is appended to in batches through one open handle, rotating past log_max_bytes
+        self.log_sink = LogSink(self.fs, self.fakeroot / 'bashshim.log', max_bytes=log_max_bytes, backups=log_backups)
+        if hasattr(self.fs, 'unjournaled'):
+            # Snapshots leave the log alone: it only grows, and journaling it would mean rereading it
+            log = self.log_sink.path
+            self.fs.unjournaled.update([log] + [log.with_name(f"{log.name}.{i}") for i in range(1, log_backups + 1)])
+        # Prebuilt fakeroot images: a TemplateCache, a cache directory, or True for the default one
+        if template_cache is not None:
+            from .templates import TemplateCache
+        if template_cache is True:
+            template_cache = TemplateCache()
+        elif template_cache is not None and not isinstance(template_cache, TemplateCache):
+            template_cache = TemplateCache(template_cache)
+        self.template_cache = template_cache
+        # Lazy mode writes manifest entries only when a path resolves into them
+        self.lazy = lazy
+        self._manifest = None
+        self.proc_users = {}
 
         # Shell variable support
-        self._log(f"BashShim version {bashshim_version}")
-        self._log(f"bashshim: session started at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        self._log("BashShim version %s", bashshim_version)
+        self._log("bashshim: session started at %s", self.clock.now().strftime('%Y-%m-%d %H:%M:%S'))
         self.variables = {}
         self._init_shell_vars()
-        self._log(f"bashshim: initializing BashShim for user '{username}' on simulated OS '{self.sim_os}' (host: {self.hostname})")
-        self._log(f"bashshim: initialized shell variables for user '{self.username}'")
-        self.simulated = {
-            'echo': self.cmd_echo,
+        self._log("bashshim: initializing BashShim for user '%s' on simulated OS '%s' (host: %s)", username, self.sim_os, self.hostname)
+        self._log("bashshim: initialized shell variables for user '%s'", self.username)
+        # Commands with a module of their own (bashshim.commands) are imported on first use
+        self.simulated = CommandTable(self, {
             'pwd': self.cmd_pwd,
             'ls': self.cmd_ls,
             'cd': self.cmd_cd,
             'cat': self.cmd_cat,
-            'uname': self.cmd_uname,
-            'whoami': self.cmd_whoami,
             'sudo': self.cmd_sudo,
             'touch': self.cmd_touch,
             'ps': self.cmd_ps,
@@ -74,8 +189,6 @@ class BashShim:
             'false': lambda args: (1, ''),
             self.package_manager: self.cmd_pkg_manager,
             'python3': self.cmd_python3,
-            'hostname': self.cmd_hostname,
-            'uptime': self.cmd_uptime,
             'rm': self.cmd_rm,
             'mkdir': self.cmd_mkdir,
             'rmdir': self.cmd_rmdir,
@@ -86,50 +199,136 @@ class BashShim:
             'sleep': self.cmd_sleep,
             'read': self.cmd_read,
             'kill': self.cmd_kill,
-            'id': self.cmd_id,
-            'passwd': self.cmd_passwd,
-            'dmesg': self.cmd_dmesg,
-            'free': self.cmd_free,
-            'curl': lambda args: curlshim.run(self, args),  # decoupled curl
+            'jobs': self.cmd_jobs,
+            'wait': self.cmd_wait,
+            'fg': self.cmd_fg,
             'rebuildfs': self.cmd_rebuildfs,
             'type': self.cmd_type,  # <-- Add type command
-            'bc': self.cmd_bc,      # <-- Add bc command
+        }, command_registry if command_registry is not None else REGISTRY)
+        # Commands arun() can await natively instead of running on an executor thread,
+        # keyed by the blocking implementation so overriding a command disables its async twin
+        self._async_commands = {
+            self.cmd_sleep: self.acmd_sleep,
+            self.cmd_python3: self.acmd_python3,
         }
+        self._async_lock = None
+        # Background jobs (`cmd &`); _job is the job a forked session is running
+        self.jobs = JobTable(max_workers=job_workers)
+        self._job = None
+        # Limits for every dispatched command (see bashshim.budget); the default sets none
+        self.budget = budget if budget is not None else Budget()
+        self._limits = threading.local()  # deadline of the command running on each thread
+        # Warm interpreters for python3: a pool size, or a PythonWorkerPool to share between sessions
+        self._owns_python_workers = isinstance(python_workers, int) and python_workers > 0
+        if self._owns_python_workers:
+            from . import pyworkers
+            if pyworkers.supported():
+                python_workers = pyworkers.PythonWorkerPool(size=python_workers)
+            else:
+                python_workers = None
+        self.python_workers = python_workers or None
+        # Long-lived real shell for the subprocess fallback: True, a shell path, or a ShellCoprocess
+        if fallback_shell and self.fallback != 'subprocess':
+            raise ValueError("fallback_shell needs fallback='subprocess'")
+        self._owns_fallback_shell = fallback_shell is True or isinstance(fallback_shell, (str, Path))
+        if self._owns_fallback_shell:
+            from .coprocess import ShellCoprocess
+        if fallback_shell is True:
+            fallback_shell = ShellCoprocess()
+        elif isinstance(fallback_shell, (str, Path)):
+            fallback_shell = ShellCoprocess(str(fallback_shell))
+        self.fallback_shell = fallback_shell or None
         # Parser helper (shares variables dict reference)
-        self.parser = CommandParser(self.variables)
+        self._stdin_support = {}
+        self.parser = CommandParser(self.variables, env=dict(os.environ), cache_size=parse_cache_size)
         
-        self._init_fakeroot()
-        self._create_proc()
+        if self._init_fakeroot() == 'template':
+            self._register_procs()
+        else:
+            self._create_proc()
         self._log("bashshim: startup complete")
 
 
-    def _log(self, msg):
-        now = datetime.now().strftime('%b %d %H:%M:%S')
-        if not hasattr(self, '_log_buffer'):
-            self._log_buffer = []
-        log_entry = f"[{now}] {msg}"
-        self._log_buffer.append(log_entry)
+    def _log(self, msg, *args, level='info'):
+        """Record a log line. `args` are %-formatted into `msg` only when someone reads it."""
+        level = LEVEL_NUMBERS[level]
+        if level > self.log_level:
+            return
+        record = self._log_buffer.append(self.clock.time(), level, msg, args)
         if self.log_dmesg:
-            print(f"[dmesg] {now} {msg}", file=sys.stderr)
-        try:
-            self.fs.append_text(self.fakeroot / 'bashshim.log', log_entry + "\n")
-        except Exception as e:
-            pass # Probably an attempt to log before we have that file, ignore it as the buffer logs it anyway
+            print(f"[dmesg] {record.timestamp()} {record.message}", file=sys.stderr)
+        if self.log_sink is not None:
+            self.log_sink.write(record)
+
+    def close(self):
+        """Stop background jobs, flush the session log and release its file handle."""
+        self.jobs.shutdown()
+        if self._owns_python_workers and self.python_workers is not None:
+            self.python_workers.close()
+        if self._owns_fallback_shell:
+            self.fallback_shell.close()
+        if self.log_sink is not None:
+            self.log_sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
     def _init_fakeroot(self):
-        self._log(f"bashshim: checking fakeroot at {self.fakeroot}")
+        self._log("bashshim: checking fakeroot at %s", self.fakeroot)
         if not self.fs.exists(self.fakeroot):
-            self.fs.mkdir(self.fakeroot)
-            self._log(f"bashshim: created fakeroot directory at {self.fakeroot}")
-        entries = [p for p in (Path(self.fakeroot)).iterdir() if p.name != "bashshim.log"]
-        if not entries:
-            self._log("bashshim: fakeroot is empty, populating structure")
-            self._populate_structure()
-        else:
+            self.fs.mkdir(self.fakeroot, parents=True)
+            self._log("bashshim: created fakeroot directory at %s", self.fakeroot)
+        entries = [name for name in self.fs.listdir(self.fakeroot) if not name.startswith("bashshim.log")]
+        if entries:
             self._log("bashshim: fakeroot already populated")
-    def _populate_structure(self):
-        import shutil
+            if self.lazy:
+                self._activate_manifest()
+            return 'existing'
+        if self.template_cache is not None and getattr(self.fs, 'on_disk', True):
+            from .templates import template_key
+            key = template_key(self._template_settings())
+            cached = self.template_cache.clone(key, self.fakeroot, self._build_template)
+            self._log("bashshim: cloned fakeroot from %s template %s", 'cached' if cached else 'new', key)
+            return 'template'
+        if self.lazy:
+            self._log("bashshim: fakeroot is empty, materializing structure on demand")
+            self._activate_manifest()
+            return 'lazy'
+        self._log("bashshim: fakeroot is empty, populating structure")
+        self._populate_structure()
+        return 'populated'
+
+    def _template_settings(self):
+        """Everything that influences the tree written by _populate_structure and _create_proc."""
+        return {
+            'version': bashshim_version,
+            'os_flavor': self.sim_os,
+            'username': self.username,
+            'uid': self.uid,
+            'hostname': self.hostname,
+            'distro': [self.distro_name, self.distro_codename, self.distro_id, self.distro_version],
+            'package_manager': [self.package_manager, self.package_manager_mirror],
+            'commands': sorted(self.simulated),
+        }
 
+    def _build_template(self, staging):
+        """Populate a template image in `staging` instead of the session fakeroot."""
+        fakeroot = self.fakeroot
+        self.fakeroot = Path(staging)
+        try:
+            self._populate_structure()
+            self._create_proc()
+            # Session log lines written during the build do not belong in the image
+            log_path = self.fakeroot / 'bashshim.log'
+            if self.fs.exists(log_path):
+                self.fs.remove(log_path)
+        finally:
+            self.fakeroot = fakeroot
+    def _structure(self):
+        """The declarative layout of the simulated filesystem for the current OS flavor"""
         # Define UID/GID per OS
         uid = self.uid
         gid = 1000
@@ -358,136 +557,122 @@ class BashShim:
             }
         }
 
-        os_data = structure.get(self.sim_os, {})
-        self._log(f"bashshim: populating detailed simulated filesystem for {self.sim_os}")
+        return structure.get(self.sim_os, {})
 
-        for path, content in os_data.items():
-            time.sleep(0.1)  # Simulate some delay for realism
-            full_path = self.fakeroot / path
-            self.fs.mkdir(full_path, parents=True, exist_ok=True)
+    def _build_manifest(self):
+        """Flatten the structure into {relative posix path: file content, or None for a directory}.
+
+        Parents always appear before their children, and later entries win, which
+        is how the home directory replaces the stub file of the same name.
+        """
+        manifest = {'': None}
+
+        def add(rel, content):
+            parent = rel.rpartition('/')[0]
+            if parent not in manifest or manifest[parent] is not None:
+                add(parent, None)
+            manifest[rel] = content
 
+        os_data = self._structure()
+        for path, content in os_data.items():
+            add(path, None)
             if isinstance(content, list):
                 for fname in content:
-                    lena_quotes = [
-                        "# Lena Raine's music doesn't just soundtrack games—it soundtracks healing.",
-                        "# When Lena composed Celeste, she didn't just write songs. She told a story trans girls could survive by.",
-                        "# Lena's melodies are like safehouses: shimmering spaces where anxious hearts can breathe.",
-                        "# Lena Raine supremacy isn't just about musical skill—it's about *truth through sound.*",
-                        "# 'Resurrections' still makes me cry. And I'm not sorry about it.",
-                        "# Lena and Erica are proof that queer love can thrive in a world that tried to erase us.",
-                        "# You can *hear* the transition arc in Lena's music. It's not subtle. It's sacred.",
-                        "# The moment you hear 'Reach for the Summit' and realize it's *about you*? That's when the magic hits.",
-                        "# Lena Raine didn't just break into the game industry—she rewrote the sonic palette for how we feel.",
-                        "# Every single ambient track Lena makes is like: 'Hey, what if anxiety had a soft place to land?'",
-                        "# Lena Raine: the composer who made thousands of queer kids realize they weren't alone.",
-                        "# Her Minecraft track 'Otherside' isn't just cool. It's *trans-coded astral rebellion.*",
-                        "# Erica Lahaie's art + Lena Raine's sound = the trans power couple aesthetic pipeline.",
-                        "# Lena's music feels like opening a locked journal and finding a page written by your future self.",
-                        "# You don't *listen* to Celeste. You *heal* to it.",
-                        "# The moment you realize REDSKY is Lena's inner storm, and you survived that storm too.",
-                        "# Lena Raine made video game music emotional—and made emotion the point.",
-                        "# Oneknowing didn't just push ambient boundaries. It whispered: 'You're allowed to *be.*'",
-                        "# If you've ever cried while speedrunning a level, you probably owe Lena Raine royalties.",
-                        "# Lena writes like someone who's lived the weight of invisibility—and composed her way out."
-                    ]
-                    quote = random.choice(lena_quotes)
-                    fpath = full_path / fname
-                    self.fs.write_text(fpath, f"# I <3 Lena Raine\n" if '.' not in fname else "")
-                    self._log(f"bashshim: created {fpath}")
+                    add(f"{path}/{fname}", "# I <3 Lena Raine\n" if '.' not in fname else "")
             elif isinstance(content, dict):
                 for fname, fcontent in content.items():
-                    fpath = full_path / fname
                     if isinstance(fcontent, str):
-                        self.fs.write_text(fpath, fcontent)
-                        self._log(f"bashshim: created and populated {fpath}")
+                        add(f"{path}/{fname}", fcontent)
                     elif isinstance(fcontent, list):
                         for subfname in fcontent:
-                            subfpath = fpath / subfname if not (full_path / fname).is_file() else full_path / subfname
-                            self.fs.mkdir(subfpath.parent, parents=True, exist_ok=True)
-                            self.fs.write_text(subfpath, "")
-                            self._log(f"bashshim: created {subfpath}")
-        # Create /dev with fake devices
-        dev_dir = self.fakeroot / 'dev'
-        self.fs.mkdir(dev_dir, parents=True, exist_ok=True)
-        fake_devs = {
-            'null': '',
-            'zero': '\x00' * 268435456,
-            'tty': 'bashshim tty0\n',
-            'random': os.urandom(268435456),
-            'urandom': os.urandom(268435456),
-        }
-        for dev_name, content in fake_devs.items():
-            dev_path = dev_dir / dev_name
-            if isinstance(content, bytes):
-                with self.fs.open(dev_path, 'wb') as f:
-                    f.write(content)
-            else:
-                self.fs.write_text(dev_path, content)
-            self._log(f"bashshim: created /dev/{dev_name}")
-        bin_dir = self.fakeroot / 'bin'
-        self.fs.mkdir(bin_dir, parents=True, exist_ok=True)
+                            parent = path if manifest.get(f"{path}/{fname}") is not None else f"{path}/{fname}"
+                            add(f"{parent}/{subfname}", "")
+        # /dev entries are empty placeholders; reads and writes go through bashshim.devices
+        for dev_name in devices.DEVICES:
+            add(f"dev/{dev_name}", "")
         for cmd_name in self.simulated:
-            cmd_path = bin_dir / cmd_name
-            if not self.fs.exists(cmd_path):
-                
-                lena_quotes = [
-                    "# Lena Raine's music doesn't just soundtrack games—it soundtracks healing.",
-                    "# When Lena composed Celeste, she didn't just write songs. She told a story trans girls could survive by.",
-                    "# Lena's melodies are like safehouses: shimmering spaces where anxious hearts can breathe.",
-                    "# Lena Raine supremacy isn't just about musical skill—it's about *truth through sound.*",
-                    "# 'Resurrections' still makes me cry. And I'm not sorry about it.",
-                    "# Lena and Erica are proof that queer love can thrive in a world that tried to erase us.",
-                    "# You can *hear* the transition arc in Lena's music. It's not subtle. It's sacred.",
-                    "# The moment you hear 'Reach for the Summit' and realize it's *about you*? That's when the magic hits.",
-                    "# Lena Raine didn't just break into the game industry—she rewrote the sonic palette for how we feel.",
-                    "# Every single ambient track Lena makes is like: 'Hey, what if anxiety had a soft place to land?'",
-                    "# Lena Raine: the composer who made thousands of queer kids realize they weren't alone.",
-                    "# Her Minecraft track 'Otherside' isn't just cool. It's *trans-coded astral rebellion.*",
-                    "# Erica Lahaie's art + Lena Raine's sound = the trans power couple aesthetic pipeline.",
-                    "# Lena's music feels like opening a locked journal and finding a page written by your future self.",
-                    "# You don't *listen* to Celeste. You *heal* to it.",
-                    "# The moment you realize REDSKY is Lena's inner storm, and you survived that storm too.",
-                    "# Lena Raine made video game music emotional—and made emotion the point.",
-                    "# Oneknowing didn't just push ambient boundaries. It whispered: 'You're allowed to *be.*'",
-                    "# If you've ever cried while speedrunning a level, you probably owe Lena Raine royalties.",
-                    "# Lena writes like someone who's lived the weight of invisibility—and composed her way out."
-                ]
-                quote = random.choice(lena_quotes)
-                self.fs.write_text(cmd_path, f"# I <3 Lena Raine\n{quote}\n")
-        self._log(f"bashshim: created command stub {cmd_path}")
-        home_dir = self.fakeroot / ('Users' if self.sim_os == 'Darwin' else 'home') / self.username
-        # Path to home dir (which might've been accidentally created as a file)
-        home_dir = self.fakeroot / ('Users' if self.sim_os == 'Darwin' else 'home') / self.username
-
-        # Check for bad file that blocks folder creation
-        if home_dir.exists() and not home_dir.is_dir():
-            self._log(f"bashshim: WARNING — {home_dir} exists as a file, removing it to create dir.")
-            self.fs.remove(home_dir)
-
-        self.fs.mkdir(home_dir, parents=True, exist_ok=True)
-        self.fs.write_text(home_dir / '.bashrc', "# Simulated bashrc\nalias ll='ls -l'\n")
-        self.fs.write_text(home_dir / '.profile', "# Simulated profile\nexport PATH=$PATH:/usr/local/bin\n")
+            if f"bin/{cmd_name}" not in manifest:
+                add(f"bin/{cmd_name}", f"# I <3 Lena Raine\n{random.choice(LENA_QUOTES)}\n")
+        home = f"{'Users' if self.sim_os == 'Darwin' else 'home'}/{self.username}"
+        add(home, None)
+        add(f"{home}/.bashrc", "# Simulated bashrc\nalias ll='ls -l'\n")
+        add(f"{home}/.profile", "# Simulated profile\nexport PATH=$PATH:/usr/local/bin\n")
 
         # macOS .app simulation
         if self.sim_os == 'Darwin':
-            apps_dir = self.fakeroot / 'Applications'
             for app in os_data.get('Applications', []):
-                app_path = apps_dir / app
-                self.fs.mkdir(app_path / 'Contents' / 'MacOS', parents=True, exist_ok=True)
-                self.fs.write_text(
-                    app_path / 'Contents' / 'Info.plist',
+                add(f"Applications/{app}/Contents/MacOS", None)
+                add(
+                    f"Applications/{app}/Contents/Info.plist",
                     f"<?xml version='1.0'?><plist><dict><key>CFBundleName</key><string>{app}</string></dict></plist>"
                 )
-                self._log(f"bashshim: created simulated macOS app bundle {app_path}")
+        return manifest
 
+    def _populate_structure(self):
+        """Eagerly write the whole manifest into the fakeroot."""
+        sections = self._structure()
+        self._log("bashshim: populating detailed simulated filesystem for %s", self.sim_os)
+        for rel, content in self._build_manifest().items():
+            if rel in sections:
+                self.clock.sleep(0.1)  # Simulate some delay for realism
+            self._write_manifest_entry(rel, content)
         self._log("bashshim: filesystem population complete.")
 
-    def _create_proc(self):
-        """Create realistic /proc entries depending on OS flavor"""
-        proc_dir = self.fakeroot / 'proc'
-        self.fs.mkdir(proc_dir, exist_ok=True)
-        self._log(f"bashshim: creating /proc entries for {self.sim_os}")
+    def _write_manifest_entry(self, rel, content):
+        path = self.fakeroot / rel
+        if content is not None:
+            self.fs.write_text(path, content)
+            self._log("bashshim: created %s", path)
+            return
+        # A directory might've been accidentally created as a file (e.g. the home dir)
+        if self.fs.exists(path) and not self.fs.is_dir(path):
+            self._log("bashshim: WARNING — %s exists as a file, removing it to create dir.", path, level='warn')
+            self.fs.remove(path)
+        self.fs.mkdir(path, parents=True, exist_ok=True)
+
+    def _activate_manifest(self):
+        self._manifest = self._build_manifest()
+        self._manifest_children = {}
+        for rel in self._manifest:
+            if rel:
+                self._manifest_children.setdefault(rel.rpartition('/')[0], []).append(rel)
+        self._materialized = set()
+        self._materialize_dir('')
+
+    def _materialize(self, real):
+        """Make sure every manifest directory on the way to `real` has its entries on disk."""
+        try:
+            rel = real.relative_to(self.fakeroot).as_posix()
+        except ValueError:
+            return
+        parts = [] if rel == '.' else rel.split('/')
+        for i in range(len(parts) + 1):
+            prefix = '/'.join(parts[:i])
+            if prefix in self._materialized:
+                continue
+            if self._manifest.get(prefix, '') is not None:
+                break  # not a directory in the manifest
+            # Directories are created with their parent, so a missing one was removed on purpose
+            if not self.fs.is_dir(self.fakeroot / prefix):
+                break
+            self._materialize_dir(prefix)
+
+    def _materialize_dir(self, rel):
+        self._materialized.add(rel)
+        self.fs.mkdir(self.fakeroot / rel, parents=True, exist_ok=True)
+        for child in self._manifest_children.get(rel, ()):
+            path = self.fakeroot / child
+            if self.fs.exists(path):
+                continue
+            content = self._manifest[child]
+            if content is None:
+                self.fs.mkdir(path, exist_ok=True)
+            else:
+                self.fs.write_text(path, content)
+        self._log("bashshim: materialized %s", self.fakeroot / rel, level='debug')
 
+    def _proc_table(self):
+        """(pid, command, user) for the simulated processes of the current OS flavor"""
         base_procs = {
             'Linux': [
                 (1, 'systemd', 'root'),
@@ -511,9 +696,20 @@ class BashShim:
             ]
         }
 
-        procs = base_procs.get(self.sim_os, [])
+        return base_procs.get(self.sim_os, [])
+
+    def _register_procs(self):
+        """Record process owners for a /proc that already exists on disk (e.g. from a template)"""
+        for pid, cmd, user in self._proc_table():
+            self.proc_users[pid] = user
+
+    def _create_proc(self):
+        """Create realistic /proc entries depending on OS flavor"""
+        proc_dir = self.fakeroot / 'proc'
+        self.fs.mkdir(proc_dir, exist_ok=True)
+        self._log("bashshim: creating /proc entries for %s", self.sim_os)
 
-        for pid, cmd, user in procs:
+        for pid, cmd, user in self._proc_table():
             proc_path = proc_dir / str(pid)
             self.fs.mkdir(proc_path, parents=True, exist_ok=True)
             self.fs.write_text(proc_path / 'cmdline', f"/usr/sbin/{cmd}")
@@ -527,11 +723,9 @@ class BashShim:
 
             stat_content = f"{pid} ({cmd}) S 1 1 1 0 -1 4194560 300 0 0 0 {utime} {stime} 0 0 20 0 1 0 {starttime} {vsz} {rss}"
             self.fs.write_text(proc_path / 'stat', stat_content)
-            self._log(f"bashshim: created /proc/{pid} for {cmd} (user: {user})")
+            self._log("bashshim: created /proc/%s for %s (user: %s)", pid, cmd, user)
 
             # Save user for later
-            if not hasattr(self, 'proc_users'):
-                self.proc_users = {}
             self.proc_users[pid] = user
 
     def _init_shell_vars(self):
@@ -563,139 +757,623 @@ class BashShim:
     def _expand_args(self, args):
         return self.parser.expand_args(args)
 
+    def snapshot(self):
+        """Capture the whole session (fakeroot, variables, cwd, sudo state, /proc users, log).
+
+        The filesystem backend does the heavy lifting: copy-on-write for memory and
+        overlay backends, a journal of before-images for the on-disk one, so the cost
+        does not depend on the size of the fakeroot. The handle can be restored any
+        number of times.
+        """
+        if not hasattr(self.fs, 'snapshot'):
+            raise TypeError(f"cannot snapshot a session on {type(self.fs).__name__}: the filesystem backend has no snapshot()")
+        self._log("bashshim: taking session snapshot")
+        # Writes through an already open handle would escape the snapshot
+        self.log_sink.reopen()
+        return ShellSnapshot(
+            self.fs.snapshot(),
+            dict(self.variables),
+            self.cwd,
+            self.is_root,
+            dict(self.proc_users),
+            list(self._log_buffer),
+            set(self._materialized) if self._manifest is not None else None,
+        )
+
+    def restore(self, snap):
+        """Roll the session back to `snap`, a handle from snapshot()."""
+        self.log_sink.reopen()
+        self.fs.restore(snap.fs_token)
+        # The parser holds a reference to this dict, so update it in place
+        self.variables.clear()
+        self.variables.update(snap.variables)
+        self.cwd = snap.cwd
+        self.is_root = snap.is_root
+        self.proc_users = dict(snap.proc_users)
+        self._log_buffer.replace(snap.log_buffer)
+        if snap.materialized is not None:
+            self._materialized = set(snap.materialized)
+        self._log("bashshim: restored session snapshot")
+
     def run(self, command_line):
-        self._log(f"bashshim: running command: {command_line}")
-        stripped = command_line.strip()
-        if '=' in stripped and not stripped.startswith(('>', '<', '|')):
-            parts = stripped.split()
-            assigned = False
-            for part in parts:
-                if '=' in part and not part.startswith(('>', '<', '|')):
-                    var, val = part.split('=', 1)
-                    if var.isidentifier():
-                        self.variables[var] = self._expand_vars(val)
-                        assigned = True
-            if assigned and (len(parts) == 1 or all('=' in p for p in parts)):
-                return 0, ''
-            command_line = ' '.join([p for p in parts if '=' not in p])
+        stream = self.run_stream(command_line)
+        out = streams.collect(stream)
+        return stream.exit_code, out
 
-        if command_line.startswith("sudo "):
-            self.is_root = True
-            self._log("bashshim: sudo detected, elevating privileges")
-            command_line = command_line[5:].strip()
-
-        # Pipes
-        if '|' in command_line:
-            cmds = self.parser.split_pipes(command_line)
-            return self._run_pipeline(cmds)
-
-        # Shell operators
-        if not self.parser.has_shell_operators(command_line):
-            return self._run_with_redirection(command_line)
-
-        # Compound execution
-        parts = self.parser.split_shell_operators(command_line)
-        last_code = 0
-        output = ''
-        i = 0
-        while i < len(parts):
-            part = parts[i]
-            if part in (';', '&&', '||'):
-                i += 1
-                continue
-            code, out = (self.run(part) if self.parser.has_shell_operators(part) else self._run_with_redirection(part))
-            output += out
-            last_code = code
-            # Look ahead for operator
-            if i + 1 < len(parts):
-                op = parts[i + 1]
-                if op == ';':
-                    i += 2
-                    continue
-                if op == '&&':
-                    if last_code == 0:
-                        i += 2
-                        continue
+    def run_stream(self, command_line):
+        """Run `command_line`, returning a CommandStream that yields output chunks as they are produced.
+
+        Commands execute as the stream is consumed; its exit_code is set once it is
+        exhausted. Closing it early abandons whatever has not run yet.
+        """
+        return self._stream_parsed(command_line, self._parse(command_line))
+
+    def run_batch(self, commands, stop_on_error=False):
+        """Run several command lines in order, returning a CommandResult for each.
+
+        Log lines are flushed once at the end rather than as the batch goes. An
+        exception inside one command becomes that command's error result (exit 1)
+        instead of ending the batch. With stop_on_error, the batch stops after the
+        first command that exits non-zero.
+        """
+        return self._run_batch([(command, self._parse(command)) for command in commands], stop_on_error)
+
+    async def arun(self, command_line):
+        """asyncio counterpart of run(), returning (code, output) without blocking the event loop.
+
+        A lone `sleep`, `python3` or subprocess-fallback command is awaited natively
+        (asyncio.sleep / asyncio subprocesses). Anything else, including filesystem
+        work and curl, runs with run() on the loop's default executor. Commands on
+        one session are serialized; different sessions run concurrently.
+        """
+        # Imported here rather than at module level: it is the costliest import of the
+        # package, and only asyncio callers need it (by then it is already loaded)
+        import asyncio
+        loop = asyncio.get_running_loop()
+        if self._async_lock is None or self._async_lock[0] is not loop:
+            self._async_lock = (loop, asyncio.Lock())
+        async with self._async_lock[1]:
+            tree = self._parse(command_line)
+            argv = self._native_async_argv(tree)
+            if argv is None:
+                return await loop.run_in_executor(None, self.run, command_line)
+            self._log("bashshim: running command: %s", command_line)
+            func = self.simulated.get(argv[0])
+            if func is None:
+                self._log("bashshim: '%s' not simulated, using async subprocess fallback", argv[0])
+                code, out = await self._afallback_exec(shlex.join(argv))
+            else:
+                code, out = await self._async_commands[func](argv[1:])
+            self.variables['?'] = str(code)
+            return code, self._cap_output(argv[0], out)
+
+    def _native_async_argv(self, tree):
+        """The argv of `tree` if arun() can await it natively, otherwise None."""
+        if isinstance(tree, ParseError) or len(tree.items) != 1:
+            return None
+        and_or, background = tree.items[0]
+        pipeline = and_or.first
+        if background or and_or.rest or pipeline.negated or len(pipeline.commands) != 1:
+            return None
+        command = pipeline.commands[0]
+        if isinstance(command, Subshell) or command.assignments or command.redirects or not command.words:
+            return None
+        argv = [self.parser.expand_word(word) for word in command.words]
+        func = self.simulated.get(argv[0])
+        if func is None:
+            # A coprocess is shared state; run it on the executor like any other blocking command
+            return argv if self.fallback == 'subprocess' and self.fallback_shell is None else None
+        return argv if func in self._async_commands else None
+
+    async def acmd_sleep(self, args):
+        try:
+            seconds = float(args[0]) if args else 1
+            timeout = self.budget.timeout
+            await self.clock.asleep(seconds if timeout is None else min(seconds, timeout))
+            self._log("bashshim: sleep %ss", seconds)
+            if timeout is not None and timeout < seconds:
+                self._budget_timeout('sleep')
+                return TIMEOUT_STATUS, ''
+            return 0, ''
+        except Exception as e:
+            self._log("bashshim: sleep error: %s", e, level='err')
+            return 1, f"sleep: {e}\n"
+
+    async def acmd_python3(self, args):
+        import asyncio
+        self._log("bashshim: python3 called with args: %s", args)
+        try:
+            self._unshare_fakeroot()
+            proc = await asyncio.create_subprocess_exec(
+                *self.budget.wrap([sys.executable, *args]),
+                cwd=str(self.cwd),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            code, out = await self._acommunicate(proc, 'python3')
+            self._log("bashshim: python3 exit %s", code)
+            return code, out
+        except Exception as e:
+            self._log("bashshim: python3 error: %s", e, level='err')
+            return 1, f"bashshim: python3 failed: {e}\n"
+
+    async def _afallback_exec(self, command_line):
+        import asyncio
+        self._log("bashshim: fallback_exec: %s", command_line)
+        try:
+            self._unshare_fakeroot()
+            proc = await asyncio.create_subprocess_shell(
+                self.budget.wrap(command_line, shell=True),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            code, out = await self._acommunicate(proc, command_line)
+            self._log("bashshim: fallback_exec: exit %s", code)
+            return code, out
+        except Exception as e:
+            self._log("bashshim: subprocess fallback_exec error: %s", e, level='err')
+            return 139, f"Segmentation fault (core dumped)\n"
+
+    async def _acommunicate(self, proc, name):
+        """Collect an asyncio child's output within the time budget, returning (status, output)."""
+        import asyncio
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), self.budget.timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            self._budget_timeout(name)
+            return TIMEOUT_STATUS, ''
+        return self._process_status(proc.returncode), stdout.decode(errors='replace') + stderr.decode(errors='replace')
+
+    def _run_batch(self, parsed, stop_on_error=False):
+        results = []
+        with self.log_sink.deferred():
+            for command, tree in parsed:
+                start = time.perf_counter()
+                stream = self._stream_parsed(command, tree)
+                try:
+                    output = streams.collect(stream)
+                    code = stream.exit_code
+                except Exception as e:
+                    stream.close()
+                    self._log("bashshim: batch command failed: %s: %s", command, e, level='err')
+                    code, output = 1, f"Error: {e}\n"
+                results.append(CommandResult(command, code, output, time.perf_counter() - start))
+                if stop_on_error and code != 0:
                     break
-                if op == '||':
-                    if last_code != 0:
-                        i += 2
-                        continue
+        return results
+
+    def _parse(self, command_line):
+        """The syntax tree for `command_line`, or the ParseError it raised."""
+        try:
+            return self.parser.parse(command_line)
+        except ParseError as e:
+            return e
+
+    def _stream_parsed(self, command_line, tree):
+        self._log("bashshim: running command: %s", command_line)
+        if isinstance(tree, ParseError):
+            self._log("bashshim: %s", tree, level='err')
+            self.variables['?'] = '2'
+            return CommandStream.finished(2, f"bash: {tree}\n")
+        return CommandStream(self._stream_list(tree))
+
+    def _run_list(self, node, stdin=None):
+        """Run a CommandList to completion, returning (code, output)."""
+        chunks = []
+        gen = self._stream_list(node, stdin)
+        while True:
+            try:
+                chunks.append(next(gen))
+            except StopIteration as stop:
+                return stop.value, ''.join(chunks)
+
+    # The _stream_* generators yield output chunks and return the exit status
+    def _stream_list(self, node, stdin=None):
+        code = 0
+        for and_or, background in node.items:
+            if background:
+                job = self._start_job(and_or)
+                yield f"[{job.number}] {job.pid}\n"
+                code = 0
+                self.variables['?'] = '0'
+                continue
+            code = yield from self._stream_and_or(and_or, stdin)
+        return code
+
+    # -------------------- job control --------------------
+    def _fork(self):
+        """A copy of this session for a background job or pipeline stage, like bash forking a subshell.
+
+        The child gets its own variables and working directory; the filesystem,
+        logs, process table and job table stay shared.
+        """
+        child = copy.copy(self)
+        child.variables = dict(self.variables)
+        child.parser = copy.copy(self.parser)  # shares the parse cache
+        child.parser.variables = child.variables
+        child.simulated = self.simulated.bind(child)
+        child._stdin_support = {}
+        return child
+
+    def _start_job(self, node):
+        child = self._fork()
+
+        def run(job):
+            child._job = job
+            # Background jobs get no stdin, as with `< /dev/null`
+            stream = child._stream_and_or(node)
+            try:
+                while True:
+                    if job.cancelled.is_set():
+                        stream.close()
+                        return TERMINATED_STATUS
+                    try:
+                        job.write(next(stream))
+                    except StopIteration as stop:
+                        return stop.value
+            finally:
+                self._remove_job_proc(job)
+                self._log("bashshim: job [%d] %d finished", job.number, job.pid, level='notice')
+
+        job = self.jobs.submit(unparse(node), run, prepare=self._add_job_proc)
+        self.variables['!'] = str(job.pid)
+        self._log("bashshim: job [%d] %d started: %s", job.number, job.pid, job.command, level='notice')
+        return job
+
+    def _add_job_proc(self, job):
+        proc_path = self.fakeroot / 'proc' / str(job.pid)
+        self.fs.mkdir(proc_path, parents=True, exist_ok=True)
+        self.fs.write_text(proc_path / 'cmdline', job.command)
+        self.fs.write_text(proc_path / 'stat', f"{job.pid} ({job.command.split()[0]}) S 102 {job.pid} {job.pid} 0 -1")
+        self.proc_users[job.pid] = 'root' if self.is_root else self.username
+
+    def _remove_job_proc(self, job):
+        self.proc_users.pop(job.pid, None)
+        try:
+            self.fs.rmdir(self.fakeroot / 'proc' / str(job.pid))
+        except OSError:
+            pass
+
+    def _job_arg(self, builtin, spec):
+        """Resolve a job spec for `builtin`, returning (job, error message)."""
+        job = self.jobs.get(spec)
+        if job is None:
+            if spec.startswith('%'):
+                return None, f"bash: {builtin}: {spec}: no such job\n"
+            return None, f"bash: {builtin}: pid {spec} is not a child of this shell\n"
+        return job, ''
+
+    def _run_process(self, cmd, stdin=None, **kwargs):
+        """subprocess.run() with captured text output, under the command's budget.
+
+        The process is killed at the command's deadline (exit 124) and gets the
+        budget's rlimits; `kill` can stop it when it runs inside a job. An
+        InputStream `stdin` is fed to it from a thread as it reads.
+        """
+        import subprocess
+        self._unshare_fakeroot()
+        name = cmd if isinstance(cmd, str) else cmd[0]
+        cmd = self.budget.wrap(cmd, shell=kwargs.get('shell', False))
+        if stdin is None:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+        else:
+            read_end, write_end = os.pipe()
+            try:
+                process = subprocess.Popen(cmd, stdin=read_end, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                           text=True, **kwargs)
+            except BaseException:
+                os.close(write_end)
+                raise
+            finally:
+                os.close(read_end)
+            threading.Thread(target=_feed_stdin, args=(stdin, write_end), name=f"bashshim-stdin-{name}",
+                             daemon=True).start()
+        if self._job is not None:
+            self._job.attach(process)
+        try:
+            try:
+                stdout, stderr = process.communicate(timeout=self._remaining())
+            except subprocess.TimeoutExpired:
+                process.kill()
+                stdout, stderr = process.communicate()
+                self._budget_timeout(name)
+                return TIMEOUT_STATUS, stdout, stderr
+        finally:
+            if self._job is not None:
+                self._job.detach(process)
+        return self._process_status(process.returncode), stdout, stderr
+
+    def _unshare_fakeroot(self):
+        """Break the backend's blob store links before a real process can write behind its back."""
+        break_links = getattr(self.fs, 'break_links', None)
+        if break_links is not None:
+            break_links()
+
+    def _process_status(self, returncode):
+        """Map a Popen return code to a shell status: a child killed by signal N becomes 128+N."""
+        if returncode >= 0:
+            return returncode
+        status = 128 - returncode
+        if status == KILLED_STATUS:
+            self.budget.record('killed')
+            self._log("bashshim: child process killed (resource limit)", level='warn')
+        return status
+
+    def _stream_and_or(self, node, stdin=None):
+        code = yield from self._stream_pipeline(node.first, stdin)
+        for op, pipeline in node.rest:
+            # '&&' runs after success, '||' after failure; otherwise the status carries over
+            if (op == '&&') != (code == 0):
+                continue
+            code = yield from self._stream_pipeline(pipeline, stdin)
+        return code
+
+    def _stream_pipeline(self, node, stdin=None):
+        # All stages but the last run on their own threads, each feeding the next through a bounded Pipe.
+        # As in bash, every stage of a real pipeline runs in a subshell: a forked copy of the session,
+        # so `cd`, assignments and sudo inside it neither race each other nor leak out.
+        *upstream, last = node.commands
+        statuses = [None] * len(node.commands)
+        workers = []
+        for i, command in enumerate(upstream):
+            pipe = streams.Pipe()
+            worker = threading.Thread(target=self._fork()._run_pipe_stage, args=(command, stdin, pipe, statuses, i),
+                                      name=f"bashshim-pipe-{i}", daemon=True)
+            worker.start()
+            workers.append(worker)
+            stdin = InputStream(pipe)
+        try:
+            code, out = (self._fork() if upstream else self)._run_command(last, stdin)
+            statuses[-1] = code
+            if isinstance(out, str):
+                if out:
+                    yield out
+            else:
+                yield from out
+        except streams.StreamFailed as e:
+            code = statuses[-1] = e.status
+        finally:
+            if workers:
+                # The last stage is done reading; anything still writing upstream gets SIGPIPE
+                stdin.close()
+                for worker in workers:
+                    worker.join()
+        # Set after every pipeline, a lone command included, so it never describes an older one
+        self.variables['PIPESTATUS'] = ' '.join(str(status) for status in statuses)
+        if node.negated:
+            code = 0 if code else 1
+        self.variables['?'] = str(code)
+        return code
+
+    def _run_pipe_stage(self, command, stdin, pipe, statuses, index):
+        """Thread body for one upstream pipeline stage, writing its output into `pipe`."""
+        code, error = 1, None
+        out = None
+        try:
+            code, out = self._run_command(command, stdin)
+            for chunk in ((out,) if isinstance(out, str) else out):
+                if chunk and not pipe.write(chunk):
+                    self._log("bashshim: pipeline stage %d: broken pipe", index, level='debug')
+                    code = streams.SIGPIPE_STATUS
                     break
-            i += 1
-        return last_code, output
+        except streams.StreamFailed as e:
+            code = e.status
+        except Exception as e:
+            error = e
+        finally:
+            close = getattr(out, 'close', None)
+            if close is not None:
+                close()
+            pipe.close_write(error)
+            if index:
+                # Pass the broken pipe on to the stage before this one
+                stdin.close()
+            statuses[index] = code
+
+    def _run_command(self, node, stdin=None):
+        """Run a SimpleCommand or Subshell. Output may be a string or an iterable of chunks."""
+        if isinstance(node, Subshell):
+            # Changes made inside ( ... ) do not leave it
+            variables, cwd, is_root = dict(self.variables), self.cwd, self.is_root
+            try:
+                code, out = self._run_list(node.body, stdin)
+            finally:
+                self.variables.clear()
+                self.variables.update(variables)
+                self.cwd, self.is_root = cwd, is_root
+            return code, self._apply_redirects(node.redirects, out)
+        expand = self.parser.expand_word
+        for name, value in node.assignments:
+            self.variables[name] = expand(value)
+        for redirect in node.redirects:
+            if redirect.op == '<':
+                target = expand(redirect.target)
+                real = self._to_real_path(target)
+                device = devices.lookup(self.fakeroot, real)
+                if device:
+                    stdin = InputStream(device.chunks())
+                elif self.fs.is_file(real):
+                    stdin = InputStream(streams.read_file_chunks(self.fs, real))
+                else:
+                    self.variables['?'] = '1'
+                    return 1, f"bash: {target}: No such file or directory\n"
+            elif redirect.op == '<<<':
+                stdin = InputStream(expand(redirect.target) + '\n')
+        if not node.words:
+            return 0, self._apply_redirects(node.redirects, '')
+        words = [expand(word) for word in node.words]
+        if words[0] == 'sudo' and len(words) > 1:
+            self.is_root = True
+            self._log("bashshim: sudo detected, elevating privileges")
+            words = words[1:]
+        code, out = self._dispatch(words, stdin)
+        return code, self._apply_redirects(node.redirects, out)
+
+    def _apply_redirects(self, redirects, out):
+        """Send `out` to the last stdout redirection; other targets are only created or truncated."""
+        stdout = [i for i, r in enumerate(redirects)
+                  if r.op in ('&>', '&>>') or (r.op in ('>', '>>') and r.fd == 1)]
+        for i, redirect in enumerate(redirects):
+            target = self.parser.expand_word(redirect.target)
+            append = redirect.op.endswith('>>')
+            if i in stdout:
+                if i == stdout[-1]:
+                    out = self._write_redirect(target, out, append)
+                else:
+                    self._write_redirect(target, '', append)
+            elif redirect.op in ('>', '>>'):
+                # Simulated commands have no separate stderr, so e.g. 2>file only creates the file
+                self._write_redirect(target, '', append)
+        return out
 
     def _run_with_redirection(self, command_line: str):
-        import os as _os
-        tokens, out_file, append = self.parser.parse_redirection(command_line)
-        if not tokens:
-            self._log("bashshim: empty command line")
-            return 0, ''
-        cmd = tokens[0]
-        args = tokens[1:]
-        args = self._expand_args(args)
-        if cmd in self.simulated:
+        # Legacy string entry point; the tree walker calls _dispatch with argv directly
+        return self._run_list(self.parser.parse(command_line))
+
+    def _takes_stdin(self, func):
+        try:
+            return self._stdin_support[func]
+        except KeyError:
             try:
-                code, out = self.simulated[cmd](args)
+                takes = 'stdin' in inspect.signature(func).parameters
+            except (TypeError, ValueError):
+                takes = False
+            self._stdin_support[func] = takes
+            return takes
+
+    def _dispatch(self, argv, stdin=None):
+        """Run one command from an already expanded argv list.
+
+        Commands that declare a `stdin` parameter receive the InputStream (None when
+        nothing is piped or redirected in); the others simply never read it.
+        """
+        cmd, args = argv[0], argv[1:]
+        deadline = self._limits.deadline = self.budget.deadline()
+        if stdin is None and deadline is not None:
+            # Under a time budget nothing may wait on the terminal (bc, read)
+            stdin = InputStream()
+        try:
+            if cmd in self.simulated:
+                func = self.simulated[cmd]
+                try:
+                    if self._takes_stdin(func):
+                        code, out = func(args, stdin=stdin)
+                    else:
+                        code, out = func(args)
+                    self.variables['?'] = str(code)
+                    self._log("bashshim: simulated '%s' exit %s", cmd, code)
+                except Exception as e:
+                    self.variables['?'] = '1'
+                    self._log("bashshim: error simulating '%s': %s", cmd, e, level='err')
+                    return 1, f"bashshim: error simulating '{cmd}': {e}"
+                if not isinstance(out, str):
+                    out = self._guard_stream(cmd, out)
+            else:
+                self._log("bashshim: '%s' not simulated, using fallback", cmd)
+                code, out = self.fallback_exec(shlex.join(argv), stdin=stdin)
                 self.variables['?'] = str(code)
-                self._log(f"bashshim: simulated '{cmd}' exit {code}")
-            except Exception as e:
-                self.variables['?'] = '1'
-                self._log(f"bashshim: error simulating '{cmd}': {e}")
-                return 1, f"bashshim: error simulating '{cmd}': {e}"
-        else:
-            self._log(f"bashshim: '{cmd}' not simulated, using fallback")
-            code, out = self.fallback_exec(' '.join(tokens))
+        finally:
+            self._limits.deadline = None
+        if deadline is not None and time.monotonic() > deadline and code != TIMEOUT_STATUS:
+            # A simulated command that cannot be interrupted overran; report it like timeout(1)
+            self._budget_timeout(cmd)
+            code = TIMEOUT_STATUS
             self.variables['?'] = str(code)
-        if out_file:
-            mode = 'a' if append else 'w'
-            real_path = self._to_real_path(out_file)
-            with open(real_path, mode, encoding='utf-8') as f:
-                f.write(out)
-            return code, ''
+        if isinstance(out, str):
+            return code, self._cap_output(cmd, out)
+        if deadline is not None or self.budget.max_output is not None:
+            out = self._budget_stream(cmd, out, deadline)
         return code, out
 
-    def _run_pipeline(self, cmds):
-        prev_out = ''
-        code = 0
-        for i, cmd in enumerate(cmds):
-            tokens, out_file, append = self.parser.parse_redirection(cmd)
-            if not tokens:
-                continue
-            if i == 0:
-                code, out = self._run_with_redirection(' '.join(tokens))
+    def _remaining(self):
+        """Seconds left before the current command's deadline, None without a time budget."""
+        deadline = getattr(self._limits, 'deadline', None)
+        return None if deadline is None else max(deadline - time.monotonic(), 0.0)
+
+    def _budget_timeout(self, cmd):
+        self.budget.record('timeouts')
+        self._log("bashshim: '%s' exceeded its %ss time budget", cmd, self.budget.timeout, level='warn')
+
+    def _cap_output(self, cmd, out):
+        out, truncated = self.budget.truncate(out)
+        if truncated:
+            self._log("bashshim: '%s' output truncated at %d bytes", cmd, self.budget.max_output, level='warn')
+        return out
+
+    def _budget_stream(self, cmd, chunks, deadline):
+        """Apply the output cap and deadline to streamed output, raising BudgetExceeded on timeout."""
+        used = 0
+        try:
+            for chunk in chunks:
+                if deadline is not None and time.monotonic() > deadline:
+                    self._budget_timeout(cmd)
+                    raise BudgetExceeded(TIMEOUT_STATUS, f"{cmd}: timed out")
+                chunk, truncated = self.budget.truncate(chunk, used)
+                if truncated:
+                    self._log("bashshim: '%s' output truncated at %d bytes", cmd, self.budget.max_output, level='warn')
+                    yield chunk
+                    return
+                used += len(chunk.encode('utf-8'))
+                yield chunk
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def _guard_stream(self, cmd, chunks):
+        """Report errors raised while a command's output is being produced, like _dispatch does.
+
+        The status was returned before the output, so the failure is passed on as
+        StreamFailed for the pipeline to turn into the exit code.
+        """
+        try:
+            for chunk in chunks:
+                yield chunk
+        except streams.StreamFailed:
+            raise
+        except Exception as e:
+            self._log("bashshim: error simulating '%s': %s", cmd, e, level='err')
+            yield f"bashshim: error simulating '{cmd}': {e}"
+            raise streams.StreamFailed(1, str(e)) from e
+        finally:
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def _write_redirect(self, out_file, data, append):
+        """Write command output (a string or chunks) to a redirection target, returning any terminal output."""
+        real_path = self._to_real_path(out_file)
+        device = devices.lookup(self.fakeroot, real_path)
+        if device:
+            self._log("bashshim: redirect to /dev/%s", device.name)
+            return device.write(streams.collect(data))
+        mode = 'a' if append else 'w'
+        with self.fs.open(real_path, mode, encoding='utf-8') as f:
+            if isinstance(data, str):
+                f.write(data)
             else:
-                import tempfile
-                with tempfile.NamedTemporaryFile('w+', delete=False) as tf:
-                    tf.write(prev_out)
-                    tf.flush()
-                    replaced = [tf.name if t == '-' else t for t in tokens]
-                    code, out = self._run_with_redirection(' '.join(replaced))
-            prev_out = out
-        if out_file:
-            mode = 'a' if append else 'w'
-            real_path = self._to_real_path(out_file)
-            with open(real_path, mode, encoding='utf-8') as f:
-                f.write(prev_out)
-            return code, ''
-        return code, prev_out
+                for chunk in data:
+                    f.write(chunk)
+        return ''
 
     # Preserve legacy single-run API
     def _run_single(self, command_line):
         return self._run_with_redirection(command_line)
 
     def cmd_pkg_manager(self, args):
-        self._log(f"bashshim: {self.package_manager} called with args: {args}")
+        self._log("bashshim: %s called with args: %s", self.package_manager, args)
         if not args:
             return 0, f"{self.package_manager}: no command specified\n"
         if args[0] in ['update']:
             if self.package_manager == "apt":
                 if self.is_root:
-                    self._log(f"bashshim: {self.package_manager} update as root (simulated success)")
+                    self._log("bashshim: %s update as root (simulated success)", self.package_manager)
                     output = f"Hit:1 {self.package_manager_mirror}/packages {self.distro_codename} InRelease\nHit:2 {self.package_manager_mirror}/security {self.distro_codename}-security InRelease\nHit:3 {self.package_manager_mirror}/updates {self.distro_codename}-updates InRelease\nHit:4 {self.package_manager_mirror}/backports {self.distro_codename}-backports InRelease\nReading package lists... Done\nBuilding dependency tree... Done\nReading state information... Done\n32 packages can be upgraded. Run 'apt list --upgradable' to see them.\n"
                     return 0, output
                 else:
-                    self._log(f"bashshim: {self.package_manager} update as non-root (simulated permission denied)")
+                    self._log("bashshim: %s update as non-root (simulated permission denied)", self.package_manager, level='err')
                     return 100, """Reading package lists... Done
 E: Could not open lock file /var/lib/apt/lists/lock - open (13: Permission denied)
 E: Unable to lock directory /var/lib/apt/lists/
@@ -704,43 +1382,39 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
 """
         if args[0] in ['install', 'remove', 'update', 'upgrade', 'search']:
             pkg = args[1] if len(args) > 1 else '<missing>'
-            self._log(f"bashshim: {self.package_manager} {args[0]} '{pkg}' (simulated fail)")
+            self._log("bashshim: %s %s '%s' (simulated fail)", self.package_manager, args[0], pkg, level='err')
             return 1, f"{self.package_manager}: Unable to locate package '{pkg}'\n"
-        self._log(f"bashshim: {self.package_manager} command '{args[0]}' recognized (simulated)")
+        self._log("bashshim: %s command '%s' recognized (simulated)", self.package_manager, args[0])
         return 0, f"{self.package_manager}: command '{args[0]}' recognized (simulated)\n"
 
-    def cmd_echo(self, args):
-        self._log(f"bashshim: echo {' '.join(args)}")
-        return 0, ' '.join(args) + '\n'
-
     def cmd_pwd(self, args):
-        self._log(f"bashshim: pwd (cwd={self.cwd})")
+        self._log("bashshim: pwd (cwd=%s)", self.cwd)
         relative = self.cwd.relative_to(self.fakeroot).as_posix()
         return 0, f"/{relative}\n"
 
     def cmd_cd(self, args): 
         target = args[0] if args else 'home'
         new_path = self._to_real_path(target)
-        self._log(f"bashshim: cd {target} -> {new_path}")
+        self._log("bashshim: cd %s -> %s", target, new_path)
         # Prevent escaping fakeroot
         try:
-            resolved = new_path.resolve()
-            if not str(resolved).startswith(str(self.fakeroot)):
-                self._log(f"bashshim: cd blocked, attempt to escape fakeroot: {resolved}")
+            resolved = self.fs.resolve(new_path)
+            if not self._inside_fakeroot(resolved):
+                self._log("bashshim: cd blocked, attempt to escape fakeroot: %s", resolved)
                 return 1, f"bashshim: cd: permission denied: {target}\n"
-            if resolved.is_dir():
+            if self.fs.is_dir(resolved):
                 self.cwd = resolved
                 return 0, ''
         except Exception as e:
-            self._log(f"bashshim: cd error: {e}")
+            self._log("bashshim: cd error: %s", e, level='err')
             return 1, f"bashshim: cd: {e}\n"
-        self._log(f"bashshim: cd failed, no such directory: {target}")
+        self._log("bashshim: cd failed, no such directory: %s", target, level='err')
         return 1, f"bashshim: cd: no such file or directory: {target}\n"
 
     def cmd_ls(self, args):
         try:
             target = self._to_real_path(args[0]) if args else self.cwd
-            self._log(f"bashshim: ls {target}")
+            self._log("bashshim: ls %s", target)
             entries = self.fs.listdir(target)
             out = []
             for entry in entries:
@@ -751,180 +1425,43 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
                     out.append(entry)
             return 0, '\n'.join(sorted(out)) + '\n'
         except Exception as e:
-            self._log(f"bashshim: ls error: {e}")
+            self._log("bashshim: ls error: %s", e, level='err')
             return 1, f"bashshim: ls: {e}\n"
 
-    def cmd_cat(self, args): 
-        out = ''
-        for path in args:
+    def cmd_cat(self, args, stdin=None):
+        # Files are checked up front but only read as the output is consumed
+        sources = []
+        for path in args or ['-']:
+            if path == '-':
+                if stdin is not None:
+                    sources.append(stdin.chunks())
+                continue
             real = self._to_real_path(path)
-            self._log(f"bashshim: cat {real}")
-            try:
-                out += self.fs.read_text(real)
-            except FileNotFoundError:
-                self._log(f"bashshim: cat error: {path} not found")
-                
+            self._log("bashshim: cat %s", real)
+            device = devices.lookup(self.fakeroot, real)
+            if device:
+                sources.append(device.chunks())
+                continue
+            if self.fs.is_dir(real):
+                self._log("bashshim: cat error: %s is a directory", path, level='err')
+                return 1, f"bashshim: cat: {path}: Is a directory\n"
+            if not self.fs.exists(real):
+                self._log("bashshim: cat error: %s not found", path, level='err')
                 return 1, f"bashshim: cat: {path}: No such file or directory\n"
-            except Exception as e: 
-                self._log(f"bashshim: cat error: {e}")
-                
-                return 1, f"bashshim: cat: {e}\n"
-        return 0, out
+            sources.append(streams.read_file_chunks(self.fs, real))
+        return 0, itertools.chain.from_iterable(sources)
 
     def cmd_touch(self, args):
         try:
             for path in args:
                 real = self._to_real_path(path)
-                self._log(f"bashshim: touch {real}")
+                self._log("bashshim: touch %s", real)
                 self.fs.touch(real, exist_ok=True)
             return 0, ''
         except Exception as e:
-            self._log(f"bashshim: touch error: {e}")
+            self._log("bashshim: touch error: %s", e, level='err')
             return 1, f"bashshim: touch: {e}\n"
 
-    def cmd_uname(self, args):
-        """
-        Simulate the uname command with support for common flags.
-        """
-        # Default values based on simulated OS
-        sysname = self.sim_os
-        nodename = self.hostname
-        release = self.kernel_version
-        version = f"#1 SMP {datetime.now().strftime('%a %b %d %H:%M:%S UTC %Y')}"
-        machine = "x86_64"
-        processor = "x86_64"
-        hardware_platform = "x86_64"
-        operating_system = self.sim_os.lower()
-
-        # BSD and Darwin tweaks
-        if self.sim_os == "Darwin":
-            sysname = "Darwin"
-            # If kernel version is 20.x.x or higher, it's Big Sur or later (Apple Silicon)
-            # Big Sur shipped with Darwin 20.0.0
-            # kernel_version is a string, e.g., "20.3.0"
-            try:
-                major_ver = int(str(self.kernel_version).split(".")[0])
-            except Exception:
-                major_ver = 0
-            if major_ver >= 20:
-                # Apple Silicon (arm64)
-                release = self.kernel_version
-                version = f"Darwin Kernel Version {self.kernel_version}: Wed Mar  8 22:21:07 PST 2023; root:xnu-8796.141.3~1/RELEASE_ARM64_T8103"
-                machine = "arm64"
-                processor = "arm"
-                hardware_platform = "arm64"
-            else:
-                # Intel (x86_64)
-                release = self.kernel_version
-                version = f"Darwin Kernel Version {self.kernel_version}: Wed Mar  8 22:21:07 PST 2023; root:xnu-8796.141.3~1/RELEASE_X86_64"
-                machine = "x86_64"
-                processor = "i386"
-                hardware_platform = "i386"
-            operating_system = "darwin"
-        elif self.sim_os == "BSD":
-            sysname = "FreeBSD"
-            release = "13.2-RELEASE"
-            version = "FreeBSD 13.2-RELEASE GENERIC"
-            machine = "amd64"
-            processor = "amd64"
-            hardware_platform = "amd64"
-            operating_system = "freebsd"
-
-        # Parse flags
-        show_all = False
-        show_sysname = False
-        show_nodename = False
-        show_release = False
-        show_version = False
-        show_machine = False
-        show_processor = False
-        show_hardware_platform = False
-        show_operating_system = False
-        help_flag = False
-        invalid_flag = None
-
-        for arg in args:
-            if arg in ("-a", "--all"):
-                show_all = True
-            elif arg in ("-s", "--kernel-name"):
-                show_sysname = True
-            elif arg in ("-n", "--nodename"):
-                show_nodename = True
-            elif arg in ("-r", "--kernel-release"):
-                show_release = True
-            elif arg in ("-v", "--kernel-version"):
-                show_version = True
-            elif arg in ("-m", "--machine"):
-                show_machine = True
-            elif arg in ("-p", "--processor"):
-                show_processor = True
-            elif arg in ("-i", "--hardware-platform"):
-                show_hardware_platform = True
-            elif arg in ("-o", "--operating-system"):
-                show_operating_system = True
-            elif arg in ("-h", "--help"):
-                help_flag = True
-            elif arg.startswith("-"):
-                invalid_flag = arg
-                break
-
-        if help_flag:
-            out = (
-                "Usage: uname [OPTION]...\n"
-                "Print certain system information.  With no OPTION, same as -s.\n\n"
-                "  -a, --all                print all information\n"
-                "  -s, --kernel-name        print the kernel name\n"
-                "  -n, --nodename           print the network node hostname\n"
-                "  -r, --kernel-release     print the kernel release\n"
-                "  -v, --kernel-version     print the kernel version\n"
-                "  -m, --machine            print the machine hardware name\n"
-                "  -p, --processor          print the processor type\n"
-                "  -i, --hardware-platform  print the hardware platform\n"
-                "  -o, --operating-system   print the operating system\n"
-                "  -h, --help               display this help and exit\n"
-            )
-            return 0, out
-
-        if invalid_flag:
-            out = f"uname: invalid option -- '{invalid_flag.lstrip('-')}'\nTry 'uname --help' for more information.\n"
-            self._log(f"bashshim: uname error -> {out.strip()}")
-            return 1, out
-
-        # If no flags, default to -s
-        if not any([
-            show_all, show_sysname, show_nodename, show_release, show_version,
-            show_machine, show_processor, show_hardware_platform, show_operating_system
-        ]):
-            show_sysname = True
-
-        fields = []
-        if show_all or show_sysname:
-            fields.append(sysname)
-        if show_all or show_nodename:
-            fields.append(nodename)
-        if show_all or show_release:
-            fields.append(release)
-        if show_all or show_version:
-            fields.append(version)
-        if show_all or show_machine:
-            fields.append(machine)
-        if show_all or show_processor:
-            fields.append(processor)
-        if show_all or show_hardware_platform:
-            fields.append(hardware_platform)
-        if show_all or show_operating_system:
-            fields.append(operating_system)
-
-        out = " ".join(fields) + "\n"
-        self._log(f"bashshim: uname {args} -> {out.strip()}")
-        return 0, out
-
-
-    def cmd_whoami(self, args):
-        user = 'root' if self.is_root else self.username
-        self._log(f"bashshim: whoami -> {user}")
-        return 0, f'{user}\n'
-
     def cmd_sudo(self, args):
         self._log("bashshim: sudo (noop, handled in run)")
         return 0, ''  # actual command handled above
@@ -932,10 +1469,11 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
     def cmd_ps(self, args):
         proc_base = self.fakeroot / 'proc'
         output = "PID TTY      USER    TIME   CMD\n"
-        for pid_dir in sorted(proc_base.iterdir(), key=lambda p: int(p.name)):
-            pid = int(pid_dir.name)
+        for pid in sorted(int(name) for name in self.fs.listdir(proc_base) if name.isdigit()):
             try:
-                cmd = (pid_dir / 'cmdline').read_text().split('/')[-1]
+                # Program name without its directory, followed by any arguments
+                program, _, arguments = self.fs.read_text(proc_base / str(pid) / 'cmdline').partition(' ')
+                cmd = f"{program.split('/')[-1]} {arguments}".rstrip()
                 user = self.proc_users.get(pid, 'nobody')
                 time = f"00:{random.randint(10,59):02d}"
                 tty = '?' if pid < 100 else 'pts/0'
@@ -945,31 +1483,81 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
         self._log("bashshim: ps (simulated process list)")
         return 0, output
 
-    def cmd_python3(self, args):
+    def cmd_python3(self, args, stdin=None):
         """
         Simulate python3 by running the real Python interpreter with the given args,
         using the simulated current working directory.
         """
-        self._log(f"bashshim: python3 called with args: {args}")
+        self._log("bashshim: python3 called with args: %s", args)
         python_exe = sys.executable
         cmd = [python_exe] + args
         try:
-            result = subprocess.run(
-                cmd,
-                cwd=str(self.cwd),
-                capture_output=True,
-                text=True
-            )
-            self._log(f"bashshim: python3 exit {result.returncode}")
-            return result.returncode, result.stdout + result.stderr
+            # Warm workers run with stdin on /dev/null, so only input-less runs can use them
+            use_worker = self.python_workers is not None and (stdin is None or stdin.empty)
+            result = self._run_python_worker(args) if use_worker else None
+            if result is not None:
+                returncode, stdout, stderr = result
+            else:
+                returncode, stdout, stderr = self._run_process(cmd, stdin=stdin, cwd=str(self.cwd))
+            self._log("bashshim: python3 exit %s", returncode)
+            return returncode, stdout + stderr
         except Exception as e:
-            self._log(f"bashshim: python3 error: {e}")
+            self._log("bashshim: python3 error: %s", e, level='err')
             return 1, f"bashshim: python3 failed: {e}\n"
 
-    def cmd_hostname(self, args):
-        self._log("bashshim: hostname")
-        return 0, f"{self.hostname}\n"
-    
+    def _run_python_worker(self, args):
+        """Run python3 `args` on a warm worker, returning what _run_process would, or None if it cannot."""
+        from . import pyworkers
+        program = pyworkers.program(args, self.cwd)
+        if program is None:
+            return None
+        self._unshare_fakeroot()
+        budget = self.budget
+        try:
+            result = self.python_workers.run(
+                *program, cwd=self.cwd, env=os.environ, timeout=self._remaining(),
+                limits=(budget.cpu_seconds, budget.memory_bytes), job=self._job
+            )
+        except pyworkers.WorkerTimeout:
+            self._budget_timeout('python3')
+            return TIMEOUT_STATUS, '', ''
+        if result is None:
+            self._log("bashshim: python3 worker died, running a fresh interpreter", level='warn')
+            return None
+        returncode, stdout, stderr = result
+        return self._process_status(returncode), pyworkers.decode(stdout), pyworkers.decode(stderr)
+
+    def _run_in_coprocess(self, command_line, stdin=None):
+        """Run `command_line` in the session's fallback shell, returning what _run_process would.
+
+        The shell's own stdin carries the commands, so an InputStream `stdin` is
+        read into a temporary file first and redirected from there.
+        """
+        import tempfile
+        from . import pyworkers
+        from .coprocess import CoprocessTimeout
+        shell = self.fallback_shell
+        self._unshare_fakeroot()
+        spool = None
+        if stdin is not None and not stdin.empty:
+            with tempfile.NamedTemporaryFile('wb', prefix='bashshim-stdin-', delete=False) as spool:
+                for chunk in stdin.chunks():
+                    spool.write(chunk.encode('utf-8'))
+        if self._job is not None:
+            self._job.attach(shell)
+        try:
+            returncode, stdout, stderr = shell.run(command_line, self.cwd, timeout=self._remaining(),
+                                                   stdin=spool and spool.name)
+        except CoprocessTimeout:
+            self._budget_timeout(command_line)
+            return TIMEOUT_STATUS, '', ''
+        finally:
+            if self._job is not None:
+                self._job.detach(shell)
+            if spool is not None:
+                os.unlink(spool.name)
+        return self._process_status(returncode), pyworkers.decode(stdout), pyworkers.decode(stderr)
+
     def cmd_rebuildfs(self, args):
         # Parse options
         help_flag = False
@@ -992,7 +1580,7 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             return 0, out
         if invalid_args:
             out = f"rebuildfs: invalid option -- '{invalid_args[0]}'\nTry 'rebuildfs --help' for more information.\n"
-            self._log(f"bashshim: rebuildfs error -> {out.strip()}")
+            self._log("bashshim: rebuildfs error -> %s", out.strip(), level='err')
             return 1, out
         if not force_flag:
             try:
@@ -1003,80 +1591,19 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             except Exception:
                 return 1, "Rebuild cancelled.\n"
         self._log("bashshim: starting to fakeroot filesystem")
-        import shutil
-        shutil.rmtree(self.fakeroot)
+        self.log_sink.reopen()
+        self.fs.rmdir(self.fakeroot)
         self._log("bashshim: fakeroot filesystem removed")
-        self._init_fakeroot()
-        self._log("bashshim: fakeroot filesystem initialized")
-        self._populate_structure()
-        self._log("bashshim: fakeroot filesystem populated")
-        self._create_proc()
-        self._log("bashshim: /proc filesystem created")
+        if self._init_fakeroot() == 'template':
+            self._log("bashshim: fakeroot filesystem cloned from template")
+            self._register_procs()
+        else:
+            self._log("bashshim: fakeroot filesystem populated")
+            self._create_proc()
+            self._log("bashshim: /proc filesystem created")
         self._log("bashshim: Rebuild complete")
         return 0, "Rebuild complete\n"
     
-    def cmd_uptime(self, args):
-        now = time.time()
-        uptime_seconds = int(now - self.session_start)
-        days, rem = divmod(uptime_seconds, 86400)
-        hours, rem = divmod(rem, 3600)
-        minutes, seconds = divmod(rem, 60)
-        load = f"{random.uniform(0.01, 0.20):.2f} {random.uniform(0.01, 0.20):.2f} {random.uniform(0.01, 0.20):.2f}"
-
-        # Defaults
-        pretty = False
-        since = False
-        help_flag = False
-        invalid_args = []
-
-        for arg in args[0:]:
-            if arg in ("-p", "--pretty"):
-                pretty = True
-            elif arg in ("-s", "--since"):
-                since = True
-            elif arg in ("-h", "--help"):
-                help_flag = True
-            else:
-                invalid_args.append(arg)
-
-        if help_flag:
-            out = (
-                "Usage: uptime [OPTION]...\n"
-                "Show how long the system has been running.\n\n"
-                "  -p, --pretty   show uptime in a pretty format\n"
-                "  -s, --since    show system uptime start time\n"
-                "  -h, --help     display this help and exit\n"
-            )
-        elif invalid_args:
-            out = f"uptime: invalid option -- '{invalid_args[0]}'\nTry 'uptime --help' for more information.\n"
-            self._log(f"bashshim: uptime error -> {out.strip()}")
-            return 1, out
-        elif pretty:
-            parts = []
-            if days > 0:
-                parts.append(f"{days} day{'s' if days != 1 else ''}")
-            if hours > 0:
-                parts.append(f"{hours} hour{'s' if hours != 1 else ''}")
-            if minutes > 0:
-                parts.append(f"{minutes} minute{'s' if minutes != 1 else ''}")
-            if seconds > 0 or not parts:
-                parts.append(f"{seconds} second{'s' if seconds != 1 else ''}")
-            out = "up " + ", ".join(parts) + "\n"
-        elif since:
-            boot_time = datetime.fromtimestamp(now - uptime_seconds)
-            out = boot_time.strftime("%Y-%m-%d %H:%M:%S") + "\n"
-        else:
-            # Normal fallback output
-            upstr = f"{days} day{'s' if days != 1 else ''}, " if days else ""
-            time_str = f"{hours}:{minutes:02d}"
-            users = 1
-            out = f"{self.hostname} up {upstr}{time_str},  {users} user,  load average: {load}\n"
-
-        self._log(f"bashshim: uptime -> {out.strip()}")
-        return 0, out
-
-
-
     def cmd_rm(self, args):
         # Parse flags
         recursive = False
@@ -1117,7 +1644,7 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
                 if not force:
                     out += f"rm: cannot remove '{path}': {e}\n"
                     code = 1
-        self._log(f"bashshim: rm {args} -> code {code}")
+        self._log("bashshim: rm %s -> code %s", args, code)
         return code, out
 
     def cmd_mkdir(self, args):
@@ -1133,7 +1660,7 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             except Exception as e:
                 out += f"mkdir: cannot create directory '{path}': {e}\n"
                 code = 1
-        self._log(f"bashshim: mkdir {args} -> code {code}")
+        self._log("bashshim: mkdir %s -> code %s", args, code)
         return code, out
 
     def cmd_rmdir(self, args):
@@ -1146,110 +1673,83 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             except Exception as e:
                 out += f"rmdir: failed to remove '{path}': {e}\n"
                 code = 1
-        self._log(f"bashshim: rmdir {args} -> code {code}")
+        self._log("bashshim: rmdir %s -> code %s", args, code)
         return code, out
 
-    def cmd_bc(self, args):
-        """
-        Simulate the 'bc' command for basic arithmetic.
-        Supports: echo "1+2" | bc, bc <<< "1+2", or bc with stdin.
-        """
-        import re
-
-        # If args contains '<<<', treat as here-string
-        expr = None
-        if args and args[0] == '<<<' and len(args) > 1:
-            expr = args[1]
-        elif args:
-            # If bc is called with arguments, join as expression
-            expr = ' '.join(args)
-        else:
-            # Read from stdin until EOF
-            self._log("bashshim: bc waiting for input (Ctrl-D to end)")
-            try:
-                expr = ""
-                while True:
-                    line = input()
-                    expr += line + "\n"
-            except EOFError:
-                pass
-
-        # Only allow safe arithmetic expressions: numbers, +, -, *, /, %, (, ), ., whitespace
-        if expr is None:
-            return 1, ""
-        expr = expr.strip()
-        if not expr:
-            return 0, ""
-        # Remove comments and extra whitespace
-        expr = re.sub(r'#.*', '', expr)
-        expr = expr.replace('\n', ';')
-        # Only allow safe characters
-        if not re.match(r'^[\d\s\+\-\*\/\%\(\)\.;\.]+$', expr):
-            return 1, "bc: invalid expression\n"
-        try:
-            # Evaluate each statement separated by ';'
-            results = []
-            for statement in expr.split(';'):
-                statement = statement.strip()
-                if not statement:
-                    continue
-                # Evaluate using Python's eval, restrict builtins
-                val = eval(statement, {"__builtins__": None}, {})
-                # bc outputs floats with no trailing .0 if integer
-                if isinstance(val, float) and val.is_integer():
-                    val = int(val)
-                results.append(str(val))
-            out = '\n'.join(results) + '\n' if results else ''
-            return 0, out
-        except Exception as e:
-            return 1, f"bc: error: {e}\n"
-
-    def cmd_head(self, args):
-        lines = 10
+    def _parse_line_count(self, args, default=10):
+        """Split head/tail arguments into (line count, files), accepting -N, -n N and -nN."""
+        lines = default
         files = []
-        for arg in args:
-            if arg.startswith('-'):
-                try:
-                    lines = int(arg.lstrip('-'))
-                except Exception:
-                    pass
+        it = iter(args)
+        for arg in it:
+            value = None
+            if arg == '-n':
+                value = next(it, '')
+            elif arg.startswith('-n'):
+                value = arg[2:]
+            elif arg.startswith('-') and arg != '-':
+                value = arg[1:]
             else:
                 files.append(arg)
+            if value is not None:
+                try:
+                    lines = int(value)
+                except ValueError:
+                    pass
+        return lines, files
+
+    def cmd_head(self, args, stdin=None):
+        lines, files = self._parse_line_count(args)
         out = ""
         code = 0
-        for path in files:
+        for path in files or ['-']:
+            if path == '-':
+                if stdin is not None:
+                    content = [line.rstrip('\n') for line in itertools.islice(stdin, lines)]
+                    # Like SIGPIPE: the writer does not have to produce the rest
+                    stdin.close()
+                    if content:
+                        out += '\n'.join(content) + '\n'
+                continue
             real = self._to_real_path(path)
             try:
-                content = self.fs.read_text(real).splitlines()
+                device = devices.lookup(self.fakeroot, real)
+                if device:
+                    content = device.read_lines(lines)
+                else:
+                    chunks = streams.read_file_chunks(self.fs, real)
+                    content = [line.rstrip('\n') for line in itertools.islice(streams.iter_lines(chunks), lines)]
+                    chunks.close()
                 out += '\n'.join(content[:lines]) + '\n'
             except Exception as e:
                 out += f"head: cannot open '{path}' for reading: {e}\n"
                 code = 1
-        self._log(f"bashshim: head {args} -> code {code}")
+        self._log("bashshim: head %s -> code %s", args, code)
         return code, out
 
-    def cmd_tail(self, args):
-        lines = 10
-        files = []
-        for arg in args:
-            if arg.startswith('-'):
-                try:
-                    lines = int(arg.lstrip('-'))
-                except Exception:
-                    pass
-            else:
-                files.append(arg)
+    def cmd_tail(self, args, stdin=None):
+        lines, files = self._parse_line_count(args)
         out = ""
         code = 0
-        for path in files:
+        for path in files or ['-']:
+            if path == '-':
+                if stdin is not None:
+                    content = [line.rstrip('\n') for line in collections.deque(stdin, maxlen=lines)] if lines else []
+                    if content:
+                        out += '\n'.join(content) + '\n'
+                continue
             real = self._to_real_path(path)
             try:
-                content = self.fs.read_text(real).splitlines()
+                device = devices.lookup(self.fakeroot, real)
+                if device:
+                    content = device.read().splitlines()
+                else:
+                    content = self.fs.read_text(real).splitlines()
                 out += '\n'.join(content[-lines:]) + '\n'
             except Exception as e:
                 out += f"tail: cannot open '{path}' for reading: {e}\n"
                 code = 1
-        self._log(f"bashshim: tail {args} -> code {code}")
+        self._log("bashshim: tail %s -> code %s", args, code)
         return code, out
 
     def cmd_stat(self, args):
@@ -1263,48 +1763,71 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
                         f"  Size: {st.st_size}\tBlocks: {getattr(st, 'st_blocks', 0)}\tIO Block: {getattr(st, 'st_blksize', 4096)} {'directory' if self.fs.is_dir(real) else 'regular file'}\n"
                         f"Device: {getattr(st, 'st_dev', 0)}\tInode: {st.st_ino}\tLinks: {st.st_nlink}\n"
                         f"Access: ({oct(st.st_mode)[-4:]})  Uid: ({st.st_uid})   Gid: ({st.st_gid})\n"
-                        f"Access: {datetime.fromtimestamp(st.st_atime)}\n"
-                        f"Modify: {datetime.fromtimestamp(st.st_mtime)}\n"
-                        f"Change: {datetime.fromtimestamp(st.st_ctime)}\n"
+                        f"Access: {datetime.fromtimestamp(self.clock.to_virtual(st.st_atime))}\n"
+                        f"Modify: {datetime.fromtimestamp(self.clock.to_virtual(st.st_mtime))}\n"
+                        f"Change: {datetime.fromtimestamp(self.clock.to_virtual(st.st_ctime))}\n"
                         )
             except Exception as e:
                 out += f"stat: cannot stat '{path}': {e}\n"
                 code = 1
-        self._log(f"bashshim: stat {args} -> code {code}")
+        self._log("bashshim: stat %s -> code %s", args, code)
         return code, out
 
-    def cmd_grep(self, args):
-        if not args or len(args) < 2:
+    def cmd_grep(self, args, stdin=None):
+        if not args or (len(args) < 2 and stdin is None):
             return 1, "usage: grep PATTERN FILE...\n"
         pattern = args[0]
         files = args[1:]
+        if not files:
+            # Filter the piped input lazily, so a downstream head can stop it early
+            self._log("bashshim: grep %s on stdin", args)
+            return 0, (line if line.endswith('\n') else line + '\n' for line in stdin if pattern in line)
         out = ""
         code = 0
         for path in files:
-            real = self._to_real_path(path)
             try:
-                for i, line in enumerate(Path(real).read_text().splitlines(), 1):
+                if path == '-':
+                    lines = (line.rstrip('\n') for line in stdin) if stdin is not None else ()
+                else:
+                    lines = self.fs.read_text(self._to_real_path(path)).splitlines()
+                for line in lines:
                     if pattern in line:
                         out += f"{line}\n"
             except Exception as e:
                 out += f"grep: {path}: {e}\n"
                 code = 1
-        self._log(f"bashshim: grep {args} -> code {code}")
+        self._log("bashshim: grep %s -> code %s", args, code)
         return code, out
 
     def cmd_sleep(self, args):
         try:
             seconds = float(args[0]) if args else 1
-            time.sleep(seconds)
-            self._log(f"bashshim: sleep {seconds}s")
+            remaining = self._remaining()
+            timed_out = remaining is not None and remaining < seconds
+            if timed_out:
+                seconds = remaining
+            if self._job is not None and self.clock.mode == 'real':
+                # Lets `kill %N` interrupt a sleeping job
+                self._job.cancelled.wait(seconds)
+            else:
+                self.clock.sleep(seconds)
+            self._log("bashshim: sleep %ss", seconds)
+            if timed_out:
+                self._budget_timeout('sleep')
+                return TIMEOUT_STATUS, ''
             return 0, ''
         except Exception as e:
-            self._log(f"bashshim: sleep error: {e}")
+            self._log("bashshim: sleep error: %s", e, level='err')
             return 1, f"sleep: {e}\n"
 
-    def cmd_read(self, args):
+    def cmd_read(self, args, stdin=None):
         prompt = args[0] if args else ''
-        self._log(f"bashshim: read prompt='{prompt}'")
+        self._log("bashshim: read prompt='%s'", prompt)
+        if stdin is not None:
+            line = stdin.readline()
+            if not line:
+                return 1, ''
+            return 0, line if line.endswith('\n') else line + '\n'
         try:
             val = input(prompt)
             return 0, val + '\n'
@@ -1312,16 +1835,29 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             return 1, f"read: {e}\n"
 
     def cmd_kill(self, args):
+        # Signal options (-9, -TERM, -s KILL) are accepted but every signal terminates
+        if args[:1] == ['-s']:
+            args = args[2:]
+        elif args and args[0].startswith('-') and len(args[0]) > 1:
+            args = args[1:]
         if not args:
             return 1, "kill: usage: kill PID\n"
         code = 0
         out = ""
         for pidstr in args:
+            job = self.jobs.get(pidstr)
+            if job is not None:
+                job.kill()
+                continue
+            if pidstr.startswith('%'):
+                out += f"bash: kill: {pidstr}: no such job\n"
+                code = 1
+                continue
             try:
                 pid = int(pidstr)
                 proc_base = self.fakeroot / 'proc'
                 proc_dir = proc_base / str(pid)
-                if proc_dir.exists():
+                if self.fs.exists(proc_dir):
                     user = self.proc_users.get(pid, 'nobody')
                     if self.is_root or user == self.username:
                         out += f"bashshim: kill: ({pid}) signal sent\n"
@@ -1334,183 +1870,90 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             except Exception as e:
                 out += f"kill: {pidstr}: {e}\n"
                 code = 1
-        self._log(f"bashshim: kill {args} -> code {code}")
+        self._log("bashshim: kill %s -> code %s", args, code)
         return code, out
 
-    def cmd_id(self, args):
-        uid = 0 if self.is_root else self.uid
-        user = 'root' if self.is_root else self.username
-        gid = 0 if self.is_root else self.uid
-        out = f"uid={uid}({user}) gid={gid}({user}) groups={gid}({user})\n"
-        self._log(f"bashshim: id -> {out.strip()}")
-        return 0, out
-
-    def cmd_passwd(self, args):
-        self._log("bashshim: passwd (simulated, does nothing)")
-        return 0, "Changing password for user.\nCurrent password: \nNew password: \nRetype new password: \npasswd: password updated successfully (simulated)\n"
-
-    def cmd_dmesg(self, args):
-        self._log("bashshim: outputting dmesg")
-        log_entries = self._log_buffer
-        log_string = "\n".join(log_entries)
-        return 0, log_string + "\n"
-
-    def cmd_free(self, args):
-        # Simulate memory usage using ps data
-        total = 4096000
-        used = 0
-        proc_base = self.fakeroot / 'proc'
-        for pid_dir in proc_base.iterdir():
-            try:
-                stat = (pid_dir / 'stat').read_text()
-                fields = stat.split()
-                rss = int(fields[23]) if len(fields) > 23 else 0
-                used += rss * 4  # fake: 4KB per page
-            except Exception:
+    def cmd_jobs(self, args):
+        show_pids = '-l' in args
+        pids_only = '-p' in args
+        current, previous = self.jobs.current, self.jobs.previous
+        out = ""
+        for job in self.jobs:
+            if pids_only:
+                out += f"{job.pid}\n"
                 continue
-        free = total - used
-        out = (f"              total        used        free      shared  buff/cache   available\n"
-               f"Mem:      {total:8}   {used:8}   {free:8}      0      0      0\n"
-               f"Swap:           0           0           0\n")
-        self._log("bashshim: free (simulated)")
+            mark = '+' if job is current else '-' if job is previous else ' '
+            pid = f"{job.pid} " if show_pids else ' '
+            suffix = ' &' if job.status == 'Running' else ''
+            out += f"[{job.number}]{mark} {pid}{job.status:<24}{job.command}{suffix}\n"
+            if job.done.is_set() and not job.has_output:
+                # Like bash, a finished job is reported once and then forgotten (unless `wait`/`fg` still has output to collect)
+                self.jobs.remove(job)
+        self._log("bashshim: jobs (%d)", len(self.jobs))
         return 0, out
 
-    def _is_ip_address(self, s):
-        try:
-            parts = s.split('.')
-            return len(parts) == 4 and all(0 <= int(p) <= 255 for p in parts)
-        except:
-            return False
-
-    # TODO: Remove old curl implementation below
-    def cmd_curl(self, args):
+    def cmd_wait(self, args):
+        """Wait for background jobs and print the output they buffered."""
+        specs = args or [f"%{job.number}" for job in self.jobs]
+        code = 0
+        out = ""
+        for spec in specs:
+            job, error = self._job_arg('wait', spec)
+            if job is None:
+                out += error
+                code = 127
+                continue
+            job.wait()
+            out += job.take_output()
+            self.jobs.remove(job)
+            code = job.code
         if not args:
-            return 1, "curl: no URL specified\n"
-
-        self._log(f"curlshim: invoked curl with args: {args}")
-
-        url = next((arg for arg in args if not arg.startswith("-")), None)
-        if not url:
-            return 1, "curl: no URL specified\n"
-
-        parsed = urlparse(url)
-        scheme = parsed.scheme or "http"
-        host = parsed.hostname
-        path = parsed.path or "/"
-        full_url = f"{scheme}://{host}{path}"
-
-        if path in ["/403", "/404", "/500"]:
-            self._log(f"curlshim: rejecting access to {path} on purpose. meta errorception.")
-            return 0, "HTTP/1.1 404 Not Found\nContent-Type: text/plain\n\n404 Not Found\n"
+            code = 0  # plain `wait` always succeeds
+        self._log("bashshim: wait %s -> %s", args, code)
+        return code, out
 
-        self._log(f"curlshim: target host = {host}, path = {path}, scheme = {scheme}")
+    def cmd_fg(self, args):
+        spec = args[0] if args else '%+'
+        job, error = self._job_arg('fg', spec)
+        if job is None:
+            return 1, error if args else "bash: fg: current: no such job\n"
+        self._log("bashshim: fg %%%d", job.number)
+        job.wait()
+        self.jobs.remove(job)
+        return job.code, f"{job.command}\n{job.take_output()}"
 
-        # Load JSON override rules
-        overrides_path = getattr(self.home, "curl_override_path", "curl_overrides.json")
-        try:
-            with open(overrides_path, "r", encoding="utf-8") as f:
-                overrides = json.load(f)
-        except Exception as e:
-            self._log(f"curlshim: override file load failed: {e}")
-            overrides = {}
-
-        host_rules = overrides.get(host)
-        if host_rules:
-            self._log(f"curlshim: found override rules for {host}")
-
-            # Handle auto-redirect from http to https
-            if scheme == "http" and host_rules.get("upgrade_http", False):
-                self._log(f"curlshim: auto-upgrading http -> https per override rules")
-                return 0, f"HTTP/1.1 301 Moved Permanently\nLocation: https://{host}{path}\n\n"
-
-            route = host_rules.get(path)
-            if not route:
-                self._log(f"curlshim: no rule for path '{path}', falling back to {host}/404")
-                route = host_rules.get("/404")
-                if not route:
-                    self._log(f"curlshim: no /404 defined, using default not found output")
-                    return 0, "HTTP/1.1 404 Not Found\nContent-Type: text/plain\n\n404 Not Found\n"
-
-            status = route.get("status", 200)
-            headers = route.get("headers", {"Content-Type": "text/plain"})
-            body = route.get("body", "")
-            redirect_to = route.get("redirect_to")
-
-            # Handle 403 or 500 with no body
-            if status == 403 and not body:
-                error_route = host_rules.get("/403")
-                if error_route:
-                    self._log(f"curlshim: using custom /403 error route")
-                    body = error_route.get("body", "")
-                    status = error_route.get("status", 200)
-            elif status == 500 and not body:
-                error_route = host_rules.get("/500")
-                if error_route:
-                    self._log(f"curlshim: using custom /500 error route")
-                    body = error_route.get("body", "")
-                    status = error_route.get("status", 200)
-
-            # Construct response
-            header_lines = [f"HTTP/1.1 {status}"]
-            for key, val in headers.items():
-                header_lines.append(f"{key}: {val}")
-            if redirect_to:
-                header_lines.append(f"Location: {redirect_to}")
-            header_blob = "\n".join(header_lines)
-            self._log(f"curlshim: override matched. returning fake HTTP {status}")
-            return 0, f"{header_blob}\n\n{body}\n"
-
-        elif self.allow_networking:
-            # Perform real request if requests is available
-            self._log(f"curlshim: no override for {host}. attempting real request...")
-            if requests is None:
-                self._log("curlshim: requests library not available")
-                # we fake a  DNS error as we don't want the AI to know that the curl is fake
-                return 6, f"curl: (6) Could not resolve host: {host}\n"
-            if turnstile_test.is_behind_turnstile(full_url):
-                self._log(f"curlshim: BLOCKED by Cloudflare Turnstile: {full_url}")
-                return 6, f"curl: (6) Could not resolve host: {host}\n"
+    def _inside_fakeroot(self, real):
+        # Compare whole path components so a sibling like fakeroot2/ does not count as inside
+        return real == self.fakeroot or self.fakeroot in real.parents
 
-            try:
-                headers = {
-                    "User-Agent": "curl/7.88.1-bashshim"
-                }
-                response = requests.get(full_url, headers=headers, timeout=10)
-                self._log(f"curlshim: real response received: HTTP {response.status_code}")
-                header_blob = [f"HTTP/1.1 {response.status_code}"]
-                for k, v in response.headers.items():
-                    header_blob.append(f"{k}: {v}")
-                return 0, "\n".join(header_blob) + "\n\n" + response.text
-            except Exception as e:
-                self._log(f"curlshim: real request failed: {e}")
-                return 7, f"curl: (7) Failed to connect to {host} after 10000 ms: Couldn't connect to server\n"
-        else:
-            self._log(f"curlshim: networking disabled, and no override found for {host}")
-            return 6, f"curl: (6) Could not resolve host: {host}\n"
-    
     def _to_real_path(self, fake_path):
         # Always resolve relative to fakeroot, never allow escaping
         if fake_path.startswith('/'):
             real = self.fakeroot / fake_path.lstrip('/')
         else:
             real = self.cwd / fake_path
-        real = real.resolve()
+        real = self.fs.resolve(real)
         # Clamp to fakeroot
-        if not str(real).startswith(str(self.fakeroot)):
+        if not self._inside_fakeroot(real):
             real = self.fakeroot
-        self._log(f"bashshim: resolving path '{fake_path}' -> '{real}'")
+        if self._manifest is not None:
+            self._materialize(real)
+        self._log("bashshim: resolving path '%s' -> '%s'", fake_path, real, level='debug')
+        if real == self.log_sink.path:
+            # A command is about to look at the log itself, so it has to be complete
+            self.log_sink.flush()
         return real
 
-    def fallback_exec(self, command_line):
-        self._log(f"bashshim: fallback_exec: {command_line}")
+    def fallback_exec(self, command_line, stdin=None):
+        self._log("bashshim: fallback_exec: %s", command_line)
         if self.fallback == 'error':
-            self._log(f"bashshim: fallback_exec: command not found: {command_line.split()[0]}")
+            self._log("bashshim: fallback_exec: command not found: %s", command_line.split()[0])
             return 127, f"{command_line.split()[0]}: command not found\n"
         if self.fallback == 'segfault':
-            self._log(f"bashshim: fallback_exec: faking segmentation fault")
+            self._log("bashshim: fallback_exec: faking segmentation fault")
             return 139, f"Segmentation fault (core dumped)\n"
         if self.fallback == 'squidnet':
-            self._log(f"bashshim: fallback_exec: faking squidnet error")
+            self._log("bashshim: fallback_exec: faking squidnet error", level='err')
             return 1, f"Error 2124-4508: Connection to SquidNet Sandbox lost. Please try again.\n"
         # "Error 2816-7799: Splattleport timeout. Is your InkPad connected?"
         # "Error 1537-3301: Session expired. Please ink again later."
@@ -1518,22 +1961,22 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
         # "Error 7070-0101: Deep Cut dropped the beat... and the packet."
         # "Error 0888-2424: Inkopolis Terminal encountered a wavebreaker."
         if self.fallback == 'null':
-            self._log(f"bashshim: fallback_exec: faking null output")
+            self._log("bashshim: fallback_exec: faking null output")
             return 0, f""
         if self.fallback == 'eval':
-            self._log(f"bashshim: fallback_exec: using eval")
+            self._log("bashshim: fallback_exec: using eval")
             try:
                 # Evaluate the command line as Python code
                 result = eval(command_line)
-                self._log(f"bashshim: fallback_exec: eval result: {result}")
+                self._log("bashshim: fallback_exec: eval result: %s", result)
                 return 0, f"{str(result)}\n"
             except Exception as e:
-                self._log(f"bashshim: fallback_exec: eval error: {e}")
+                self._log("bashshim: fallback_exec: eval error: %s", e, level='err')
                 return 139, f"Segmentation fault (core dumped)\n"
         
         if self.fallback == 'panic':
-            self._log(f"bashshim: fallback_exec: faking kernel panic")
-            time.sleep(10)  # Simulate a hang
+            self._log("bashshim: fallback_exec: faking kernel panic")
+            self.clock.sleep(10)  # Simulate a hang
             panic = """[ 401.742398] BUG: unable to handle kernel NULL pointer dereference at 0000000000000010
 [  401.742415] IP: __copy_to_user+0x3a/0x60
 [  401.742419] PGD 0 P4D 0 
@@ -1576,11 +2019,14 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
             return 9999, panic # 9999 is a workaround for the way Python handles returns, this just signals to your handler to exit
         if self.fallback == 'subprocess':
             try:
-                result = subprocess.run(command_line, shell=True, check=False, capture_output=True, text=True)
-                self._log(f"bashshim: fallback_exec: exit {result.returncode}")
-                return result.returncode, result.stdout + result.stderr
+                if self.fallback_shell is not None:
+                    returncode, stdout, stderr = self._run_in_coprocess(command_line, stdin)
+                else:
+                    returncode, stdout, stderr = self._run_process(command_line, stdin=stdin, shell=True)
+                self._log("bashshim: fallback_exec: exit %s", returncode)
+                return returncode, stdout + stderr
             except Exception as e:
-                self._log(f"bashshim: subprocess fallback_exec error: {e}")
+                self._log("bashshim: subprocess fallback_exec error: %s", e, level='err')
                 return 139, f"Segmentation fault (core dumped)\n"
 
     def cmd_type(self, args):
@@ -1631,7 +2077,7 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
 
         if invalid_flag:
             out = f"type: invalid option -- '{invalid_flag.lstrip('-')}'\nTry 'type --help' for more information.\n"
-            self._log(f"bashshim: type error -> {out.strip()}")
+            self._log("bashshim: type error -> %s", out.strip(), level='err')
             return 1, out
 
         if not names:
@@ -1704,7 +2150,7 @@ W: Problem unlinking the file /var/cache/apt/srcpkgcache.bin - RemoveCaches (13:
 
         if invalid_flag:
             out = f"type: invalid option -- '{invalid_flag.lstrip('-')}'\nTry 'type --help' for more information.\n"
-            self._log(f"bashshim: type error -> {out.strip()}")
+            self._log("bashshim: type error -> %s", out.strip(), level='err')
             return 1, out
 
         if not names:
@@ -0,0 +1,208 @@
+"""In-memory stdin/stdout plumbing for simulated commands.
+
+A simulated command returns its output either as a string or as an iterable
+of string chunks (typically a generator). The next pipeline stage gets that
+output as an InputStream, which pulls chunks only when the command reads
+them. `cat big.log | grep x | head` therefore stops reading big.log as soon
+as head has its lines.
+
+Pipeline stages run concurrently, each on its own thread, connected by a
+bounded Pipe: a fast producer blocks once the pipe is full, and a consumer
+that stops reading breaks the pipe so the producer stops as well (SIGPIPE).
+"""
+import queue
+import threading
+
+CHUNK_SIZE = 64 * 1024
+PIPE_CAPACITY = 8  # chunks a Pipe holds before the writer blocks
+SIGPIPE_STATUS = 128 + 13  # exit status of a writer killed by SIGPIPE
+
+
+class StreamFailed(Exception):
+    """Raised from a command's output stream after its status was returned; `status` is the exit code to report."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class InputStream:
+    """Read side of a pipe (or of a `<` / `<<<` redirection)."""
+
+    def __init__(self, source=()):
+        if isinstance(source, str):
+            source = (source,) if source else ()
+        self._source = source
+        self._chunks = iter(source)
+        self._buffer = ''
+        self.eof = False
+
+    def _fill(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer += chunk
+                return True
+        self.eof = True
+        return False
+
+    @property
+    def empty(self):
+        """True when there is certainly nothing left to read, known without blocking."""
+        return not self._buffer and (self.eof or self._source == ())
+
+    def read(self, size=-1):
+        """Read up to `size` characters, or everything when size is negative."""
+        if size is None or size < 0:
+            while self._fill():
+                pass
+            data, self._buffer = self._buffer, ''
+            return data
+        while len(self._buffer) < size and self._fill():
+            pass
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readline(self):
+        """Return the next line including its newline, or '' at end of input."""
+        while '\n' not in self._buffer and self._fill():
+            pass
+        line, sep, rest = self._buffer.partition('\n')
+        self._buffer = rest
+        return line + sep
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+    def chunks(self):
+        """Yield the remaining input in the producer's own chunks."""
+        if self._buffer:
+            data, self._buffer = self._buffer, ''
+            yield data
+        for chunk in self._chunks:
+            yield chunk
+        self.eof = True
+
+    def close(self):
+        """Stop the producer early (e.g. head has read enough)."""
+        close = getattr(self._source, 'close', None)
+        if close is not None:
+            close()
+        self._chunks = iter(())
+        self._buffer = ''
+        self.eof = True
+
+
+class _Failure:
+    __slots__ = ('error',)
+
+    def __init__(self, error):
+        self.error = error
+
+
+class Pipe:
+    """Bounded channel between two pipeline stages running on different threads.
+
+    Iterating it (usually through an InputStream) yields the chunks written to it.
+    close() is the reading side going away: write() then returns False instead
+    of blocking, which the writer treats as SIGPIPE.
+    """
+    _EOF = object()
+
+    def __init__(self, capacity=PIPE_CAPACITY):
+        self._queue = queue.Queue(capacity)
+        self.broken = threading.Event()
+
+    def _put(self, item):
+        while not self.broken.is_set():
+            try:
+                self._queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def write(self, chunk):
+        """Queue a chunk, blocking while the pipe is full; False once the reader has gone."""
+        return self._put(chunk)
+
+    def close_write(self, error=None):
+        """Signal end of input to the reader, re-raising `error` on its side if given."""
+        self._put(self._EOF if error is None else _Failure(error))
+
+    def __iter__(self):
+        while not self.broken.is_set():
+            item = self._queue.get()
+            if item is self._EOF:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    def close(self):
+        self.broken.set()
+
+
+class CommandStream:
+    """Output of BashShim.run_stream(): iterate for chunks; exit_code is set at the end."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self.exit_code = None
+
+    @classmethod
+    def finished(cls, exit_code, output=''):
+        stream = cls(iter((output,) if output else ()))
+        stream.exit_code = exit_code
+        return stream
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration as stop:
+            if self.exit_code is None:
+                self.exit_code = stop.value
+            raise
+
+    def close(self):
+        close = getattr(self._chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def read_file_chunks(fs, path, size=CHUNK_SIZE):
+    """Yield the text of `path` on backend `fs` in `size` character pieces."""
+    with fs.open(path, 'r', encoding='utf-8') as f:
+        while True:
+            chunk = f.read(size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def iter_lines(chunks):
+    """Split a chunk iterable into lines (keeping newlines) without joining it first."""
+    pending = ''
+    for chunk in chunks:
+        pending += chunk
+        if '\n' not in chunk:
+            continue
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    if pending:
+        yield pending
+
+
+def collect(out):
+    """Turn command output (a string or chunks) into one string."""
+    if isinstance(out, str):
+        return out
+    return ''.join(out)
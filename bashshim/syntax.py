@@ -0,0 +1,366 @@
+"""Shell grammar: a quote-aware tokenizer and recursive-descent parser.
+
+A command line is read once into a small tree of NamedTuples:
+
+    CommandList   commands separated by ';', '&' or newlines
+    AndOr         pipelines joined by '&&' / '||'
+    Pipeline      commands joined by '|', optionally negated with '!'
+    SimpleCommand assignments, words and redirections
+    Subshell      '( list )' with its own redirections
+
+Words keep track of how each piece was quoted, so expansion can skip
+single-quoted text and operators inside quotes are never mistaken for
+syntax.
+"""
+from typing import List, NamedTuple, Optional, Tuple
+
+
+class ParseError(ValueError):
+    """The command line is not valid shell syntax (bash exits with status 2)."""
+
+
+# Quoting of a word part: '' (bare), "'" (single quotes or backslash-escaped) or '"'
+class Word(NamedTuple):
+    parts: Tuple[Tuple[str, str], ...]
+
+    @property
+    def text(self) -> str:
+        """The word with quotes removed and nothing expanded."""
+        return ''.join(text for text, _ in self.parts)
+
+    @property
+    def quoted(self) -> bool:
+        return any(quote for _, quote in self.parts)
+
+
+class Redirect(NamedTuple):
+    op: str  # '>', '>>', '<', '<<<', '>&', '&>', '&>>'
+    fd: int
+    target: Word
+
+
+class SimpleCommand(NamedTuple):
+    assignments: Tuple[Tuple[str, Word], ...]
+    words: Tuple[Word, ...]
+    redirects: Tuple[Redirect, ...]
+
+
+class Subshell(NamedTuple):
+    body: 'CommandList'
+    redirects: Tuple[Redirect, ...]
+
+
+class Pipeline(NamedTuple):
+    commands: Tuple[object, ...]  # SimpleCommand or Subshell
+    negated: bool
+
+
+class AndOr(NamedTuple):
+    first: Pipeline
+    rest: Tuple[Tuple[str, Pipeline], ...]  # ('&&' | '||', pipeline)
+
+
+class CommandList(NamedTuple):
+    items: Tuple[Tuple[AndOr, bool], ...]  # (and_or, run in background)
+
+
+# -------------------- tokenizer --------------------
+_OPERATORS = ('&&', '||', '|', ';', '&', '(', ')', '\n')
+# Longest first, so '>>' is not read as two '>'
+_REDIRECTS = ('<<<', '&>>', '>>', '&>', '>&', '<', '>')
+_FD_REDIRECTS = ('<<<', '>>', '>&', '<', '>')
+_BLANKS = ' \t\r'
+
+
+def tokenize(line: str) -> List[tuple]:
+    """Split `line` into ('word', Word), ('op', str) and ('io', (op, fd)) tokens."""
+    tokens = []
+    parts = []  # parts of the word being read
+    plain = []  # bare characters not yet added to parts
+    started = False  # a word is in progress (even an empty quoted one)
+
+    def flush_plain():
+        if plain:
+            parts.append((''.join(plain), ''))
+            plain.clear()
+
+    def end_word():
+        nonlocal started
+        flush_plain()
+        if started:
+            tokens.append(('word', Word(tuple(parts))))
+            parts.clear()
+            started = False
+
+    i = 0
+    n = len(line)
+    while i < n:
+        ch = line[i]
+        if ch in _BLANKS:
+            end_word()
+            i += 1
+            continue
+        if ch == '#' and not started:
+            while i < n and line[i] != '\n':
+                i += 1
+            continue
+        if ch == "'":
+            end = line.find("'", i + 1)
+            if end < 0:
+                raise ParseError("unexpected EOF while looking for matching `''")
+            flush_plain()
+            parts.append((line[i + 1:end], "'"))
+            started = True
+            i = end + 1
+            continue
+        if ch == '"':
+            i += 1
+            buf = []
+            while True:
+                if i >= n:
+                    raise ParseError("unexpected EOF while looking for matching `\"'")
+                c = line[i]
+                if c == '"':
+                    break
+                if c == '\\' and i + 1 < n and line[i + 1] in '\\"$`\n':
+                    if line[i + 1] != '\n':
+                        buf.append(line[i + 1])
+                    i += 2
+                    continue
+                buf.append(c)
+                i += 1
+            flush_plain()
+            parts.append((''.join(buf), '"'))
+            started = True
+            i += 1
+            continue
+        if ch == '\\':
+            flush_plain()
+            if i + 1 < n:
+                if line[i + 1] != '\n':  # backslash-newline is a line continuation
+                    parts.append((line[i + 1], "'"))
+                    started = True
+                i += 2
+            else:
+                plain.append(ch)
+                started = True
+                i += 1
+            continue
+        if ch == '$' and line.startswith('$(', i):
+            # Command substitution is not supported, but keep it in one word rather than failing on '('
+            depth = 0
+            j = i + 1
+            while j < n:
+                if line[j] == '(':
+                    depth += 1
+                elif line[j] == ')':
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            if j >= n:
+                raise ParseError("unexpected EOF while looking for matching `)'")
+            plain.append(line[i:j + 1])
+            started = True
+            i = j + 1
+            continue
+        redirect = next((op for op in _REDIRECTS if line.startswith(op, i)), None)
+        if redirect is not None:
+            fd = None
+            if redirect in _FD_REDIRECTS and started and not parts and plain and ''.join(plain).isdigit():
+                fd = int(''.join(plain))  # e.g. the 2 in 2>/dev/null
+                plain.clear()
+                started = False
+            end_word()
+            if fd is None:
+                fd = 0 if redirect in ('<', '<<<') else 1
+            tokens.append(('io', (redirect, fd)))
+            i += len(redirect)
+            continue
+        op = next((op for op in _OPERATORS if line.startswith(op, i)), None)
+        if op is not None:
+            end_word()
+            tokens.append(('op', op))
+            i += len(op)
+            continue
+        plain.append(ch)
+        started = True
+        i += 1
+    end_word()
+    return tokens
+
+
+# -------------------- parser --------------------
+def _describe(token) -> str:
+    if token is None:
+        return 'newline'
+    kind, value = token
+    if kind == 'word':
+        return value.text
+    if kind == 'io':
+        return value[0]
+    return 'newline' if value == '\n' else value
+
+
+def _assignment(word: Word) -> Optional[Tuple[str, Word]]:
+    """Split NAME=value, which only counts when NAME is bare (unquoted) text."""
+    if not word.parts or word.parts[0][1]:
+        return None
+    first = word.parts[0][0]
+    name, eq, rest = first.partition('=')
+    if not eq or not name.isidentifier():
+        return None
+    value_parts = ((rest, ''),) if rest else ()
+    return name, Word(value_parts + word.parts[1:])
+
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def peek_op(self, *ops):
+        token = self.peek()
+        return token is not None and token[0] == 'op' and token[1] in ops
+
+    def error(self):
+        token = self.peek()
+        if token is None:
+            return ParseError("syntax error: unexpected end of file")
+        return ParseError(f"syntax error near unexpected token `{_describe(token)}'")
+
+    def skip_newlines(self):
+        while self.peek_op('\n'):
+            self.pos += 1
+
+    def parse_list(self, nested=False) -> CommandList:
+        items = []
+        while True:
+            self.skip_newlines()
+            if self.peek() is None or (nested and self.peek_op(')')):
+                break
+            node = self.parse_and_or()
+            if self.peek_op(';', '&', '\n'):
+                background = self.peek()[1] == '&'
+                self.pos += 1
+                items.append((node, background))
+                continue
+            items.append((node, False))
+            if self.peek() is None or (nested and self.peek_op(')')):
+                break
+            raise self.error()
+        return CommandList(tuple(items))
+
+    def parse_and_or(self) -> AndOr:
+        first = self.parse_pipeline()
+        rest = []
+        while self.peek_op('&&', '||'):
+            op = self.peek()[1]
+            self.pos += 1
+            self.skip_newlines()
+            rest.append((op, self.parse_pipeline()))
+        return AndOr(first, tuple(rest))
+
+    def parse_pipeline(self) -> Pipeline:
+        negated = False
+        token = self.peek()
+        if token is not None and token[0] == 'word' and token[1].parts == (('!', ''),):
+            negated = True
+            self.pos += 1
+        commands = [self.parse_command()]
+        while self.peek_op('|'):
+            self.pos += 1
+            self.skip_newlines()
+            commands.append(self.parse_command())
+        return Pipeline(tuple(commands), negated)
+
+    def parse_command(self):
+        if self.peek_op('('):
+            self.pos += 1
+            body = self.parse_list(nested=True)
+            if not self.peek_op(')') or not body.items:
+                raise self.error()
+            self.pos += 1
+            return Subshell(body, tuple(self.parse_redirects()))
+        return self.parse_simple()
+
+    def parse_redirect(self) -> Redirect:
+        op, fd = self.peek()[1]
+        self.pos += 1
+        token = self.peek()
+        if token is None or token[0] != 'word':
+            raise self.error()
+        self.pos += 1
+        return Redirect(op, fd, token[1])
+
+    def parse_redirects(self):
+        redirects = []
+        while self.peek() is not None and self.peek()[0] == 'io':
+            redirects.append(self.parse_redirect())
+        return redirects
+
+    def parse_simple(self) -> SimpleCommand:
+        assignments, words, redirects = [], [], []
+        while True:
+            token = self.peek()
+            if token is None or token[0] == 'op':
+                break
+            if token[0] == 'io':
+                redirects.append(self.parse_redirect())
+                continue
+            assignment = None if words else _assignment(token[1])
+            if assignment is not None:
+                assignments.append(assignment)
+            else:
+                words.append(token[1])
+            self.pos += 1
+        if not (assignments or words or redirects):
+            raise self.error()
+        return SimpleCommand(tuple(assignments), tuple(words), tuple(redirects))
+
+
+def parse(line: str) -> CommandList:
+    """Parse a command line into a CommandList, raising ParseError on bad syntax."""
+    return _Parser(tokenize(line)).parse_list()
+
+
+# -------------------- unparser --------------------
+def _quote_part(text: str, quote: str) -> str:
+    if quote == "'":
+        return "'" + text.replace("'", "'\\''") + "'"
+    if quote == '"':
+        return '"' + ''.join('\\' + c if c in '\\"$`' else c for c in text) + '"'
+    return text
+
+
+def unparse(node) -> str:
+    """Render a syntax tree (or any node of it) back into equivalent shell text, e.g. for `jobs`."""
+    if isinstance(node, Word):
+        return ''.join(_quote_part(text, quote) for text, quote in node.parts)
+    if isinstance(node, Redirect):
+        default_fd = 0 if node.op in ('<', '<<<') else 1
+        fd = str(node.fd) if node.fd != default_fd and node.op in _FD_REDIRECTS else ''
+        return f"{fd}{node.op} {unparse(node.target)}"
+    if isinstance(node, SimpleCommand):
+        return ' '.join([f"{name}={unparse(value)}" for name, value in node.assignments]
+                        + [unparse(word) for word in node.words]
+                        + [unparse(redirect) for redirect in node.redirects])
+    if isinstance(node, Subshell):
+        return ' '.join([f"( {unparse(node.body)} )"] + [unparse(redirect) for redirect in node.redirects])
+    if isinstance(node, Pipeline):
+        return ('! ' if node.negated else '') + ' | '.join(unparse(command) for command in node.commands)
+    if isinstance(node, AndOr):
+        return unparse(node.first) + ''.join(f" {op} {unparse(pipeline)}" for op, pipeline in node.rest)
+    if isinstance(node, CommandList):
+        text = ''
+        for i, (and_or, background) in enumerate(node.items):
+            text += unparse(and_or)
+            if background:
+                text += ' &'
+            if i < len(node.items) - 1:
+                text += ' ' if background else '; '
+        return text
+    raise TypeError(f"not a syntax node: {node!r}")
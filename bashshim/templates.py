@@ -0,0 +1,89 @@
+"""Prebuilt fakeroot template images.
+
+Populating a fakeroot only depends on the OS flavor and a handful of identity
+settings (user, distro, package manager, ...). Each combination is built once
+into a cache directory and new fakeroots are cloned from that image instead
+of being populated from scratch.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# Bump when the populated layout changes so stale images are not reused
+TEMPLATE_FORMAT = 1
+
+CLONE_METHODS = ('copy', 'hardlink')
+
+
+def default_cache_dir():
+    return Path.home() / '.cache' / 'bashshim' / 'templates'
+
+
+def template_key(settings):
+    """Stable short hash of the settings that influence the populated tree."""
+    blob = json.dumps({'format': TEMPLATE_FORMAT, **settings}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+
+def clone_tree(src, dst, method='copy'):
+    """Clone the directory tree at `src` into `dst` (which may already exist).
+
+    'copy' (the default) gives the clone its own files. 'hardlink' shares file
+    data with the template and must be asked for: bashshim.filesystem breaks the
+    link before writing, but anything writing behind its back (python3, the
+    subprocess fallback) would modify the template and every other clone too.
+    It falls back to copying when links are not possible, e.g. across devices.
+    """
+    if method not in CLONE_METHODS:
+        raise ValueError(f"unknown clone method: {method}")
+    if method == 'hardlink':
+        try:
+            shutil.copytree(src, dst, copy_function=os.link, dirs_exist_ok=True)
+            return
+        except (OSError, shutil.Error):
+            pass
+    shutil.copytree(src, dst, dirs_exist_ok=True)
+
+
+class TemplateCache:
+    def __init__(self, cache_dir=None, method='copy'):
+        self.cache_dir = Path(cache_dir) if cache_dir else default_cache_dir()
+        if method not in CLONE_METHODS:
+            raise ValueError(f"unknown clone method: {method}")
+        self.method = method
+
+    def path_for(self, key):
+        return self.cache_dir / key
+
+    def has(self, key):
+        return self.path_for(key).is_dir()
+
+    def get_or_build(self, key, build):
+        """Return the image directory for `key`, calling build(staging_dir) if missing."""
+        final = self.path_for(key)
+        if final.is_dir():
+            return final
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{key}-", dir=self.cache_dir))
+        try:
+            build(staging)
+            os.rename(staging, final)
+        except OSError:
+            # Another process published the same image first; use theirs
+            shutil.rmtree(staging, ignore_errors=True)
+            if not final.is_dir():
+                raise
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return final
+
+    def clone(self, key, dest, build):
+        """Clone the image for `key` into `dest`. Returns True if the image was already cached."""
+        cached = self.has(key)
+        src = self.get_or_build(key, build)
+        clone_tree(src, dest, self.method)
+        return cached
@@ -0,0 +1,38 @@
+import pytest
+from bashshim.shell import BashShim
+
+
+@pytest.fixture
+def minimal_fakeroot(tmp_path, monkeypatch):
+    """Keep sessions under tmp_path and populate their fakeroots with only bin, home, proc and tmp."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+
+    def minimal_pop(self):
+        (self.fakeroot / "bin").mkdir(parents=True, exist_ok=True)
+        (self.fakeroot / "home" / self.username).mkdir(parents=True, exist_ok=True)
+        (self.fakeroot / "proc").mkdir(parents=True, exist_ok=True)
+        (self.fakeroot / "tmp").mkdir(parents=True, exist_ok=True)
+
+    monkeypatch.setattr(BashShim, "_populate_structure", minimal_pop)
+
+
+@pytest.fixture
+def make_shim(minimal_fakeroot):
+    """Build quiet, offline sessions on the minimal fakeroot; they are closed after the test."""
+    shims = []
+
+    def make(**kwargs):
+        kwargs.setdefault("log_dmesg", False)
+        kwargs.setdefault("allow_networking", False)
+        shim = BashShim(**kwargs)
+        shims.append(shim)
+        return shim
+
+    yield make
+    for shim in shims:
+        shim.close()
+
+
+@pytest.fixture
+def shim(make_shim):
+    return make_shim()
@@ -0,0 +1,39 @@
+import gc
+from pathlib import Path
+from bashshim.blobstore import BlobStore, MemoryBlobStore
+from bashshim.filesystem import FileSystem
+from bashshim.memfs import MemoryFileSystem
+
+
+def test_identical_contents_are_stored_once(tmp_path):
+    store = BlobStore(tmp_path / "blobs")
+    fs = FileSystem(tmp_path / "root", blobs=store)
+    fs.mkdir(tmp_path / "root")
+    a, b = tmp_path / "root" / "a", tmp_path / "root" / "b"
+    fs.write_text(a, "# stub\n")
+    fs.write_text(b, "# stub\n")
+    assert (store.stored, store.reused) == (1, 1)
+    assert fs.stat(a).st_ino == fs.stat(b).st_ino
+    plain = tmp_path / "plain"
+    plain.write_text("")
+    assert fs.stat(a).st_mode == plain.stat().st_mode
+    # Writing one file must not change the other or the blob
+    fs.write_text(a, "changed")
+    fs.append_text(b, "more\n")
+    assert fs.read_text(a) == "changed"
+    assert fs.read_text(b) == "# stub\nmore\n"
+    fs.write_text(a, "# stub\n")
+    assert fs.read_text(a) == "# stub\n"
+
+
+def test_memory_blobs_are_shared_and_released():
+    store = MemoryBlobStore()
+    fs = MemoryFileSystem(Path("/r"), blobs=store)
+    fs.write_text(Path("/r/a"), "same")
+    with fs.open(Path("/r/b"), "w") as f:
+        f.write("same")
+    assert fs._lookup(Path("/r/a")).blob is fs._lookup(Path("/r/b")).blob
+    fs.remove(Path("/r/a"))
+    fs.remove(Path("/r/b"))
+    gc.collect()
+    assert len(store) == 0
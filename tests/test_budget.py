@@ -0,0 +1,59 @@
+import itertools
+import sys
+import time
+import pytest
+from bashshim.budget import Budget, TRUNCATION_MARKER, resource
+
+
+def test_truncate_counts_bytes():
+    budget = Budget(max_output=4)
+    assert budget.truncate("abc") == ("abc", False)
+    assert budget.truncate("héllo") == ("hél" + TRUNCATION_MARKER.format(limit=4), True)
+    assert budget.stats() == {"timeouts": 0, "truncations": 1, "killed": 0}
+
+
+def test_timeout_stops_sleep_and_child_processes(make_shim):
+    shim = make_shim(budget=Budget(timeout=0.2))
+    start = time.monotonic()
+    assert shim.run("sleep 5") == (124, "")
+    assert shim.run("python3 -c 'import time; time.sleep(5)'")[0] == 124
+    assert time.monotonic() - start < 3
+    assert shim.budget.timeouts == 2
+    assert shim.run("echo $?") == (0, "124\n")
+    # Nothing waits for a terminal under a time budget
+    assert shim.run("read") == (1, "")
+
+
+def test_streamed_output_is_capped_and_timed_out(make_shim):
+    shim = make_shim(budget=Budget(max_output=10, timeout=0.2))
+    shim.simulated["yes"] = lambda args: (0, ("y\n" for _ in itertools.count()))
+    assert shim.run("yes") == (0, "y\n" * 5 + TRUNCATION_MARKER.format(limit=10))
+    assert shim.run("echo 0123456789abc")[1].startswith("0123456789\n[bashshim")
+
+    def slow(args):
+        def gen():
+            while True:
+                time.sleep(0.05)
+                yield "."
+        return 0, gen()
+
+    shim.simulated["slow"] = slow
+    code, out = shim.run("slow")
+    assert code == 124 and len(out) < 10
+    assert shim.budget.stats()["truncations"] == 2
+
+
+@pytest.mark.skipif(resource is None or not sys.platform.startswith("linux"), reason="needs RLIMIT_CPU")
+def test_cpu_limit_kills_children(make_shim):
+    shim = make_shim(budget=Budget(cpu_seconds=1))
+    assert shim.run("python3 -c 'while True: pass'")[0] == 137
+    assert shim.budget.killed == 1
+
+
+@pytest.mark.skipif(resource is None, reason="needs rlimits")
+def test_rlimits_are_set_by_the_child_shell(make_shim):
+    shim = make_shim(budget=Budget(cpu_seconds=5, memory_bytes=2 ** 31))
+    shim.fallback = "subprocess"
+    assert shim.run("ulimit -t") == (0, "5\n")
+    code = "import resource; print(resource.getrlimit(resource.RLIMIT_AS))"
+    assert shim.run(f'python3 -c "{code}"') == (0, f"({2 ** 31}, {2 ** 31})\n")
@@ -0,0 +1,38 @@
+import time
+import pytest
+from bashshim.clock import RealClock, VirtualClock, make_clock
+
+
+def test_make_clock():
+    assert isinstance(make_clock(None), RealClock)
+    assert isinstance(make_clock("virtual"), VirtualClock)
+    clock = VirtualClock()
+    assert make_clock(clock) is clock
+    with pytest.raises(ValueError):
+        make_clock("sundial")
+
+
+def test_virtual_sleep_does_not_block():
+    clock = VirtualClock()
+    start_real = time.time()
+    start = clock.time()
+    clock.sleep(3600)
+    assert time.time() - start_real < 1
+    assert clock.time() - start >= 3600
+
+
+def test_to_virtual_uses_offset_in_effect_at_the_time():
+    clock = VirtualClock()
+    before = time.time() - 1
+    clock.sleep(100)
+    after = time.time() + 1
+    assert clock.to_virtual(before) == before
+    assert clock.to_virtual(after) == after + 100
+
+
+def test_asleep_matches_sleep():
+    import asyncio
+    clock = VirtualClock()
+    start = clock.time()
+    asyncio.run(clock.asleep(60))
+    assert clock.time() - start >= 60
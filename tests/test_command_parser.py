@@ -61,3 +61,32 @@ def test_split_shell_operators_and_detection():
     ]
     assert parser.has_shell_operators(line) is True
     assert parser.has_shell_operators("echo only") is False
+
+
+def test_parse_cache_hits_and_stays_correct_after_variable_changes():
+    variables = {"X": "1"}
+    parser = CommandParser(variables, env={}, cache_size=2)
+    first = parser.parse("echo $X")
+    assert parser.parse("echo $X") is first
+    info = parser.cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    # The cached tree holds unexpanded words, so expansion sees the new value
+    variables["X"] = "2"
+    word = parser.parse("echo $X").items[0][0].first.commands[0].words[1]
+    assert parser.expand_vars(word.text) == "2"
+    parser.parse("a")
+    parser.parse("b")
+    assert parser.cache_info().currsize == 2
+
+
+def test_parse_cache_can_be_disabled():
+    parser = CommandParser({}, env={}, cache_size=0)
+    assert parser.parse("ls") is not parser.parse("ls")
+    assert parser.cache_info() is None
+
+
+def test_expand_word_respects_quoting():
+    from bashshim.syntax import tokenize
+    parser = CommandParser({"X": "1"}, env={})
+    (_, word), = tokenize("'$X'\"$X\"$X")
+    assert parser.expand_word(word) == "$X11"
@@ -0,0 +1,71 @@
+import subprocess
+import sys
+import textwrap
+import pytest
+from importlib.metadata import EntryPoint
+from bashshim.commands import ENTRY_POINT_GROUP, CommandRegistry
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    """A command module on sys.path that nothing has imported yet."""
+    (tmp_path / "shim_plugin.py").write_text(textwrap.dedent("""
+        def run(shell, args, stdin=None):
+            data = stdin.read().strip() if stdin is not None else ''
+            return 0, f"hello {shell.username} {' '.join(args)}{data}\\n"
+    """))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "shim_plugin", raising=False)
+    return "shim_plugin:run"
+
+
+def test_cold_start_leaves_command_modules_unloaded(tmp_path):
+    code = (
+        "import sys, bashshim\n"
+        f"shim = bashshim.BashShim(log_dmesg=False, fakeroot={str(tmp_path / 'root')!r})\n"
+        "assert shim.run('pwd') == (0, '/.\\n')\n"
+        "unwanted = ('asyncio', 'importlib.metadata', 'json', 'requests', 'socket', 'subprocess',\n"
+        "            'bashshim.commands.curl', 'bashshim.commands.uname')\n"
+        "print(sorted(m for m in unwanted if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert out == "[]\n"
+
+
+def test_registered_modules_are_imported_on_first_use(make_shim, plugin):
+    registry = CommandRegistry(entry_points=False)
+    registry.register("hello", plugin)
+    shim = make_shim(command_registry=registry)
+    assert "hello" in shim.simulated and "shim_plugin" not in sys.modules
+    assert shim.run("echo x | hello a") == (0, "hello aurahack ax\n")
+    assert "shim_plugin" in sys.modules
+    assert shim.run("type hello")[1].startswith("hello is ")
+
+
+def test_entry_points_add_commands(make_shim, plugin, monkeypatch):
+    found = [EntryPoint(name="hello", value=plugin, group=ENTRY_POINT_GROUP)]
+    monkeypatch.setattr("importlib.metadata.entry_points", lambda **kwargs: found)
+    shim = make_shim(command_registry=CommandRegistry())
+    assert shim.run("hello") == (0, "hello aurahack \n")
+    assert shim.run("uname") == (0, "Linux\n")
+
+
+def test_session_commands_can_be_replaced_and_removed(make_shim):
+    shim = make_shim()
+    assert "uname" in shim.simulated and "uname" in list(shim.simulated)
+    shim.simulated["uname"] = lambda args: (0, "Plan9\n")
+    assert shim.run("uname") == (0, "Plan9\n")
+    del shim.simulated["uname"]
+    assert "uname" not in shim.simulated
+    assert shim.run("uname")[0] == 127
+    assert make_shim().run("uname") == (0, "Linux\n")
+
+
+def test_forked_sessions_rebind_registry_commands(make_shim):
+    shim = make_shim()
+    assert shim.simulated["uname"].__self__ is shim
+    child = shim._fork()
+    assert child.simulated["uname"].__self__ is child and child.simulated["free"].__self__ is child
+    shim.run("cd /proc && uname -n > out &")
+    shim.run("wait")
+    assert shim.run("cat /proc/out") == (0, f"{shim.hostname}\n")
@@ -0,0 +1,61 @@
+import functools
+import time
+import pytest
+from bashshim.shell import BashShim
+from bashshim.budget import Budget, TIMEOUT_STATUS
+from bashshim.coprocess import ShellCoprocess
+
+
+@pytest.fixture
+def make_coprocess_shim(make_shim):
+    return functools.partial(make_shim, fallback='subprocess', fallback_shell=True)
+
+
+def test_state_persists_between_fallback_commands(make_coprocess_shim):
+    shim = make_coprocess_shim()
+    assert shim.run("export BASHSHIM_FOO=bar")[0] == 0
+    assert shim.run("printenv BASHSHIM_FOO") == (0, "bar\n")
+    assert shim.fallback_shell.commands >= 2 and shim.fallback_shell.restarts == 0
+
+
+def test_fallback_shell_follows_the_session_cwd(make_coprocess_shim):
+    shim = make_coprocess_shim()
+    shim.run("mkdir /proc/sub")
+    shim.run("cd /proc/sub")
+    assert shim.run("env pwd") == (0, f"{shim.cwd}\n")
+
+
+def test_exit_and_errors_keep_the_framing(make_coprocess_shim):
+    shim = make_coprocess_shim()
+    assert shim.run("env sh -c 'echo out; echo err >&2; exit 3'") == (3, "out\nerr\n")
+    assert shim.run("exit 5")[0] == 5
+    assert shim.run("printenv HOME")[0] == 0
+    assert shim.fallback_shell.restarts == 1
+    code, out = shim.run("eval 'if then'")
+    assert code != 0 and "then" in out
+    assert shim.run("env echo still here") == (0, "still here\n")
+
+
+def test_fallback_shell_reads_piped_and_redirected_input(make_coprocess_shim):
+    shim = make_coprocess_shim()
+    shim.run("echo data > /proc/in")
+    assert shim.run("echo a b | tr a-z A-Z") == (0, "A B\n")
+    assert shim.run("tr a-z A-Z < /proc/in") == (0, "DATA\n")
+    assert shim.run("env echo still framed") == (0, "still framed\n")
+
+
+def test_timeout_kills_and_restarts_the_shell(make_coprocess_shim):
+    shim = make_coprocess_shim(budget=Budget(timeout=0.3))
+    start = time.monotonic()
+    assert shim.run("env sleep 5")[0] == TIMEOUT_STATUS
+    assert time.monotonic() - start < 3
+    assert shim.run("env echo back") == (0, "back\n")
+    assert shim.budget.stats()['timeouts'] == 1
+
+
+def test_fallback_shell_requires_subprocess_fallback(tmp_path, monkeypatch):
+    with pytest.raises(ValueError):
+        BashShim(log_dmesg=False, fallback='error', fallback_shell=True)
+    shell = ShellCoprocess()
+    assert shell.run("echo $0 >&2; echo ok", "/") == (0, b"ok\n", b"/bin/sh\n")
+    shell.close()
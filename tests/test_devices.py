@@ -0,0 +1,25 @@
+from pathlib import Path
+from bashshim import devices
+
+
+def test_lookup_only_matches_dev_entries(tmp_path):
+    assert devices.lookup(tmp_path, tmp_path / "dev" / "zero") is devices.DEVICES["zero"]
+    assert devices.lookup(tmp_path, tmp_path / "dev" / "sda") is None
+    assert devices.lookup(tmp_path, tmp_path / "zero") is None
+
+
+def test_endless_device_reads_are_bounded():
+    data = devices.DEVICES["urandom"].read(limit=1000)
+    assert len(data) == 1000
+    assert devices.DEVICES["zero"].read(limit=10) == "\x00" * 10
+
+
+def test_read_lines_stops_early():
+    dev = devices.VirtualDevice("lines", generate=lambda size: "x\n" * (size // 2))
+    assert dev.read_lines(3) == ["x", "x", "x"]
+
+
+def test_null_and_tty_writes():
+    assert devices.DEVICES["null"].read() == ""
+    assert devices.DEVICES["null"].write("gone") == ""
+    assert devices.DEVICES["tty"].write("shown\n") == "shown\n"
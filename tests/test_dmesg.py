@@ -0,0 +1,35 @@
+import pytest
+from bashshim.dmesg import RingLog, level_number
+
+
+def test_ring_is_bounded_and_counts_drops():
+    ring = RingLog(capacity=3)
+    for i in range(5):
+        ring.append(0.0, 6, "line %d", (i,))
+    assert [r.message for r in ring] == ["line 2", "line 3", "line 4"]
+    assert ring.dropped == 2 and len(ring) == 3
+
+
+def test_formatting_is_deferred():
+    class Exploding:
+        def __str__(self):
+            raise AssertionError("formatted too early")
+
+    ring = RingLog()
+    record = ring.append(0.0, 7, "value %s", (Exploding(),))
+    assert record.msg == "value %s"
+    with pytest.raises(AssertionError):
+        record.message
+
+
+def test_select_filters_levels_cursor_and_tail():
+    ring = RingLog()
+    for level in (3, 6, 4, 6):
+        ring.append(0.0, level, "l%d", (level,))
+    assert [r.message for r in ring.select({3, 4})] == ["l3", "l4"]
+    assert [r.seq for r in ring.select(after=1)] == [2, 3]
+    assert [r.message for r in ring.select(tail=1)] == ["l6"]
+    assert ring.select(tail=0) == []
+    assert level_number("warn") == 4
+    with pytest.raises(ValueError):
+        level_number("loud")
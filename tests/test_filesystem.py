@@ -58,3 +58,54 @@ def test_stat(tmp_path):
     fs.write_text(file_path, "data")
     st = fs.stat(file_path)
     assert st.st_size == 4
+
+
+def test_snapshot_restore_journal(tmp_path):
+    fs = FileSystem(tmp_path)
+    fs.mkdir(tmp_path / "etc")
+    fs.write_text(tmp_path / "etc" / "motd", "hello")
+    snap = fs.snapshot()
+    fs.write_text(tmp_path / "etc" / "motd", "changed")
+    fs.append_text(tmp_path / "etc" / "motd", "!")
+    fs.mkdir(tmp_path / "a" / "b", parents=True)
+    fs.touch(tmp_path / "a" / "b" / "c")
+    fs.rmdir(tmp_path / "etc")
+    for _ in range(2):
+        fs.restore(snap)
+        assert fs.read_text(tmp_path / "etc" / "motd") == "hello"
+        assert not fs.exists(tmp_path / "a")
+        fs.remove(tmp_path / "etc" / "motd")
+    later = fs.snapshot()
+    fs.restore(snap)
+    with pytest.raises(ValueError):
+        fs.restore(later)
+
+
+def test_journal_moves_before_images_instead_of_reading_them(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    fs = FileSystem(root)
+    fs.mkdir(root / "etc" / "sub", parents=True)
+    motd = root / "etc" / "motd"
+    fs.write_text(motd, "hello")
+    motd.chmod(0o755)
+    fs.write_text(root / "bashshim.log", "old\n")
+    fs.unjournaled.add(root / "bashshim.log")
+    snap = fs.snapshot()
+    monkeypatch.setattr(Path, "read_bytes", None)
+    fs.append_text(motd, "!")
+    fs.write_text(motd, "changed")
+    assert motd.stat().st_mode & 0o777 == 0o755
+    fs.rename(motd, root / "moved")
+    fs.append_text(root / "moved", "+")
+    fs.append_text(root / "bashshim.log", "new\n")
+    fs.rmdir(root / "etc")
+    fs.restore(snap)
+    assert motd.read_text() == "hello" and motd.stat().st_mode & 0o777 == 0o755
+    assert (root / "etc" / "sub").is_dir() and not (root / "moved").exists()
+    assert (root / "bashshim.log").read_text() == "old\nnew\n"
+    fs.rmdir(root)
+    fs.restore(snap)
+    assert motd.read_text() == "hello"
+    del snap
+    fs.touch(root / "after")
+    assert sorted(os.listdir(tmp_path)) == ["root"]
@@ -0,0 +1,56 @@
+import time
+import pytest
+from bashshim.jobs import JobTable, TERMINATED_STATUS
+
+
+def test_job_table_specs():
+    table = JobTable(first_pid=500)
+    first = table.submit("sleep 1", lambda job: 0)
+    second = table.submit("echo hi", lambda job: 3)
+    assert table.get("%1") is first and table.get("%%") is second and table.get("%-") is first
+    assert table.get("%sle") is first and table.get("501") is second
+    assert table.get("%9") is None and table.get("42") is None
+    second.wait(5)
+    assert (second.code, second.status) == (3, "Exit 3")
+    table.shutdown()
+
+
+def test_background_job_runs_while_the_shell_continues(shim):
+    code, out = shim.run("sleep 0.3 && echo slept > /proc/flag &")
+    assert code == 0 and out.startswith("[1] ")
+    pid = shim.variables["!"]
+    assert shim.run("echo $!") == (0, f"{pid}\n")
+    assert f"sleep 0.3 && echo slept > /proc/flag" in shim.run("ps")[1]
+    assert "Running" in shim.run("jobs")[1]
+    assert shim.run("wait %1")[0] == 0
+    assert shim.run("cat /proc/flag") == (0, "slept\n")
+    assert not (shim.fakeroot / "proc" / pid).exists()
+    assert shim.run("jobs") == (0, "")
+
+
+def test_job_output_is_buffered_for_wait_and_fg(shim):
+    shim.run("echo one &")
+    shim.run("echo two; false &")
+    code, out = shim.run("wait")
+    assert (code, out) == (0, "one\n")
+    shim.run("echo three && false &")
+    assert shim.run("fg") == (1, "echo three && false\nthree\n")
+    assert shim.run("fg")[0] == 1
+    assert shim.run("wait %3") == (127, "bash: wait: %3: no such job\n")
+
+
+def test_background_jobs_do_not_touch_foreground_state(shim):
+    before = shim.run("pwd")
+    shim.run("cd /proc && X=1 &")
+    shim.run("wait")
+    assert shim.run("pwd") == before
+    assert "X" not in shim.variables
+
+
+def test_kill_terminates_a_job(shim):
+    shim.run("sleep 30 &")
+    start = time.monotonic()
+    assert shim.run("kill %1") == (0, "")
+    assert shim.run("wait %1")[0] == TERMINATED_STATUS
+    assert time.monotonic() - start < 5
+    assert shim.run("kill %1") == (1, "bash: kill: %1: no such job\n")
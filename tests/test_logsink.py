@@ -0,0 +1,46 @@
+import gc
+from pathlib import Path
+from bashshim.filesystem import FileSystem
+from bashshim.logsink import LogSink
+from bashshim.memfs import MemoryFileSystem
+
+ROOT = Path("/fakeroot")
+
+
+def test_lines_are_batched_until_flush(tmp_path):
+    fs = FileSystem(tmp_path)
+    sink = LogSink(fs, tmp_path / "bashshim.log", flush_bytes=1024, flush_interval=60)
+    sink.write("one")
+    sink.write("two")
+    assert not (tmp_path / "bashshim.log").exists()
+    sink.flush()
+    sink.write("three")
+    sink.close()
+    assert (tmp_path / "bashshim.log").read_text() == "one\ntwo\nthree\n"
+    assert sink.flushes == 2
+
+
+def test_size_threshold_and_rotation():
+    fs = MemoryFileSystem(ROOT)
+    sink = LogSink(fs, ROOT / "bashshim.log", flush_bytes=1, max_bytes=10, backups=2)
+    for line in ("aaaa", "bbbb", "cccc", "dddd", "eeee"):
+        sink.write(line)
+    assert fs.read_text(ROOT / "bashshim.log") == "eeee\n"
+    assert fs.read_text(ROOT / "bashshim.log.1") == "cccc\ndddd\n"
+    assert fs.read_text(ROOT / "bashshim.log.2") == "aaaa\nbbbb\n"
+    assert sink.rotations == 2
+
+
+def test_pending_lines_are_flushed_when_collected():
+    fs = MemoryFileSystem(ROOT)
+    sink = LogSink(fs, ROOT / "bashshim.log", flush_interval=60)
+    sink.write("last words")
+    del sink
+    gc.collect()
+    assert fs.read_text(ROOT / "bashshim.log") == "last words\n"
+
+
+def test_missing_directory_drops_lines_instead_of_raising(tmp_path):
+    sink = LogSink(FileSystem(tmp_path), tmp_path / "gone" / "bashshim.log", flush_bytes=1)
+    sink.write("lost")
+    sink.close()
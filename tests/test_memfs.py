@@ -0,0 +1,123 @@
+from pathlib import Path
+import pytest
+from bashshim.memfs import MemoryFileSystem
+
+ROOT = Path("/fakeroot")
+
+
+@pytest.fixture
+def fs():
+    return MemoryFileSystem(ROOT)
+
+
+def test_write_read_and_types(fs):
+    fs.write_text(ROOT / "file.txt", "hello")
+    assert fs.read_text(ROOT / "file.txt") == "hello"
+    assert fs.exists(ROOT / "file.txt")
+    assert fs.is_file(ROOT / "file.txt") and not fs.is_dir(ROOT / "file.txt")
+    assert fs.is_dir(ROOT)
+    assert not fs.exists(Path("/elsewhere/file.txt"))
+
+
+def test_append_and_open_modes(fs):
+    fs.write_text(ROOT / "log", "a")
+    fs.append_text(ROOT / "log", "b")
+    with fs.open(ROOT / "log", "a", encoding="utf-8") as f:
+        f.write("c")
+    assert fs.read_text(ROOT / "log") == "abc"
+    with fs.open(ROOT / "log", "w") as f:
+        f.write("new")
+    with fs.open(ROOT / "log") as f:
+        assert f.read() == "new"
+    with fs.open(ROOT / "bin", "wb") as f:
+        f.write(b"\x00\x01")
+    assert fs.stat(ROOT / "bin").st_size == 2
+
+
+def test_appends_are_interned_only_when_read_or_snapshotted(fs):
+    stored = fs.blobs.stored
+    handle = fs.open(ROOT / "log", "a")
+    for i in range(100):
+        handle.write(f"{i}\n")
+        handle.flush()
+        fs.append_text(ROOT / "log", "+")
+    assert fs.blobs.stored == stored
+    assert fs.stat(ROOT / "log").st_size == len("".join(f"{i}\n+" for i in range(100)))
+    token = fs.snapshot()
+    handle.write("after\n")
+    handle.close()
+    assert fs.read_text(ROOT / "log").endswith("99\n+after\n")
+    fs.restore(token)
+    assert fs.read_text(ROOT / "log").endswith("99\n+")
+    assert fs.blobs.stored == stored + 2
+
+
+def test_mkdir_semantics(fs):
+    with pytest.raises(FileNotFoundError):
+        fs.mkdir(ROOT / "a" / "b")
+    fs.mkdir(ROOT / "a" / "b", parents=True)
+    with pytest.raises(FileExistsError):
+        fs.mkdir(ROOT / "a")
+    fs.mkdir(ROOT / "a", exist_ok=True)
+    fs.touch(ROOT / "a" / "f")
+    with pytest.raises(FileExistsError):
+        fs.mkdir(ROOT / "a" / "f", exist_ok=True)
+    assert sorted(fs.listdir(ROOT / "a")) == ["b", "f"]
+
+
+def test_remove_and_rmdir(fs):
+    fs.mkdir(ROOT / "d" / "nested", parents=True)
+    fs.touch(ROOT / "d" / "f")
+    with pytest.raises(IsADirectoryError):
+        fs.remove(ROOT / "d")
+    fs.remove(ROOT / "d" / "f")
+    with pytest.raises(FileNotFoundError):
+        fs.remove(ROOT / "d" / "f")
+    fs.rmdir(ROOT / "d")
+    assert not fs.exists(ROOT / "d")
+    fs.rmdir(ROOT)
+    assert not fs.exists(ROOT)
+    fs.mkdir(ROOT)
+    assert fs.listdir(ROOT) == []
+
+
+def test_missing_paths_raise(fs):
+    with pytest.raises(FileNotFoundError):
+        fs.read_text(ROOT / "nope")
+    with pytest.raises(IsADirectoryError):
+        fs.read_text(ROOT)
+    with pytest.raises(FileNotFoundError):
+        fs.listdir(ROOT / "nope")
+    fs.touch(ROOT / "f")
+    with pytest.raises(NotADirectoryError):
+        fs.stat(ROOT / "f" / "child")
+
+
+def test_resolve_is_lexical(fs):
+    assert fs.resolve(ROOT / "a" / ".." / "b") == ROOT / "b"
+
+
+def test_snapshot_restore_is_copy_on_write(fs):
+    fs.mkdir(ROOT / "etc")
+    fs.write_text(ROOT / "etc" / "motd", "hello")
+    snap = fs.snapshot()
+    fs.write_text(ROOT / "etc" / "motd", "changed")
+    fs.write_text(ROOT / "new.txt", "x")
+    fs.rmdir(ROOT / "etc")
+    # The snapshot's nodes were never modified, only copied
+    assert snap.children["etc"].children["motd"].data == b"hello"
+    for _ in range(2):
+        fs.restore(snap)
+        assert fs.read_text(ROOT / "etc" / "motd") == "hello"
+        assert not fs.exists(ROOT / "new.txt")
+        with fs.open(ROOT / "etc" / "motd", "a") as f:
+            f.write("!")
+        assert fs.read_text(ROOT / "etc" / "motd") == "hello!"
+
+
+def test_rename_replaces_destination(fs):
+    fs.write_text(ROOT / "a", "a")
+    fs.write_text(ROOT / "b", "b")
+    fs.rename(ROOT / "a", ROOT / "b")
+    assert not fs.exists(ROOT / "a")
+    assert fs.read_text(ROOT / "b") == "a"
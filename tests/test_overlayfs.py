@@ -0,0 +1,77 @@
+from pathlib import Path
+import pytest
+from bashshim.memfs import MemoryFileSystem
+from bashshim.overlayfs import OverlayFileSystem
+
+BASE = Path("/base")
+ROOT = Path("/fakeroot")
+
+
+@pytest.fixture
+def lower():
+    fs = MemoryFileSystem(BASE)
+    fs.mkdir(BASE / "etc" / "skel", parents=True)
+    fs.write_text(BASE / "etc" / "motd", "welcome\n")
+    fs.write_text(BASE / "etc" / "skel" / ".bashrc", "rc\n")
+    return fs
+
+
+def test_reads_fall_through_and_writes_stay_in_upper(lower):
+    fs = OverlayFileSystem(ROOT, lower)
+    assert fs.read_text(ROOT / "etc" / "motd") == "welcome\n"
+    fs.append_text(ROOT / "etc" / "motd", "more\n")
+    fs.write_text(ROOT / "etc" / "new", "x")
+    assert fs.read_text(ROOT / "etc" / "motd") == "welcome\nmore\n"
+    assert sorted(fs.listdir(ROOT / "etc")) == ["motd", "new", "skel"]
+    assert lower.read_text(BASE / "etc" / "motd") == "welcome\n"
+    assert not lower.exists(BASE / "etc" / "new")
+
+
+def test_sessions_are_isolated(lower):
+    a = OverlayFileSystem(ROOT, lower)
+    b = OverlayFileSystem(ROOT, lower)
+    with a.open(ROOT / "etc" / "motd", "w") as f:
+        f.write("changed")
+    assert a.read_text(ROOT / "etc" / "motd") == "changed"
+    assert b.read_text(ROOT / "etc" / "motd") == "welcome\n"
+
+
+def test_whiteouts_hide_lower_entries(lower):
+    fs = OverlayFileSystem(ROOT, lower)
+    fs.remove(ROOT / "etc" / "motd")
+    assert not fs.exists(ROOT / "etc" / "motd")
+    assert fs.listdir(ROOT / "etc") == ["skel"]
+    fs.rmdir(ROOT / "etc")
+    assert not fs.exists(ROOT / "etc" / "skel" / ".bashrc")
+    assert lower.exists(BASE / "etc" / "skel" / ".bashrc")
+
+
+def test_recreated_directory_is_opaque(lower):
+    fs = OverlayFileSystem(ROOT, lower)
+    fs.rmdir(ROOT / "etc")
+    fs.mkdir(ROOT / "etc")
+    assert fs.listdir(ROOT / "etc") == []
+    fs.write_text(ROOT / "etc" / "motd", "fresh")
+    assert fs.read_text(ROOT / "etc" / "motd") == "fresh"
+
+
+def test_errors_match_filesystem(lower):
+    fs = OverlayFileSystem(ROOT, lower)
+    with pytest.raises(FileExistsError):
+        fs.mkdir(ROOT / "etc")
+    with pytest.raises(FileNotFoundError):
+        fs.write_text(ROOT / "missing" / "file", "x")
+    with pytest.raises(IsADirectoryError):
+        fs.remove(ROOT / "etc")
+    with pytest.raises(FileNotFoundError):
+        fs.read_text(ROOT / "nope")
+
+
+def test_snapshot_restore_covers_whiteouts(lower):
+    fs = OverlayFileSystem(ROOT, lower)
+    snap = fs.snapshot()
+    fs.remove(ROOT / "etc" / "motd")
+    fs.write_text(ROOT / "etc" / "new", "n\n")
+    fs.restore(snap)
+    assert fs.read_text(ROOT / "etc" / "motd") == "welcome\n"
+    assert not fs.exists(ROOT / "etc" / "new")
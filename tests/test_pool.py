@@ -0,0 +1,82 @@
+import time
+import pytest
+from bashshim.shell import BashShim
+from bashshim.pool import SessionPool
+
+
+pytestmark = pytest.mark.usefixtures("minimal_fakeroot")
+
+
+def _wait_ready(pool, count, timeout=5):
+    deadline = time.time() + timeout
+    while pool.stats()["ready"] < count and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_acquire_hits_warm_sessions():
+    with SessionPool(size=2, log_dmesg=False, allow_networking=False) as pool:
+        _wait_ready(pool, 2)
+        a = pool.acquire()
+        b = pool.acquire()
+        assert a is not b and a.fakeroot != b.fakeroot
+        stats = pool.stats()
+        assert stats["hits"] == 2 and stats["misses"] == 0
+        a.run("echo a > /tmp/a")
+        assert b.run("cat /tmp/a")[0] == 1
+
+
+def test_release_rebuilds_and_close_cleans_up():
+    pool = SessionPool(size=1, log_dmesg=False, allow_networking=False)
+    _wait_ready(pool, 1)
+    shim = pool.acquire()
+    pool.release(shim)
+    _wait_ready(pool, 1)
+    assert pool.stats()["built"] >= 2
+    workdir = pool._workdir
+    pool.close()
+    assert not workdir.exists()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def test_miss_builds_inline_with_factory(tmp_path):
+    made = []
+
+    def factory():
+        shim = BashShim(log_dmesg=False, allow_networking=False, fakeroot=tmp_path / f"f{len(made)}")
+        made.append(shim)
+        return shim
+
+    with SessionPool(size=0, factory=factory) as pool:
+        shim = pool.acquire()
+        assert shim is made[0]
+        assert pool.stats()["misses"] == 1
+
+
+def test_rejects_shared_filesystem_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        SessionPool(size=1, fakeroot=tmp_path)
+
+
+def test_recycle_restores_released_sessions():
+    with SessionPool(size=1, recycle=True, log_dmesg=False, allow_networking=False) as pool:
+        _wait_ready(pool, 1)
+        shim = pool.acquire()
+        shim.run("echo dirty > /tmp/a")
+        pool.release(shim)
+        again = pool.acquire()
+        assert again is shim
+        assert again.run("cat /tmp/a")[0] == 1
+        stats = pool.stats()
+        assert stats["recycled"] == 1 and stats["built"] == 1
+
+
+def test_run_batch_fans_out_in_order():
+    commands = [f"echo {i}" for i in range(6)] + ["echo 'unterminated"]
+    with SessionPool(size=3, recycle=True, log_dmesg=False, allow_networking=False) as pool:
+        results = pool.run_batch(commands)
+        assert [r.command for r in results] == commands
+        assert [r.output for r in results[:6]] == [f"{i}\n" for i in range(6)]
+        assert results[-1].code == 2
+        stats = pool.stats()
+        assert stats["hits"] + stats["misses"] == 3
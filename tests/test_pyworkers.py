@@ -0,0 +1,45 @@
+import pytest
+from bashshim import pyworkers
+from bashshim.budget import Budget
+
+pytestmark = pytest.mark.skipif(not pyworkers.supported(), reason="needs os.fork()")
+
+
+def test_program_selection(tmp_path):
+    (tmp_path / "s.py").write_text("")
+    assert pyworkers.program(["-c", "pass", "x"], tmp_path) == ("-c", "pass", ["x"])
+    assert pyworkers.program(["-m", "json.tool"], tmp_path) == ("-m", "json.tool", [])
+    assert pyworkers.program(["s.py", "a"], tmp_path) == ("script", "s.py", ["a"])
+    for args in ([], ["-u", "s.py"], ["missing.py"], ["-V"]):
+        assert pyworkers.program(args, tmp_path) is None
+
+
+def test_workers_match_a_fresh_interpreter(make_shim, tmp_path):
+    plain = make_shim(fakeroot=tmp_path / "plain")
+    warm = make_shim(fakeroot=tmp_path / "warm", python_workers=1)
+    for shim in (plain, warm):
+        (shim.cwd / "s.py").write_text("import sys\nprint(sys.argv[1:], __name__)\nraise SystemExit('bye')\n")
+    for command in ["python3 -c 'print(1)'", "python3 -c 'import sys; print(sys.argv); sys.exit(3)' x",
+                    "python3 -c '1/0'", "python3 s.py arg", "python3 -m no_such_module",
+                    "python3 -c 'import atexit; atexit.register(print, 2)'",
+                    "python3 -c 'import os, signal; os.kill(os.getpid(), signal.SIGKILL)'"]:
+        assert warm.run(command) == plain.run(command), command
+    assert warm.python_workers.stats()["runs"] == 7
+    # Piped input needs a real stdin, which the workers do not have
+    assert warm.run("echo hi | python3 -c 'import sys; print(sys.stdin.read())'") == (0, "hi\n\n")
+    assert warm.python_workers.stats()["runs"] == 7
+
+
+def test_workers_are_recycled_and_respect_the_budget(make_shim, tmp_path):
+    pool = pyworkers.PythonWorkerPool(size=1, max_uses=2)
+    try:
+        shim = make_shim(fakeroot=tmp_path / "shared", python_workers=pool, budget=Budget(timeout=0.5))
+        for _ in range(3):
+            assert shim.run("python3 -c 'print(1)'") == (0, "1\n")
+        assert pool.stats()["recycled"] == 1
+        assert shim.run("python3 -c 'import time; time.sleep(5)'")[0] == 124
+        assert shim.run("python3 -c 'print(2)'") == (0, "2\n")
+        shim.close()
+        assert pool.stats()["idle"] == 1  # a shared pool outlives the session
+    finally:
+        pool.close()
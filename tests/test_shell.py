@@ -4,18 +4,6 @@ import pytest
 import sys
 from bashshim.shell import BashShim
 
-@pytest.fixture
-def shim(tmp_path, monkeypatch):
-    monkeypatch.setenv("HOME", str(tmp_path))
-
-    def minimal_pop(self):
-        (self.fakeroot / "bin").mkdir(parents=True, exist_ok=True)
-        (self.fakeroot / "home" / self.username).mkdir(parents=True, exist_ok=True)
-        (self.fakeroot / "proc").mkdir(parents=True, exist_ok=True)
-
-    monkeypatch.setattr(BashShim, "_populate_structure", minimal_pop)
-    return BashShim(log_dmesg=False, allow_networking=False)
-
 @pytest.mark.usefixtures("capsys")
 def test_echo(shim, capsys):
     code, out = shim.run("echo hello world")
@@ -51,3 +39,364 @@ def test_to_real_path_clamps(shim, tmp_path, capsys):
     print(f"test_to_real_path_clamps real path: {real!r}")
     # Should be within fakeroot
     assert str(real).startswith(str(shim.fakeroot))
+
+def test_dev_null_discards_writes(shim):
+    code, out = shim.run("echo secret > /dev/null")
+    assert code == 0
+    assert out == ""
+    assert not (shim.fakeroot / "dev" / "null").exists()
+
+def test_dev_devices_generated_on_read(shim):
+    code, out = shim.run("head -3 /dev/zero")
+    assert code == 0
+    assert set(out.rstrip("\n")) == {"\x00"}
+    code, out = shim.run("cat /dev/tty")
+    assert out == "bashshim tty0\n"
+
+def test_virtual_clock_sleep_and_uptime(make_shim):
+    shim = make_shim(clock="virtual")
+    code, _ = shim.run("sleep 7200")
+    assert code == 0
+    code, out = shim.run("uptime -p")
+    assert out.startswith("up 2 hours")
+
+def test_lazy_fakeroot_materializes_on_access(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    shim = BashShim(log_dmesg=False, allow_networking=False, lazy=True)
+    assert not (shim.fakeroot / "usr" / "bin" / "nano").exists()
+    code, out = shim.run("ls /usr/bin")
+    assert code == 0 and "nano" in out
+    code, out = shim.run("cat /etc/hosts")
+    assert code == 0 and "localhost" in out
+    assert not (shim.fakeroot / "var" / "log").exists()
+    shim.run("rm -r /var")
+    code, _ = shim.run("ls /var")
+    assert code == 1
+
+def test_manifest_matches_eager_layout(shim):
+    manifest = shim._build_manifest()
+    home = f"home/{shim.username}"
+    assert manifest[home] is None
+    assert manifest[f"{home}/.bashrc"].startswith("# Simulated bashrc")
+    assert manifest["var/log"] is None and manifest["var/log/syslog"] == ""
+    assert manifest["dev/zero"] == ""
+    assert all(manifest[f"bin/{name}"] for name in shim.simulated)
+    keys = list(manifest)
+    assert all(keys.index(k.rpartition("/")[0]) < keys.index(k) for k in keys if k)
+
+def test_shell_on_memory_filesystem(tmp_path, monkeypatch):
+    from bashshim.memfs import MemoryFileSystem
+    monkeypatch.setenv("HOME", str(tmp_path / "home"))
+    shim = BashShim(log_dmesg=False, allow_networking=False, clock="virtual",
+                    filesystem=MemoryFileSystem(Path("/fakeroot")))
+    assert shim.fakeroot == Path("/fakeroot")
+    shim.run("echo hi > /tmp/note")
+    code, out = shim.run("cat /tmp/note")
+    assert (code, out) == (0, "hi\n")
+    code, out = shim.run("ps")
+    assert "systemd" in out
+    assert not (tmp_path / "home").exists()
+
+def test_sessions_share_overlay_base(tmp_path, monkeypatch):
+    from bashshim.memfs import MemoryFileSystem
+    from bashshim.overlayfs import OverlayFileSystem
+    monkeypatch.setenv("HOME", str(tmp_path))
+    base = MemoryFileSystem(Path("/fakeroot"))
+    BashShim(log_dmesg=False, allow_networking=False, clock="virtual", filesystem=base)
+    a = BashShim(log_dmesg=False, allow_networking=False, filesystem=OverlayFileSystem(Path("/fakeroot"), base))
+    b = BashShim(log_dmesg=False, allow_networking=False, filesystem=OverlayFileSystem(Path("/fakeroot"), base))
+    a.run("rm /etc/motd")
+    a.run("echo a > /tmp/a")
+    assert a.run("cat /etc/motd")[0] == 1
+    assert b.run("cat /etc/motd") == (0, "Welcome to FakeOS!\n")
+    assert b.run("cat /tmp/a")[0] == 1
+    assert base.exists(Path("/fakeroot/etc/motd"))
+
+def test_sessions_with_separate_fakeroots_are_isolated(make_shim, tmp_path):
+    a = make_shim(fakeroot=tmp_path / "s" / "root1")
+    b = make_shim(fakeroot=tmp_path / "s" / "root10")
+    assert a.fakeroot == (tmp_path / "s" / "root1").resolve()
+    a.run("echo mine > /tmp/note")
+    assert b.run("cat /tmp/note")[0] == 1
+    # A sibling directory sharing the name prefix is still outside the fakeroot
+    assert a._to_real_path("../root10/tmp") == a.fakeroot
+    a.variables["ONLY_A"] = "1"
+    assert "ONLY_A" not in b.variables
+    assert a._log_buffer is not b._log_buffer
+
+def test_fakeroot_and_filesystem_are_exclusive(tmp_path):
+    from bashshim.memfs import MemoryFileSystem
+    with pytest.raises(ValueError):
+        BashShim(fakeroot=tmp_path, filesystem=MemoryFileSystem(tmp_path))
+
+def test_snapshot_and_restore_session(tmp_path, monkeypatch):
+    from bashshim.memfs import MemoryFileSystem
+    monkeypatch.setenv("HOME", str(tmp_path))
+    for fs in (None, MemoryFileSystem(Path("/fakeroot"))):
+        kwargs = {"filesystem": fs} if fs else {"fakeroot": tmp_path / "disk"}
+        shim = BashShim(log_dmesg=False, allow_networking=False, clock="virtual", **kwargs)
+        snap = shim.snapshot()
+        for _ in range(2):
+            shim.run("FOO=bar")
+            shim.run("cd /tmp")
+            shim.run("echo x > note")
+            shim.run("rm /etc/motd")
+            shim.restore(snap)
+            assert "FOO" not in shim.variables and shim.parser.variables is shim.variables
+            assert shim.run("pwd")[1].strip() != "/tmp"
+            assert shim.run("cat /tmp/note")[0] == 1
+            assert shim.run("cat /etc/motd") == (0, "Welcome to FakeOS!\n")
+
+
+def test_snapshot_needs_a_backend_that_supports_it(shim):
+    from bashshim.filesystem_errorsim import FileSystem as FaultyFileSystem
+    shim.fs = FaultyFileSystem(shim.fakeroot)
+    with pytest.raises(TypeError, match="FileSystem"):
+        shim.snapshot()
+
+def test_blob_store_dedupes_population(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    shim = BashShim(log_dmesg=False, allow_networking=False, clock="virtual", blob_store=tmp_path / "blobs")
+    assert shim.fs.blobs.reused > shim.fs.blobs.stored
+    assert shim.run("cat /etc/motd") == (0, "Welcome to FakeOS!\n")
+    shim.run("echo x > /etc/motd")
+    assert shim.run("cat /etc/motd") == (0, "x\n")
+
+
+def test_real_processes_cannot_write_through_blob_links(make_shim, tmp_path):
+    shim = make_shim(blob_store=tmp_path / "blobs", fallback="subprocess")
+    proc = shim.fakeroot / "proc"
+    for name in "abc":
+        shim.fs.write_text(proc / name, "same\n")
+    assert (proc / "a").stat().st_nlink == 4
+    shim.run("cd /proc")
+    shim.run("python3 -c \"open('a', 'w').write('python\\n')\"")
+    shim.run(f"sh -c 'echo shell > {proc / 'b'}'")
+    assert shim.run("cat /proc/a /proc/b /proc/c") == (0, "python\nshell\nsame\n")
+    assert shim.fs.blobs.put(b"same\n").read_text() == "same\n"
+
+
+def test_log_is_buffered_but_complete_when_read(shim):
+    shim.run("echo marker-line")
+    code, out = shim.run("cat /bashshim.log")
+    assert code == 0 and "running command: echo marker-line" in out
+    shim.close()
+
+def test_dmesg_levels_tail_and_follow(shim):
+    shim.run("cat /missing")
+    code, out = shim.run("dmesg --level err")
+    assert code == 0 and out.splitlines() and all("error" in line for line in out.splitlines())
+    assert len(shim.run("dmesg -n 2")[1].splitlines()) == 2
+    shim.run("dmesg -w")
+    shim.run("echo later")
+    follow = shim.run("dmesg -w")[1]
+    assert "running command: echo later" in follow and "startup complete" not in follow
+    assert shim.run("dmesg -l loud")[0] == 1
+
+
+def test_log_level_drops_debug_records(make_shim):
+    shim = make_shim(log_level="info", log_capacity=50)
+    for _ in range(30):
+        shim.run("cd /tmp")
+    assert len(shim._log_buffer) == 50
+    assert "resolving path" not in shim.run("dmesg")[1]
+
+def test_operators_inside_quotes_are_literal(shim):
+    assert shim.run('echo "a && b; c"') == (0, "a && b; c\n")
+    assert shim.run("false || echo fallback") == (0, "fallback\n")
+    assert shim.run("echo a=b") == (0, "a=b\n")
+    assert "a" not in shim.variables
+
+
+def test_subshell_keeps_state_local(shim):
+    code, out = shim.run("(cd /proc; FOO=1; pwd); pwd")
+    assert out.splitlines()[0] == "/proc" and out.splitlines()[1] != "/proc"
+    assert "FOO" not in shim.variables
+
+
+def test_syntax_error_exit_status(shim):
+    code, out = shim.run("echo ;; echo")
+    assert code == 2 and "syntax error" in out
+
+def test_repeated_commands_hit_parse_cache(shim):
+    shim.run("FOO=a")
+    assert shim.run("echo $FOO") == (0, "a\n")
+    shim.run("FOO=b")
+    assert shim.run("echo $FOO") == (0, "b\n")
+    assert shim.parser.cache_info().hits >= 1
+
+def test_words_are_expanded_exactly_once(shim):
+    shim.run("FOO='$HOME'")
+    assert shim.run("echo $FOO") == (0, "$HOME\n")
+    assert shim.run("echo '$FOO' \"$FOO\"") == (0, "$FOO $HOME\n")
+    assert shim.run("echo '>' x") == (0, "> x\n")
+
+
+def test_fallback_receives_quoted_argv(shim, monkeypatch):
+    seen = []
+    monkeypatch.setattr(shim, "fallback_exec", lambda line, stdin=None: (seen.append(line), (0, ""))[1])
+    shim.run("frobnicate 'two words' plain")
+    assert seen == ["frobnicate 'two words' plain"]
+
+def test_pipelines_stream_through_memory(shim, monkeypatch):
+    import tempfile
+    monkeypatch.setattr(tempfile, "NamedTemporaryFile", None)
+    produced = []
+
+    def numbers(args):
+        def gen():
+            for i in range(10000):
+                produced.append(i)
+                yield f"line {i}\n"
+        return 0, gen()
+
+    shim.simulated["numbers"] = numbers
+    assert shim.run("numbers | grep 1 | head -n 2") == (0, "line 1\nline 10\n")
+    assert len(produced) < 100
+    assert shim.run("echo 'a|b' | cat") == (0, "a|b\n")
+    assert shim.run("echo 2*21 | bc") == (0, "42\n")
+
+
+def test_input_redirection_and_here_string(shim):
+    shim.run("echo hello > /proc/note")
+    assert shim.run("cat < /proc/note") == (0, "hello\n")
+    assert shim.run("grep ell <<< 'hello world'") == (0, "hello world\n")
+    assert shim.run("cat < /proc/missing")[0] == 1
+
+
+def test_processes_read_piped_and_redirected_input(make_shim):
+    shim = make_shim(fallback="subprocess")
+    script = "python3 -c 'import sys; print(repr(sys.stdin.read()))'"
+    shim.run("echo data > /proc/in")
+    assert shim.run(f"echo hi | {script}") == (0, "'hi\\n'\n")
+    assert shim.run(f"{script} < /proc/in") == (0, "'data\\n'\n")
+    assert shim.run(f"{script} <<< here") == (0, "'here\\n'\n")
+    assert shim.run("echo a b | tr a-z A-Z") == (0, "A B\n")
+    assert shim.run("tr a-z A-Z < /proc/in") == (0, "DATA\n")
+
+
+def test_run_stream_yields_chunks_as_they_are_produced(shim):
+    produced = []
+
+    def ticks(args):
+        def gen():
+            for i in range(3):
+                produced.append(i)
+                yield f"tick {i}\n"
+        return 0, gen()
+
+    shim.simulated["ticks"] = ticks
+    stream = shim.run_stream("ticks; false")
+    assert stream.exit_code is None and produced == []
+    assert next(stream) == "tick 0\n" and produced == [0]
+    assert list(stream) == ["tick 1\n", "tick 2\n"]
+    assert stream.exit_code == 1
+    assert shim.variables["?"] == "1"
+
+
+def test_run_stream_close_skips_remaining_commands(shim):
+    stream = shim.run_stream("echo one; echo two > /proc/later")
+    assert next(stream) == "one\n"
+    stream.close()
+    assert not (shim.fakeroot / "proc" / "later").exists()
+    stream = shim.run_stream("echo 'unterminated")
+    assert list(stream)[0].startswith("bash: ") and stream.exit_code == 2
+
+
+def test_pipeline_stages_run_concurrently(shim):
+    import time
+    shim.simulated["slow"] = lambda args: (time.sleep(0.3), (0, "done\n"))[1]
+    start = time.monotonic()
+    code, out = shim.run("slow | slow | slow")
+    assert (code, out) == (0, "done\n")
+    assert time.monotonic() - start < 0.8
+
+
+def test_early_exit_breaks_the_pipe_upstream(shim):
+    import itertools
+
+    def yes(args):
+        return 0, ("y\n" for _ in itertools.count())
+
+    shim.simulated["yes"] = yes
+    assert shim.run("yes | cat | head -n 3") == (0, "y\ny\ny\n")
+    assert shim.variables["PIPESTATUS"] == "141 141 0"
+    assert shim.run("yes | echo hi") == (0, "hi\n")
+
+
+def test_errors_while_streaming_set_the_exit_status(shim):
+    (shim.fakeroot / "proc" / "bad").write_bytes(b"ok\n\xff\xfe\n")
+    code, out = shim.run("cat /proc/bad")
+    assert code == 1 and "error simulating 'cat'" in out
+    assert shim.run("echo $?") == (0, "1\n")
+    assert shim.run("cat /proc/bad | cat")[0] == 0
+    assert shim.variables["PIPESTATUS"] == "1 0"
+    assert shim.run("echo a; echo b | cat; false; echo $PIPESTATUS") == (0, "a\nb\n1\n")
+
+
+def test_pipeline_stages_run_in_subshells(shim):
+    before = shim.run("pwd")
+    for _ in range(20):
+        assert shim.run("cd /proc | pwd") == before
+    assert shim.run("cd /proc | sleep 0.01")[0] == 0
+    assert shim.run("X=1 | true")[0] == 0
+    assert shim.run("true | Y=2")[0] == 0
+    assert shim.run("sudo true | whoami") == (0, f"{shim.username}\n")
+    assert shim.run("pwd") == before and shim.run("whoami") == (0, f"{shim.username}\n")
+    assert "X" not in shim.variables and "Y" not in shim.variables
+
+
+def test_run_batch_returns_results_and_defers_log_flush(shim):
+    flushes = shim.log_sink.flushes
+    shim.log_sink.flush_interval = 0
+    results = shim.run_batch(["echo a", "false", "echo b"])
+    assert [(r.command, r.code, r.output) for r in results] == [
+        ("echo a", 0, "a\n"), ("false", 1, ""), ("echo b", 0, "b\n")]
+    assert all(r.duration >= 0 for r in results)
+    assert shim.log_sink.flushes == flushes + 1
+    assert len(shim.run_batch(["echo a", "false", "echo b"], stop_on_error=True)) == 2
+
+
+def test_run_batch_reports_exceptions_per_command(shim, monkeypatch):
+    apply_redirects = shim._apply_redirects
+
+    def broken(redirects, out):
+        if redirects:
+            raise RuntimeError("boom")
+        return apply_redirects(redirects, out)
+    monkeypatch.setattr(shim, "_apply_redirects", broken)
+    results = shim.run_batch(["echo a > /proc/x", "echo ok"])
+    assert (results[0].code, results[0].output) == (1, "Error: boom\n")
+    assert results[1][1:3] == (0, "ok\n")
+
+
+def test_arun_does_not_block_the_event_loop(shim):
+    import asyncio
+    import time
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        results = await asyncio.gather(shim.arun("sleep 0.2"), shim.arun("echo hi"),
+                                       shim.arun("python3 -c 'print(6*7)'"))
+        task.cancel()
+        return results
+
+    results = asyncio.run(main())
+    assert results == [(0, ""), (0, "hi\n"), (0, "42\n")]
+    assert len(ticks) >= 10
+
+
+def test_arun_serializes_commands_on_one_session(shim):
+    import asyncio
+
+    async def main():
+        return await asyncio.gather(*(shim.arun(f"echo {i} >> /proc/order") for i in range(5)))
+
+    asyncio.run(main())
+    assert shim.run("cat /proc/order") == (0, "0\n1\n2\n3\n4\n")
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from bashshim.streams import InputStream, Pipe, collect, iter_lines
+
+
+def test_read_readline_and_iteration():
+    stream = InputStream(["ab", "c\nde", "f\n", "tail"])
+    assert stream.read(1) == "a"
+    assert stream.readline() == "bc\n"
+    assert list(stream) == ["def\n", "tail"]
+    assert stream.read() == "" and stream.eof
+
+
+def test_string_source_and_chunks():
+    stream = InputStream("x\ny\n")
+    assert stream.readline() == "x\n"
+    assert list(stream.chunks()) == ["y\n"]
+    assert InputStream("").read() == ""
+
+
+def test_close_stops_the_producer():
+    produced = []
+
+    def producer():
+        for i in range(1000):
+            produced.append(i)
+            yield f"{i}\n"
+
+    stream = InputStream(producer())
+    assert stream.readline() == "0\n"
+    stream.close()
+    assert produced == [0]
+    assert stream.readline() == ""
+
+
+def test_iter_lines_and_collect():
+    assert list(iter_lines(["a\nb", "c\n", "d"])) == ["a\n", "bc\n", "d"]
+    assert collect(["a", "b"]) == "ab" and collect("s") == "s"
+
+
+def test_pipe_blocks_when_full_and_breaks_on_close():
+    pipe = Pipe(capacity=2)
+    written = []
+
+    def writer():
+        for i in range(100):
+            if not pipe.write(f"{i}\n"):
+                break
+            written.append(i)
+        pipe.close_write()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    stream = InputStream(pipe)
+    assert stream.readline() == "0\n"
+    stream.close()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert len(written) < 10
+
+
+def test_pipe_forwards_writer_errors():
+    pipe = Pipe()
+    pipe.write("partial")
+    pipe.close_write(RuntimeError("boom"))
+    stream = InputStream(pipe)
+    with pytest.raises(RuntimeError):
+        stream.read()
@@ -0,0 +1,65 @@
+import pytest
+from bashshim.syntax import CommandList, ParseError, Subshell, parse, tokenize, unparse
+
+
+def words(node):
+    return [w.text for w in node.words]
+
+
+def test_quotes_protect_operators():
+    tree = parse(r"""echo 'a | b' "c && d" e\;f""")
+    (and_or, background), = tree.items
+    command, = and_or.first.commands
+    assert words(command) == ["echo", "a | b", "c && d", "e;f"]
+    assert background is False
+
+
+def test_lists_and_or_pipelines():
+    tree = parse("a | b && c || d; e &")
+    first, second = tree.items
+    assert [words(c) for c in first[0].first.commands] == [["a"], ["b"]]
+    assert [(op, words(p.commands[0])) for op, p in first[0].rest] == [("&&", ["c"]), ("||", ["d"])]
+    assert second[1] is True
+
+
+def test_redirects_and_assignments():
+    command = parse("FOO=1 BAR=\"x y\" cmd arg >> out 2>/dev/null <in").items[0][0].first.commands[0]
+    assert [(name, value.text) for name, value in command.assignments] == [("FOO", "1"), ("BAR", "x y")]
+    assert words(command) == ["cmd", "arg"]
+    assert [(r.op, r.fd, r.target.text) for r in command.redirects] == [
+        (">>", 1, "out"), (">", 2, "/dev/null"), ("<", 0, "in")]
+    # Only leading NAME=value words are assignments
+    assert words(parse("echo a=b").items[0][0].first.commands[0]) == ["echo", "a=b"]
+
+
+def test_subshell_and_negation():
+    pipeline = parse("! (cd /tmp; pwd) > out").items[0][0].first
+    assert pipeline.negated
+    subshell, = pipeline.commands
+    assert isinstance(subshell, Subshell)
+    assert len(subshell.body.items) == 2
+    assert subshell.redirects[0].target.text == "out"
+
+
+def test_word_quoting_is_recorded():
+    (kind, word), = tokenize("'$A'\"$B\"$C")
+    assert kind == "word"
+    assert word.parts == (("$A", "'"), ("$B", '"'), ("$C", ""))
+
+
+@pytest.mark.parametrize("line", ["echo ;; x", "| a", "a &&", "( )", "echo >", "echo 'open"])
+def test_syntax_errors(line):
+    with pytest.raises(ParseError):
+        parse(line)
+
+
+def test_empty_and_comment_lines():
+    assert parse("") == CommandList(())
+    assert parse("   # nothing here") == CommandList(())
+
+
+def test_unparse_round_trips():
+    for line in ['echo "a b" > f 2>/dev/null', "a && b | c || ! d", "sleep 1 & echo x; (cd /; ls) >> o",
+                 r"X=1 echo 'it''s' \; <<< hi"]:
+        assert parse(unparse(parse(line))) == parse(line)
+    assert unparse(parse("sleep 1 &&  echo  done")) == "sleep 1 && echo done"
@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+import pytest
+from bashshim.templates import TemplateCache, clone_tree, template_key
+from bashshim.shell import BashShim
+
+
+def _build(staging):
+    (staging / "etc").mkdir()
+    (staging / "etc" / "motd").write_text("hello\n")
+
+
+def test_template_key_is_stable_and_sensitive():
+    a = template_key({"os_flavor": "Linux", "username": "a"})
+    assert a == template_key({"username": "a", "os_flavor": "Linux"})
+    assert a != template_key({"os_flavor": "Darwin", "username": "a"})
+
+
+def test_get_or_build_builds_once(tmp_path):
+    cache = TemplateCache(tmp_path / "cache")
+    calls = []
+
+    def build(staging):
+        calls.append(staging)
+        _build(staging)
+
+    first = cache.get_or_build("k", build)
+    second = cache.get_or_build("k", build)
+    assert first == second == tmp_path / "cache" / "k"
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize("method", ["copy", "hardlink"])
+def test_clone_into_existing_dir(tmp_path, method):
+    cache = TemplateCache(tmp_path / "cache", method=method)
+    dest = tmp_path / "root"
+    dest.mkdir()
+    (dest / "bashshim.log").write_text("log\n")
+    assert cache.clone("k", dest, _build) is False
+    assert (dest / "etc" / "motd").read_text() == "hello\n"
+    assert (dest / "bashshim.log").exists()
+    assert cache.clone("k", tmp_path / "other", _build) is True
+
+
+def test_external_writes_to_a_clone_stay_in_that_clone(tmp_path):
+    cache = TemplateCache(tmp_path / "cache")
+    cache.clone("k", tmp_path / "first", _build)
+    motd = tmp_path / "first" / "etc" / "motd"
+    subprocess.run([sys.executable, "-c", f"open({str(motd)!r}, 'w').write('tampered\\n')"], check=True)
+    cache.clone("k", tmp_path / "second", _build)
+    assert motd.read_text() == "tampered\n"
+    assert (tmp_path / "second" / "etc" / "motd").read_text() == "hello\n"
+    assert (cache.path_for("k") / "etc" / "motd").read_text() == "hello\n"
+
+
+def test_hardlinked_clone_does_not_leak_writes(tmp_path):
+    from bashshim.filesystem import FileSystem
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "f").write_text("template")
+    clone_tree(src, tmp_path / "dst", "hardlink")
+    fs = FileSystem(tmp_path / "dst")
+    fs.append_text(tmp_path / "dst" / "f", "+session")
+    assert (src / "f").read_text() == "template"
+    assert (tmp_path / "dst" / "f").read_text() == "template+session"
+
+
+def test_shim_clones_from_template(make_shim, tmp_path, monkeypatch):
+    builds = []
+    populate = BashShim._populate_structure
+    monkeypatch.setattr(BashShim, "_populate_structure", lambda self: (builds.append(self.fakeroot), populate(self)))
+    shim = make_shim(template_cache=tmp_path / "cache")
+    assert len(builds) == 1 and builds[0] != shim.fakeroot
+    assert (shim.fakeroot / "home" / shim.username).is_dir()
+    assert (shim.fakeroot / "proc" / "1" / "cmdline").exists()
+    assert shim.proc_users[1] == "root"